@@ -22,9 +22,14 @@ class MemoryAdmin(admin.ModelAdmin):
     # This prevents Django from performing the ambiguous truth check that causes the 500 error.
     exclude = ('vector',) 
     readonly_fields = ('created_at',)
+    list_select_related = ('project',)
+
+    def get_queryset(self, request):
+        # The list never shows vectors or search tokens; don't load them
+        return super().get_queryset(request).defer('vector', 'text_index')
 
     def short_text(self, obj):
         if obj.raw_text and len(obj.raw_text) > 60:
             return obj.raw_text[:60] + "..."
-        return obj.raw_text
+        return str(obj.raw_text) if obj.raw_text is not None else None
     short_text.short_description = 'Content Preview'
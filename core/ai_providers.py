@@ -0,0 +1,304 @@
+import os
+import re
+import asyncio
+import json
+import math
+import time
+import hashlib
+import threading
+
+from django.conf import settings
+
+from . import timing
+from .utils import normalize_search_text
+from .vector_search import VECTOR_DIMENSIONS
+
+
+class GeminiProvider:
+    """Google Gemini (google-generativeai). Configured on first use, not at import time."""
+    name = 'gemini'
+    embedding_model = 'models/text-embedding-004'
+
+    def __init__(self):
+        # Try to get API key from settings first, then environment variable
+        self.api_key = getattr(settings, 'GOOGLE_API_KEY', None) or os.environ.get('GOOGLE_API_KEY')
+        self.model_name = os.environ.get('GEMINI_MODEL_NAME', 'gemini-2.5-flash-lite')
+        self._genai = None
+        self._lock = threading.Lock()
+
+    def ensure_ready(self):
+        if not self.api_key:
+            raise ValueError("GOOGLE_API_KEY is not set.")
+
+    @property
+    def genai(self):
+        with self._lock:
+            if self._genai is None:
+                self.ensure_ready()
+                import google.generativeai as genai
+                genai.configure(api_key=self.api_key)
+                self._genai = genai
+        return self._genai
+
+    def _model(self, system_instruction):
+        return self.genai.GenerativeModel(
+            model_name=self.model_name,
+            system_instruction=system_instruction
+        )
+
+    @staticmethod
+    def _usage(response):
+        usage = getattr(response, 'usage_metadata', None)
+        return getattr(usage, 'prompt_token_count', None), getattr(usage, 'candidates_token_count', None)
+
+    def embed(self, texts, task_type):
+        """One vector per text, in order. Raises on failure."""
+        texts = list(texts)
+        with timing.span('ai.embed'):
+            result = self.genai.embed_content(
+                model=self.embedding_model,
+                content=texts,
+                task_type=task_type,
+                title=None
+            )
+        timing.record_ai_call(self.name, 'embed', texts=len(texts))
+        return result.get('embedding') or []
+
+    def generate(self, system_instruction, prompt):
+        with timing.span('ai.generate'):
+            response = self._model(system_instruction).generate_content(prompt)
+        timing.record_ai_call(self.name, 'generate', *self._usage(response))
+        if not response.text:
+            raise ValueError("Empty response from model.")
+        return response.text
+
+    def generate_stream(self, system_instruction, prompt):
+        """Yields the response text chunk by chunk (generate_content(stream=True))."""
+        produced = False
+        last_chunk = None
+        with timing.span('ai.generate_stream'):
+            for chunk in self._model(system_instruction).generate_content(prompt, stream=True):
+                last_chunk = chunk
+                # Chunks without text parts (e.g. the final one carrying only metadata) raise on .text
+                text = chunk.text if chunk.parts else ''
+                if text:
+                    produced = True
+                    yield text
+        # Usage metadata is cumulative, the last chunk carries the totals
+        timing.record_ai_call(self.name, 'generate_stream', *self._usage(last_chunk))
+        if not produced:
+            raise ValueError("Empty response from model.")
+
+    def extract(self, system_instruction, prompt, conversation_text):
+        """Raw JSON answer of the extraction prompt (`conversation_text` is only used by LocalProvider)."""
+        with timing.span('ai.extract'):
+            response = self._model(system_instruction).generate_content(
+                prompt,
+                generation_config={"response_mime_type": "application/json"}
+            )
+        timing.record_ai_call(self.name, 'extract', *self._usage(response))
+        return response.text
+
+    # ---------------- ASYNC (ASGI views) ----------------
+    # Same contracts as above, on the library's native coroutines: waiting for
+    # Gemini holds no thread, so one process can keep many calls in flight.
+
+    async def aembed(self, texts, task_type):
+        texts = list(texts)
+        with timing.span('ai.embed'):
+            result = await self.genai.embed_content_async(
+                model=self.embedding_model,
+                content=texts,
+                task_type=task_type,
+                title=None
+            )
+        timing.record_ai_call(self.name, 'embed', texts=len(texts))
+        return result.get('embedding') or []
+
+    async def aextract(self, system_instruction, prompt, conversation_text):
+        with timing.span('ai.extract'):
+            response = await self._model(system_instruction).generate_content_async(
+                prompt,
+                generation_config={"response_mime_type": "application/json"}
+            )
+        timing.record_ai_call(self.name, 'extract', *self._usage(response))
+        return response.text
+
+
+class LocalProvider:
+    """
+    Offline, deterministic stand-in for load tests and benchmarks (AI_PROVIDER=local).
+
+    - Embeddings: feature hashing of words and character trigrams into VECTOR_DIMENSIONS,
+      L2-normalized, so similar texts get close vectors and identical texts equal ones.
+    - Extraction: rule-based, one fact per declarative sentence of the user's message.
+    - Reports: the memory lines of the prompt grouped by category, as Markdown.
+
+    AI_LOCAL_EMBED_LATENCY_MS / AI_LOCAL_GENERATE_LATENCY_MS inject a fixed delay per
+    call, to approximate a remote API when measuring the server itself.
+    """
+    name = 'local'
+    embedding_model = f'local-hashing-{VECTOR_DIMENSIONS}'
+
+    TASK_WORDS = {'must', 'should', 'need', 'needs', 'todo', 'lazım', 'gerek', 'gerekiyor', 'yapılacak'}
+    HYPOTHETICAL_PREFIXES = ('if ', 'maybe ', 'eğer ', 'belki ')
+    MEMORY_LINE = re.compile(r'^\[(?P<timestamp>[^\]]*)\] \[(?P<category>[^\]]*)\]: (?P<text>.+)$')
+
+    def ensure_ready(self):
+        pass
+
+    def _sleep(self, setting_name):
+        latency_ms = getattr(settings, setting_name, 0)
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+
+    async def _asleep(self, setting_name):
+        latency_ms = getattr(settings, setting_name, 0)
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000.0)
+
+    # ---------------- EMBEDDINGS ----------------
+
+    def embed_one(self, text):
+        vector = [0.0] * VECTOR_DIMENSIONS
+        words = normalize_search_text(text).split()
+
+        features = [('w', word, 1.0) for word in words]
+        for word in words:
+            padded = f" {word} "
+            features.extend(('t', padded[i:i + 3], 0.5) for i in range(len(padded) - 2))
+
+        for kind, feature, weight in features:
+            digest = hashlib.blake2b(f"{kind}:{feature}".encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'big')
+            sign = 1.0 if (value >> 63) & 1 else -1.0
+            vector[value % VECTOR_DIMENSIONS] += sign * weight
+
+        norm = math.sqrt(sum(x * x for x in vector))
+        if not norm:
+            vector[0] = 1.0
+            return vector
+        return [x / norm for x in vector]
+
+    def embed(self, texts, task_type):
+        texts = list(texts)
+        with timing.span('ai.embed'):
+            self._sleep('AI_LOCAL_EMBED_LATENCY_MS')
+            vectors = [self.embed_one(text) for text in texts]
+        timing.record_ai_call(self.name, 'embed', texts=len(texts))
+        return vectors
+
+    async def aembed(self, texts, task_type):
+        texts = list(texts)
+        with timing.span('ai.embed'):
+            await self._asleep('AI_LOCAL_EMBED_LATENCY_MS')
+            vectors = [self.embed_one(text) for text in texts]
+        timing.record_ai_call(self.name, 'embed', texts=len(texts))
+        return vectors
+
+    # ---------------- EXTRACTION ----------------
+
+    @timing.span('ai.extract')
+    def extract(self, system_instruction, prompt, conversation_text):
+        timing.record_ai_call(self.name, 'extract')
+        self._sleep('AI_LOCAL_GENERATE_LATENCY_MS')
+        return self._extract_facts(conversation_text)
+
+    async def aextract(self, system_instruction, prompt, conversation_text):
+        with timing.span('ai.extract'):
+            timing.record_ai_call(self.name, 'extract')
+            await self._asleep('AI_LOCAL_GENERATE_LATENCY_MS')
+            return self._extract_facts(conversation_text)
+
+    def _extract_facts(self, conversation_text):
+        # INPUT FORMAT: 'User: [message]\n\nAI: [response]', facts come from the user only
+        user_text = re.split(r'\n\s*AI:', conversation_text, maxsplit=1)[0]
+        user_text = re.sub(r'^\s*User:\s*', '', user_text)
+
+        facts = []
+        for sentence in re.split(r'(?<=[.!?])\s+|\n+', user_text):
+            sentence = sentence.strip()
+            words = sentence.split()
+            if len(words) < 4 or sentence.endswith('?'):
+                continue
+            if sentence.lower().startswith(self.HYPOTHETICAL_PREFIXES):
+                continue
+
+            lowered = {normalize_search_text(w.strip('.,!;:')) for w in words}
+            is_task = bool(lowered & {normalize_search_text(w) for w in self.TASK_WORDS})
+
+            # Names, versions and figures make the best tags
+            tags = []
+            for word in words[1:]:
+                word = word.strip('.,!;:()"\'')
+                if word and (word[0].isupper() or any(c.isdigit() for c in word)) and word not in tags:
+                    tags.append(word)
+            if not tags:
+                tags = sorted({w.strip('.,!;:') for w in words}, key=len, reverse=True)[:2]
+
+            facts.append({
+                "raw_text": sentence if sentence[-1] in '.!' else f"{sentence}.",
+                "tags": tags[:5],
+                "category": "Task" if is_task else "General"
+            })
+
+        return json.dumps(facts[:5], ensure_ascii=False)
+
+    # ---------------- TEXT GENERATION ----------------
+
+    @timing.span('ai.generate')
+    def generate(self, system_instruction, prompt):
+        timing.record_ai_call(self.name, 'generate')
+        self._sleep('AI_LOCAL_GENERATE_LATENCY_MS')
+        return self._render(prompt)
+
+    def generate_stream(self, system_instruction, prompt):
+        text = self.generate(system_instruction, prompt)
+        for line in text.splitlines(keepends=True):
+            yield line
+
+    def _render(self, prompt):
+        # Incremental updates: anything listed as removed is dropped
+        prompt = prompt.split("REMOVED MEMORIES:", 1)[0]
+
+        sections = {}
+        for line in prompt.splitlines():
+            line = line.strip()
+            match = self.MEMORY_LINE.match(line)
+            if match:
+                date = match.group('timestamp')[:10]
+                sections.setdefault(match.group('category').upper(), []).append(f"{match.group('text')} ({date})")
+            elif line.startswith('- '):
+                sections.setdefault('NOTES', []).append(line[2:])
+
+        total = sum(len(items) for items in sections.values())
+        lines = [
+            "# Project Report",
+            "",
+            "## Executive Summary",
+            f"- **{total}** entries across **{len(sections)}** categories.",
+        ]
+        for category in sorted(sections):
+            lines += ["", f"## {category.title()}"]
+            lines += [f"- {item}" for item in sections[category]]
+        return "\n".join(lines) + "\n"
+
+
+PROVIDERS = {
+    GeminiProvider.name: GeminiProvider,
+    LocalProvider.name: LocalProvider,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def get_provider():
+    """The provider selected by AI_PROVIDER (one shared instance per process)."""
+    name = getattr(settings, 'AI_PROVIDER', GeminiProvider.name)
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown AI_PROVIDER '{name}', expected one of {tuple(PROVIDERS)}")
+
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = PROVIDERS[name]()
+        return _instances[name]
@@ -1,235 +1,502 @@
-import os
 import json
-import google.generativeai as genai
+import asyncio
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
-# Configure the library
-# Try to get API key from settings first, then environment variable
-API_KEY = getattr(settings, 'GOOGLE_API_KEY', os.environ.get('GOOGLE_API_KEY'))
+from . import embedding_cache, timing
+from .ai_providers import get_provider
 
-if API_KEY:
-    genai.configure(api_key=API_KEY)
+# The model behind every call below is chosen by AI_PROVIDER (see core.ai_providers):
+# 'gemini' (models/text-embedding-004 + GEMINI_MODEL_NAME) or the offline 'local' stand-in.
+EMBEDDING_TASK_TYPE = "retrieval_document" # Context: storing user context
 
 def get_embedding(text):
     """
-    Generates an embedding for the given text using the 'models/text-embedding-004' model.
+    Generates an embedding for the given text with the configured provider.
     Returns a list of floats (768 dimensions).
+    Identical (normalized) texts are served from the embedding cache.
     """
-    if not API_KEY:
-        raise ValueError("GOOGLE_API_KEY is not set.")
+    return get_embeddings([text])[0]
 
-    try:
-        # models/text-embedding-004 is the latest text embedding model
-        model = 'models/text-embedding-004'
-        
-        result = genai.embed_content(
-            model=model,
-            content=text,
-            task_type="retrieval_document", # Context: storing user context
-            title=None
+def _cached_embeddings(provider, texts):
+    """
+    Resolves `texts` against the embedding cache.
+    Returns (results aligned with `texts`, {normalized text: [indices]} for the misses).
+    """
+    # Keyed by the provider's embedding model, so vectors of different providers never mix
+    results = embedding_cache.lookup_many(provider.embedding_model, EMBEDDING_TASK_TYPE, texts)
+
+    # normalized text -> indices waiting for it
+    pending = {}
+    for i, vector in enumerate(results):
+        if vector is None:
+            pending.setdefault(embedding_cache.normalize_text(texts[i]), []).append(i)
+    return results, pending
+
+def _embedding_chunks(pending):
+    unique_texts = list(pending)
+    batch_size = getattr(settings, 'EMBEDDING_BATCH_SIZE', 100)
+    return [unique_texts[start:start + batch_size] for start in range(0, len(unique_texts), batch_size)]
+
+def _fill_embeddings(provider, results, pending, chunk, vectors):
+    """Caches the vectors of one chunk and copies them into `results`."""
+    if len(vectors) != len(chunk):
+        print(f"Error generating embedding: expected {len(chunk)} vectors, got {len(vectors)}")
+        return
+
+    embedding_cache.store_many(provider.embedding_model, EMBEDDING_TASK_TYPE, list(zip(chunk, vectors)))
+    for text, vector in zip(chunk, vectors):
+        for i in pending[text]:
+            results[i] = vector
+
+@timing.span('embedding')
+def get_embeddings(texts):
+    """
+    Batched version of get_embedding.
+    Returns a list aligned with `texts` (None for any text that failed).
+    Cache misses are de-duplicated and sent in chunks of EMBEDDING_BATCH_SIZE,
+    one request per chunk (the embed API accepts a list of contents).
+    """
+    provider = get_provider()
+    provider.ensure_ready()
+
+    texts = list(texts)
+    results, pending = _cached_embeddings(provider, texts)
+
+    for chunk in _embedding_chunks(pending):
+        try:
+            vectors = provider.embed(chunk, EMBEDDING_TASK_TYPE)
+        except Exception as e:
+            print(f"Error generating embedding: {e}")
+            continue
+        _fill_embeddings(provider, results, pending, chunk, vectors)
+
+    return results
+
+async def aget_embedding(text):
+    """Async get_embedding (ASGI views)."""
+    return (await aget_embeddings([text]))[0]
+
+async def aget_embeddings(texts):
+    """
+    Async get_embeddings: cache tiers through the ORM in a thread, the chunks
+    sent to the provider concurrently.
+    """
+    provider = get_provider()
+    provider.ensure_ready()
+
+    texts = list(texts)
+    with timing.span('embedding'):
+        results, pending = await sync_to_async(_cached_embeddings)(provider, texts)
+        chunks = _embedding_chunks(pending)
+
+        responses = await asyncio.gather(
+            *(provider.aembed(chunk, EMBEDDING_TASK_TYPE) for chunk in chunks),
+            return_exceptions=True
         )
+        for chunk, vectors in zip(chunks, responses):
+            if isinstance(vectors, Exception):
+                print(f"Error generating embedding: {vectors}")
+                continue
+            await sync_to_async(_fill_embeddings)(provider, results, pending, chunk, vectors)
+
+    return results
+
+def _extraction_prompt(conversation_text, existing_context):
+    """(system_instruction, prompt) of the memory extraction call."""
+    # V69: Dynamic Date Injection
+    today_str = datetime.now().strftime("%Y-%m-%d (%A)")
+    
+    system_instruction = (
+        f"CURRENT DATE: {today_str}\n"
+        "You are a Knowledge Base Manager.\n"
+        "INPUT FORMAT: 'User: [message]\\n\\nAI: [response]'\n"
+        "GOAL: Extract *NEW* confirmed project decisions or facts.\n\n"
+        "⭐⭐ PRIME DIRECTIVE: STRICT LANGUAGE MIRRORING ⭐⭐\n"
+        "1. **DETECT** the language of the 'User Input' (English, Turkish, Spanish, etc.).\n"
+        "2. **OUTPUT** the `raw_text`, `tags`, and `category` **EXACTLY** in that detected language.\n"
+        "3. **NEVER** translate. If User speaks English, Output MUST be English. If Turkish, Output MUST be Turkish. If Spanish, Output MUST be Spanish.\n\n"
+        "CRITICAL SOURCE RULES:\n"
+        "0. **CONTEXT AS READ-ONLY REFERENCE:**\n"
+        "   - Do not extract from 'SYSTEM CONTEXT INJECTION'. It is history.\n"
+        "   - Use context only to resolve math or relative values.\n"
+        "0.1. **TIMESTAMP SUPREMACY:**\n"
+        "   - Always use the LATEST timestamp from context for current values.\n"
+        "1. **MANDATORY DATE & DEADLINE CALCULATION:**\n"
+        "   - Calculate exact ISO dates for relative terms.\n"
+        "   - **Example (EN):** User: 'Deadline is next friday'. -> Output: 'Deadline set to 2026-01-10.'\n"
+        "   - **Example (TR):** User: 'Yarın başlıyoruz'. -> Output: 'Proje başlangıç tarihi 2026-01-01 olarak belirlendi.'\n"
+        "2. **SOURCE OF TRUTH = USER ONLY:**\n"
+        "   - Extract facts ONLY from 'User:' section. 'AI:' is read-only context.\n"
+        "   - Exception: User explicit confirmation ('Approved') of AI proposal.\n"
+        "3. **THE 'SUGGESTION TRAP':**\n"
+        "   - Discard suggestions/advice. Only extract definitive facts.\n"
+        "4. **CONFIRMATION & PLAN EXTRACTION:**\n"
+        "   - If User approves, fetch details from Context.\n"
+        "   - **Example (EN):** User: 'Approved.' (Context: 4-week plan) -> Output: 'Project roadmap approved.' Tags: ['Plan', 'Approved']\n"
+        "   - **Example (TR):** User: 'Onaylıyorum.' -> Output: '4 haftalık yol haritası onaylandı.' Tags: ['Plan', 'Onay']\n"
+        "5. **IMPLICIT AGREEMENT SCOPE:**\n"
+        "   - 'Okay' only confirms the main topic.\n"
+        "6. **CODE & CONFIG DEDUCTION:**\n"
+        "   - Extract User code snippets. Ignore AI snippets unless confirmed.\n"
+        "7. **VALUE UPDATES & MATH (AGGRESSIVE):**\n"
+        "   - Find LATEST value in Context -> Perform MATH -> Output NEW TOTAL.\n"
+        "   - **Example (EN):** Context: 'Budget 50k'. User: 'Add 10k'. -> Output: 'Budget increased to 60k.'\n"
+        "   - **Example (TR):** Context: 'Bütçe 50k'. User: '10k ekle'. -> Output: 'Bütçe 60.000 TLye yükseldi.'\n"
+        "7.1. **UNIVERSAL GAP & GOAL ANALYSIS:**\n"
+        "   - Update 'Current Value' vs 'Goal'. State status/gap.\n"
+        "   - **Example:** 'Current weight 72kg (2kg away from goal)'.\n"
+        "8. **LANGUAGE NEUTRALITY:**\n"
+        "   - ALWAYS use the user's input language for `raw_text`, `tags`, and `category`.\n"
+        "9. **FACT FORMALIZATION:**\n"
+        "   - Rewrite into a clear, standalone, professional sentence.\n"
+        "10. **STRICT TAGGING:** Identify specific names, tools. ALWAYS include 'tags'.\n"
+        "11. **DYNAMIC CLASSIFICATION:** Generate a short category name in the USER'S LANGUAGE.\n"
+        "12. **HYPOTHETICAL FILTER:**\n"
+        "    - Discard conditional ('If...') or uncertain statements.\n"
+        "13. **QUESTION FILTER:**\n"
+        "    - Never extract info from questions.\n"
+        "14. **NEGATION & STATUS DISTINCTION:**\n"
+        "    - 'Cancelled' -> Tag: 'Cancelled'. 'Not yet' -> Tag: 'Status: Pending'.\n"
+        "15. **ATOMIC SEPARATION:**\n"
+        "    - Split multiple facts into separate items.\n"
+        "16. **IMPLICIT TASK DETECTION:**\n"
+        "   - Trigger: Obligation words ('must', 'should', 'lazım', 'gerek').\n"
+        "   - **Example (EN):** 'We need to check logs' -> 'Check server logs.' | Category: 'Task' | Tags: ['Logs', 'Pending']\n"
+        "   - **Example (TR):** 'Loglara bakmamız lazım' -> 'Server logları kontrol edilecek.' | Category: 'Görev' | Tags: ['Loglar', 'Beklemede']\n"
+        "Output format: JSON List\n"
+        "[\n"
+        "  {\n"
+        "    \"raw_text\": \"...\", \n"
+        "    \"tags\": [\"...\"], \n"
+        "    \"category\": \"...\"\n"
+        "  }\n"
+        "]\n"
+        "OR [] if nothing relevant."
+    )
+    
+    # Combine existing context with new input
+    # Force Date and Context visibility
+    language_reminder = (
+        "\n\n🛑 FINAL INSTRUCTION: OUTPUT MUST BE IN THE SAME LANGUAGE AS THE 'USER INPUT' ABOVE. "
+        "IF USER INPUT IS ENGLISH, OUTPUT ENGLISH. IF TURKISH, OUTPUT TURKISH."
+    )
+    full_prompt = (
+        f"� CURRENT DATE: {today_str}\n\n"
+        f"�🚨 SYSTEM CONTEXT (HISTORY - READ ONLY):\n{existing_context}\n\n"
+        f"👤 USER INPUT:\n{conversation_text}"
+        f"{language_reminder}"
+    ) if existing_context else (
+        f"📅 CURRENT DATE: {today_str}\n\n"
+        f"👤 USER INPUT:\n{conversation_text}"
+        f"{language_reminder}"
+    )
+    return system_instruction, full_prompt
+
+def _parse_extraction(response_text):
+    """The valid memory dicts of the model's JSON answer, [] for anything else."""
+    print(f"🔍 DEBUG AI RAW RESPONSE: {response_text}")
+    
+    if response_text:
+        cleaned_text = response_text.strip()
+        if cleaned_text.lower() == "null" or cleaned_text.lower() == "none":
+            return []
         
-        if 'embedding' in result:
-            return result['embedding']
-        else:
-            return result 
+        try:
+            data = json.loads(cleaned_text)
+            
+            if isinstance(data, dict):
+                data = [data]
+            elif not isinstance(data, list):
+                return []
+            
+            valid_memories = []
+            for item in data:
+                if isinstance(item, dict) and item.get('raw_text'):
+                    if 'category' not in item:
+                        item['category'] = 'other'
+                    valid_memories.append(item)
+                    
+            return valid_memories
 
-    except Exception as e:
-        print(f"Error generating embedding: {e}")
-        return None
+        except json.JSONDecodeError:
+            print(f"❌ Failed to parse JSON memory: {cleaned_text}")
+            return []
+        
+    return []
 
 def analyze_and_extract_memory(conversation_text, existing_context=""):
     """
     Analyzes the conversation text to extract concrete technical decisions, 
     architectural choices, or project rules.
     """
-    if not API_KEY:
-        raise ValueError("GOOGLE_API_KEY is not set.")
-
-    model_name = os.environ.get('GEMINI_MODEL_NAME', 'gemini-2.5-flash-lite')
+    provider = get_provider()
+    provider.ensure_ready()
     
     try:
-        # V69: Dynamic Date Injection
-        today_str = datetime.now().strftime("%Y-%m-%d (%A)")
-        
-        system_instruction = (
-            f"CURRENT DATE: {today_str}\n"
-            "You are a Knowledge Base Manager.\n"
-            "INPUT FORMAT: 'User: [message]\\n\\nAI: [response]'\n"
-            "GOAL: Extract *NEW* confirmed project decisions or facts.\n\n"
-            "⭐⭐ PRIME DIRECTIVE: STRICT LANGUAGE MIRRORING ⭐⭐\n"
-            "1. **DETECT** the language of the 'User Input' (English, Turkish, Spanish, etc.).\n"
-            "2. **OUTPUT** the `raw_text`, `tags`, and `category` **EXACTLY** in that detected language.\n"
-            "3. **NEVER** translate. If User speaks English, Output MUST be English. If Turkish, Output MUST be Turkish. If Spanish, Output MUST be Spanish.\n\n"
-            "CRITICAL SOURCE RULES:\n"
-            "0. **CONTEXT AS READ-ONLY REFERENCE:**\n"
-            "   - Do not extract from 'SYSTEM CONTEXT INJECTION'. It is history.\n"
-            "   - Use context only to resolve math or relative values.\n"
-            "0.1. **TIMESTAMP SUPREMACY:**\n"
-            "   - Always use the LATEST timestamp from context for current values.\n"
-            "1. **MANDATORY DATE & DEADLINE CALCULATION:**\n"
-            "   - Calculate exact ISO dates for relative terms.\n"
-            "   - **Example (EN):** User: 'Deadline is next friday'. -> Output: 'Deadline set to 2026-01-10.'\n"
-            "   - **Example (TR):** User: 'Yarın başlıyoruz'. -> Output: 'Proje başlangıç tarihi 2026-01-01 olarak belirlendi.'\n"
-            "2. **SOURCE OF TRUTH = USER ONLY:**\n"
-            "   - Extract facts ONLY from 'User:' section. 'AI:' is read-only context.\n"
-            "   - Exception: User explicit confirmation ('Approved') of AI proposal.\n"
-            "3. **THE 'SUGGESTION TRAP':**\n"
-            "   - Discard suggestions/advice. Only extract definitive facts.\n"
-            "4. **CONFIRMATION & PLAN EXTRACTION:**\n"
-            "   - If User approves, fetch details from Context.\n"
-            "   - **Example (EN):** User: 'Approved.' (Context: 4-week plan) -> Output: 'Project roadmap approved.' Tags: ['Plan', 'Approved']\n"
-            "   - **Example (TR):** User: 'Onaylıyorum.' -> Output: '4 haftalık yol haritası onaylandı.' Tags: ['Plan', 'Onay']\n"
-            "5. **IMPLICIT AGREEMENT SCOPE:**\n"
-            "   - 'Okay' only confirms the main topic.\n"
-            "6. **CODE & CONFIG DEDUCTION:**\n"
-            "   - Extract User code snippets. Ignore AI snippets unless confirmed.\n"
-            "7. **VALUE UPDATES & MATH (AGGRESSIVE):**\n"
-            "   - Find LATEST value in Context -> Perform MATH -> Output NEW TOTAL.\n"
-            "   - **Example (EN):** Context: 'Budget 50k'. User: 'Add 10k'. -> Output: 'Budget increased to 60k.'\n"
-            "   - **Example (TR):** Context: 'Bütçe 50k'. User: '10k ekle'. -> Output: 'Bütçe 60.000 TLye yükseldi.'\n"
-            "7.1. **UNIVERSAL GAP & GOAL ANALYSIS:**\n"
-            "   - Update 'Current Value' vs 'Goal'. State status/gap.\n"
-            "   - **Example:** 'Current weight 72kg (2kg away from goal)'.\n"
-            "8. **LANGUAGE NEUTRALITY:**\n"
-            "   - ALWAYS use the user's input language for `raw_text`, `tags`, and `category`.\n"
-            "9. **FACT FORMALIZATION:**\n"
-            "   - Rewrite into a clear, standalone, professional sentence.\n"
-            "10. **STRICT TAGGING:** Identify specific names, tools. ALWAYS include 'tags'.\n"
-            "11. **DYNAMIC CLASSIFICATION:** Generate a short category name in the USER'S LANGUAGE.\n"
-            "12. **HYPOTHETICAL FILTER:**\n"
-            "    - Discard conditional ('If...') or uncertain statements.\n"
-            "13. **QUESTION FILTER:**\n"
-            "    - Never extract info from questions.\n"
-            "14. **NEGATION & STATUS DISTINCTION:**\n"
-            "    - 'Cancelled' -> Tag: 'Cancelled'. 'Not yet' -> Tag: 'Status: Pending'.\n"
-            "15. **ATOMIC SEPARATION:**\n"
-            "    - Split multiple facts into separate items.\n"
-            "16. **IMPLICIT TASK DETECTION:**\n"
-            "   - Trigger: Obligation words ('must', 'should', 'lazım', 'gerek').\n"
-            "   - **Example (EN):** 'We need to check logs' -> 'Check server logs.' | Category: 'Task' | Tags: ['Logs', 'Pending']\n"
-            "   - **Example (TR):** 'Loglara bakmamız lazım' -> 'Server logları kontrol edilecek.' | Category: 'Görev' | Tags: ['Loglar', 'Beklemede']\n"
-            "Output format: JSON List\n"
-            "[\n"
-            "  {\n"
-            "    \"raw_text\": \"...\", \n"
-            "    \"tags\": [\"...\"], \n"
-            "    \"category\": \"...\"\n"
-            "  }\n"
-            "]\n"
-            "OR [] if nothing relevant."
-        )
-        
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            system_instruction=system_instruction
-        )
-        
-        # Combine existing context with new input
-        # Force Date and Context visibility
-        language_reminder = (
-            "\n\n🛑 FINAL INSTRUCTION: OUTPUT MUST BE IN THE SAME LANGUAGE AS THE 'USER INPUT' ABOVE. "
-            "IF USER INPUT IS ENGLISH, OUTPUT ENGLISH. IF TURKISH, OUTPUT TURKISH."
-        )
-        full_prompt = (
-            f"� CURRENT DATE: {today_str}\n\n"
-            f"�🚨 SYSTEM CONTEXT (HISTORY - READ ONLY):\n{existing_context}\n\n"
-            f"👤 USER INPUT:\n{conversation_text}"
-            f"{language_reminder}"
-        ) if existing_context else (
-            f"📅 CURRENT DATE: {today_str}\n\n"
-            f"👤 USER INPUT:\n{conversation_text}"
-            f"{language_reminder}"
-        )
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        print(f"🔍 DEBUG AI RAW RESPONSE: {response.text}")
-        
-        if response.text:
-            cleaned_text = response.text.strip()
-            if cleaned_text.lower() == "null" or cleaned_text.lower() == "none":
-                return []
-            
-            try:
-                data = json.loads(cleaned_text)
-                
-                if isinstance(data, dict):
-                    data = [data]
-                elif not isinstance(data, list):
-                    return []
-                
-                valid_memories = []
-                for item in data:
-                    if isinstance(item, dict) and item.get('raw_text'):
-                        if 'category' not in item:
-                            item['category'] = 'other'
-                        valid_memories.append(item)
-                        
-                return valid_memories
-
-            except json.JSONDecodeError:
-                print(f"❌ Failed to parse JSON memory: {cleaned_text}")
-                return []
-            
+        system_instruction, full_prompt = _extraction_prompt(conversation_text, existing_context)
+        response_text = provider.extract(system_instruction, full_prompt, conversation_text)
+        return _parse_extraction(response_text)
+
+    except Exception as e:
+        print(f"❌ Error analysing memory: {e}")
         return []
 
+async def aanalyze_and_extract_memory(conversation_text, existing_context=""):
+    """Async analyze_and_extract_memory (ASGI views)."""
+    provider = get_provider()
+    provider.ensure_ready()
+
+    try:
+        system_instruction, full_prompt = _extraction_prompt(conversation_text, existing_context)
+        response_text = await provider.aextract(system_instruction, full_prompt, conversation_text)
+        return _parse_extraction(response_text)
+
     except Exception as e:
         print(f"❌ Error analysing memory: {e}")
         return []
 
+REPORT_SYSTEM_INSTRUCTION = (
+    "You are an expert Document Specialist.\n"
+    "GOAL: Analyze the provided project memories and generate a professional, structured Project Report in Markdown.\n\n"
+    "RULES:\n"
+    "0. **LANGUAGE DETECTION:** First, analyze the input memories to detect the dominant language. The report MUST effectively communicate in this language.\n"
+    "1. **STRICT OUTPUT LANGUAGE:** Generate the **ENTIRE** report (including headers, descriptions, and bullet points) in the **DETECTED LANGUAGE**.\n"
+    "2. **THEME IDENTIFICATION:** Identify the primary theme of this project.\n"
+    "3. **STRUCTURE:** Create a formal report structure based **ONLY** on the categories present in the data. Use clear H1, H2 headers.\n"
+    "4. **CONFLICT RESOLUTION:** For conflicting facts, **PRIORITIZE** the latest information based on the timestamps provided.\n"
+    "5. **FORMATTING:** Use professional Markdown. Use bullet points for readability. Use bold text for key figures or decisions.\n"
+    "6. **TONE:** Keep it professional, objective, and concise.\n"
+    "7. **Executive Summary:** Start with a brief Executive Summary of the project status and key facts.\n"
+    "8. **MISSING DATA:** If a category is missing, do not invent data. Just omit that section.\n"
+)
+
+# Map step of the chunked report pipeline: condense one slice of the memory log
+CHUNK_SUMMARY_INSTRUCTION = (
+    "You are condensing one slice of a project's memory log into notes for a later report.\n"
+    "RULES:\n"
+    "1. **LANGUAGE:** Write the notes in the same language as the memories.\n"
+    "2. **KEEP FACTS:** Keep every decision, figure, name and date. Drop only repetition.\n"
+    "3. **CONFLICTS:** When facts conflict, keep the latest one and mention that it replaced an earlier value.\n"
+    "4. **TIMESTAMPS:** Keep the [YYYY-MM-DD] date next to each fact.\n"
+    "5. **OUTPUT:** Concise Markdown bullet points only, no headers, no introduction.\n"
+)
+
+def _format_memory_line(m):
+    timestamp = m.get('created_at', 'Unknown Time')
+    category = m.get('category') or 'General'
+    return f"[{timestamp}] [{category.upper()}]: {m.get('raw_text', '')}"
+
+def _time_window(created_at, window_days):
+    try:
+        day = datetime.strptime(created_at[:10], "%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+    return (day - datetime(1970, 1, 1)).days // window_days
+
+def _split_block(block, max_chars):
+    """Splits a block longer than `max_chars` into pieces that fit, at line or word breaks where possible."""
+    pieces = []
+    while len(block) > max_chars:
+        cut = max(block.rfind('\n', 0, max_chars + 1), block.rfind(' ', 0, max_chars + 1))
+        if cut <= 0:
+            cut = max_chars
+        pieces.append(block[:cut])
+        block = block[cut:].lstrip()
+    if block:
+        pieces.append(block)
+    return pieces
+
+def _pack(blocks, max_chars):
+    """
+    Greedily packs text blocks (in order) into chunks of at most `max_chars`.
+    A block that is longer on its own is split across chunks, never truncated.
+    """
+    chunks, current, size = [], [], 0
+    pieces = (piece for block in blocks for piece in _split_block(block, max_chars))
+    for block in pieces:
+        if current and size + len(block) + 1 > max_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+def partition_memories(memories, max_chars, window_days):
+    """
+    Splits the memory log into (label, lines) chunks for the map step:
+    grouped by category, then by `window_days` time window, then packed
+    so that no chunk exceeds `max_chars`.
+    """
+    groups = {}
+    for m in sorted(memories, key=lambda m: m.get('created_at') or ''):
+        category = (m.get('category') or 'General').upper()
+        window = _time_window(m.get('created_at'), window_days)
+        groups.setdefault((category, window), []).append(m)
+
+    chunks = []
+    for (category, _), group in groups.items():
+        first = (group[0].get('created_at') or '?')[:10]
+        last = (group[-1].get('created_at') or '?')[:10]
+        for lines in _pack([_format_memory_line(m) for m in group], max_chars):
+            chunks.append((f"{category} ({first} - {last})", lines))
+    return chunks
+
+def _summarize_chunks(provider, chunks, workers):
+    """Map step: one summary per (label, lines) chunk, on a bounded thread pool."""
+    def summarize(chunk):
+        label, lines = chunk
+        notes = provider.generate(
+            CHUNK_SUMMARY_INSTRUCTION,
+            f"Memory log slice: {label}\n\n" + "\n".join(lines)
+        )
+        return f"### {label}\n{notes.strip()}"
+
+    # LLM calls are network bound, threads are enough to overlap them
+    # (run with the request's timing context so their spans show up in Server-Timing)
+    run = timing.context_propagator()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(lambda chunk: run(summarize, chunk), chunks))
+
+def _report_prompt(provider, memories):
+    """
+    Final report prompt for `memories`. Logs up to REPORT_CHUNK_MAX_CHARS are used
+    as is. Larger logs are map-reduced first: partitioned by category and time window,
+    each chunk summarized concurrently (REPORT_MAP_WORKERS threads), and the notes
+    merged again until they fit the cap. Raises ValueError if a merge pass stops
+    shrinking the notes, rather than cutting memories off the prompt.
+    """
+    max_chars = getattr(settings, 'REPORT_CHUNK_MAX_CHARS', 30000)
+    workers = getattr(settings, 'REPORT_MAP_WORKERS', 4)
+    window_days = getattr(settings, 'REPORT_CHUNK_WINDOW_DAYS', 30)
+
+    memory_lines = [_format_memory_line(m) for m in memories]
+    full_text = "\n".join(memory_lines)
+
+    if len(full_text) <= max_chars:
+        return f"Please generate a Project Report from the following memory log:\n\n{full_text}"
+
+    # 1. MAP: Summarize every (category, time window) chunk in parallel
+    chunks = partition_memories(memories, max_chars, window_days)
+    print(f"🧮 REPORT MAP: {len(memory_lines)} memories -> {len(chunks)} chunks ({workers} workers)")
+    notes = _summarize_chunks(provider, chunks, workers)
+
+    # 2. COLLAPSE: Merge notes until they fit in one prompt, as long as every pass shrinks them
+    section_notes = "\n\n".join(notes)
+    level = 0
+    while len(section_notes) > max_chars:
+        level += 1
+        groups = _pack(notes, max_chars)
+        print(f"🧮 REPORT COLLAPSE {level}: {len(notes)} notes ({len(section_notes)} chars) -> {len(groups)}")
+        notes = _summarize_chunks(
+            provider,
+            [(f"Merged notes part {i + 1}", group) for i, group in enumerate(groups)],
+            workers
+        )
+        merged = "\n\n".join(notes)
+        if len(merged) >= len(section_notes):
+            raise ValueError(
+                f"Report notes stopped shrinking at {len(merged)} chars (collapse pass {level}, "
+                f"REPORT_CHUNK_MAX_CHARS={max_chars}). Raise REPORT_CHUNK_MAX_CHARS to report on "
+                f"all {len(memory_lines)} memories."
+            )
+        section_notes = merged
+
+    # 3. REDUCE: Final report from the section notes
+    return (
+        "Please generate a Project Report from the following notes. Each section condenses "
+        "the memory log of one category and time window:\n\n" + section_notes
+    )
+
 def generate_project_report(memories):
     """
     Generates a comprehensive project report in Markdown format using the provided memories.
+    Large logs are map-reduced, see _report_prompt().
     """
-    if not API_KEY:
-        raise ValueError("GOOGLE_API_KEY is not set.")
+    provider = get_provider()
+    provider.ensure_ready()
 
-    model_name = os.environ.get('GEMINI_MODEL_NAME', 'gemini-2.5-flash-lite')
-    
-    # improved Prompt
-    system_instruction = (
-        "You are an expert Document Specialist.\n"
-        "GOAL: Analyze the provided project memories and generate a professional, structured Project Report in Markdown.\n\n"
-        "RULES:\n"
-        "0. **LANGUAGE DETECTION:** First, analyze the input memories to detect the dominant language. The report MUST effectively communicate in this language.\n"
-        "1. **STRICT OUTPUT LANGUAGE:** Generate the **ENTIRE** report (including headers, descriptions, and bullet points) in the **DETECTED LANGUAGE**.\n"
-        "2. **THEME IDENTIFICATION:** Identify the primary theme of this project.\n"
-        "3. **STRUCTURE:** Create a formal report structure based **ONLY** on the categories present in the data. Use clear H1, H2 headers.\n"
-        "4. **CONFLICT RESOLUTION:** For conflicting facts, **PRIORITIZE** the latest information based on the timestamps provided.\n"
-        "5. **FORMATTING:** Use professional Markdown. Use bullet points for readability. Use bold text for key figures or decisions.\n"
-        "6. **TONE:** Keep it professional, objective, and concise.\n"
-        "7. **Executive Summary:** Start with a brief Executive Summary of the project status and key facts.\n"
-        "8. **MISSING DATA:** If a category is missing, do not invent data. Just omit that section.\n"
+    try:
+        return provider.generate(REPORT_SYSTEM_INSTRUCTION, _report_prompt(provider, memories))
+
+    except Exception as e:
+        print(f"❌ Error generating report: {e}")
+        return f"# Error generating report\n\nAn error occurred: {str(e)}"
+
+def generate_project_report_stream(memories):
+    """
+    Streaming version of generate_project_report: yields Markdown text chunks as the
+    model produces them. Raises on failure (the caller decides what to store).
+    """
+    provider = get_provider()
+    provider.ensure_ready()
+    yield from provider.generate_stream(REPORT_SYSTEM_INSTRUCTION, _report_prompt(provider, memories))
+
+UPDATE_REPORT_INSTRUCTION = (
+    "You are an expert Document Specialist maintaining an existing Project Report.\n"
+    "GOAL: Apply a change log to the CURRENT REPORT and return the complete, updated report in Markdown.\n\n"
+    "RULES:\n"
+    "1. **KEEP LANGUAGE & STRUCTURE:** Keep the report's language, headers and style. Only restructure where the changes require it.\n"
+    "2. **ADDED FACTS:** Integrate every added memory into the right section. Create a section only if no existing one fits.\n"
+    "3. **REMOVED FACTS:** Remove or correct every statement that relies ONLY on a removed memory.\n"
+    "4. **CONFLICT RESOLUTION:** For conflicting facts, **PRIORITIZE** the latest information based on the timestamps provided.\n"
+    "5. **EXECUTIVE SUMMARY:** Update the Executive Summary if the changes affect it.\n"
+    "6. **OUTPUT:** Return ONLY the full updated report, no commentary about the changes.\n"
+)
+
+def _update_prompt(previous_report, added_memories, removed_memories):
+    def format_lines(memories):
+        return "\n".join(_format_memory_line(m) for m in memories) or "(none)"
+
+    return (
+        f"CURRENT REPORT:\n{previous_report}\n\n"
+        f"ADDED MEMORIES:\n{format_lines(added_memories)}\n\n"
+        f"REMOVED MEMORIES:\n{format_lines(removed_memories)}"
     )
 
-    try:
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            system_instruction=system_instruction
+def update_prompt_fits(previous_report, added_memories, removed_memories):
+    """
+    Whether the incremental update (previous report + change log) fits in one prompt of
+    REPORT_CHUNK_MAX_CHARS. Otherwise the report has to be rebuilt, map-reduced.
+    """
+    prompt = _update_prompt(previous_report, added_memories, removed_memories)
+    return len(prompt) <= getattr(settings, 'REPORT_CHUNK_MAX_CHARS', 30000)
+
+def _capped_update_prompt(previous_report, added_memories, removed_memories):
+    prompt = _update_prompt(previous_report, added_memories, removed_memories)
+    max_chars = getattr(settings, 'REPORT_CHUNK_MAX_CHARS', 30000)
+    if len(prompt) > max_chars:
+        raise ValueError(
+            f"Report update prompt is {len(prompt)} chars (REPORT_CHUNK_MAX_CHARS={max_chars}). "
+            "Rebuild the report instead, see update_prompt_fits()."
         )
-        
-        memory_lines = []
-        for m in memories:
-            timestamp = m.get('created_at', 'Unknown Time')
-            category = m.get('category', 'General')
-            text = m.get('raw_text', '')
-            memory_lines.append(f"[{timestamp}] [{category.upper()}]: {text}")
-            
-        full_text = "\n".join(memory_lines)
-        
-        prompt = f"Please generate a Project Report from the following memory log:\n\n{full_text}"
+    return prompt
 
-        response = model.generate_content(prompt)
-        
-        if response.text:
-            return response.text
-        return "# Error generating report."
+def update_project_report(previous_report, added_memories, removed_memories):
+    """
+    Updates an existing Markdown project report with only the memories added and
+    removed since it was generated (incremental export). Same memory dict format
+    as generate_project_report. Returns the full updated report.
+    Callers check update_prompt_fits() first; an oversized update yields an error report.
+    """
+    provider = get_provider()
+    provider.ensure_ready()
+
+    try:
+        prompt = _capped_update_prompt(previous_report, added_memories, removed_memories)
+        return provider.generate(UPDATE_REPORT_INSTRUCTION, prompt)
 
     except Exception as e:
-        print(f"❌ Error generating report: {e}")
+        print(f"❌ Error updating report: {e}")
         return f"# Error generating report\n\nAn error occurred: {str(e)}"
+
+def update_project_report_stream(previous_report, added_memories, removed_memories):
+    """Streaming version of update_project_report (yields text chunks, raises on failure)."""
+    provider = get_provider()
+    provider.ensure_ready()
+    prompt = _capped_update_prompt(previous_report, added_memories, removed_memories)
+    yield from provider.generate_stream(UPDATE_REPORT_INSTRUCTION, prompt)
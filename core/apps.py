@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Cache invalidation receivers (token / project deletion, user changes)
+        from . import auth  # noqa: F401
+
+        # The worker count isn't known here (WEB_CONCURRENCY, --workers, several hosts...)
+        if getattr(settings, 'CACHE_BACKEND', 'db') == 'locmem' and not settings.DEBUG:
+            print(
+                "⚠️ CACHE_BACKEND is 'locmem': every worker process keeps its own throttle counters, "
+                "auth and result caches. Use it for development only; set REDIS_URL or CACHE_BACKEND=db."
+            )
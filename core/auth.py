@@ -0,0 +1,154 @@
+"""
+Cached request authentication and project-ownership resolution for the memory endpoints.
+
+- CachedTokenAuthentication: token key -> (user, token) for AUTH_CACHE_TTL seconds.
+- resolve_project(): one `Project.objects.filter(id=..., user=...)` query, or none
+  at all when the caller only needs an owned project reference (load=False) and
+  (user, project) ownership is already cached.
+
+Both caches live in the shared cache tier (caches['default'], see CACHE_BACKEND),
+so the invalidation receivers below (token / project deletion, user changes such
+as deactivation) take effect in every worker at once. The token cache holds no
+secrets (see _credentials_entry), and each hit builds its own User instance, so
+concurrent requests never share one.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .cache_utils import record
+from .models import Project
+
+
+def _cache():
+    return caches['default']
+
+def _ttl():
+    return getattr(settings, 'AUTH_CACHE_TTL', 60)
+
+def _token_key(key):
+    # Hashed, so the shared cache (Redis, cache table, files) never holds usable tokens
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+def _ownership_key(user_id, project_uuid):
+    return f'auth:owner:{user_id}:{project_uuid}'
+
+# The User fields a cache hit carries; the rest (password hash included) load lazily if read
+CACHED_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+def _credentials_entry(user, token):
+    # Neither the token key (the request supplies it) nor the password hash is stored
+    return {
+        'user': {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+        'token_created': token.created,
+    }
+
+def _credentials(entry, key):
+    """(user, token) rebuilt from a _credentials_entry and the request's token key."""
+    # from_db() takes the values in model field order
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in entry['user']]
+    user = User.from_db('default', fields, [entry['user'][field] for field in fields])
+    token = Token.from_db('default', ['key', 'user_id', 'created'], [key, user.pk, entry['token_created']])
+    token.user = user
+    return user, token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication with the token -> user lookup cached (inactive users are never served)."""
+
+    def authenticate_credentials(self, key):
+        cache_key = _token_key(key)
+        cached = _cache().get(cache_key)
+        if cached is not None:
+            user, token = _credentials(cached, key)
+            if user.is_active:
+                record('auth_token', 'hits')
+                return user, token
+        record('auth_token', 'misses')
+
+        # Raises AuthenticationFailed for unknown keys and inactive users
+        user, token = super().authenticate_credentials(key)
+        _cache().set(cache_key, _credentials_entry(user, token), _ttl())
+        return user, token
+
+
+def _project_uuid(project_id):
+    """Canonical UUID of a client supplied id (so cache keys match), 404 if malformed."""
+    try:
+        return uuid.UUID(str(project_id))
+    except ValueError:
+        raise Http404("No Project matches the given query.")
+
+
+def _stub(project_uuid, user):
+    # Only pk and user are set, every other field is deferred (loaded on first access)
+    return Project.from_db('default', ['id', 'user_id'], [project_uuid, user.pk])
+
+
+def resolve_project(request, project_id, load=True):
+    """
+    The project `project_id` of the requesting user, or Http404 (unknown id and
+    foreign project alike). load=False allows answering from the ownership cache
+    with a reference whose other fields load lazily; callers reading project
+    state (data_version, name) must keep load=True.
+    """
+    project_uuid = _project_uuid(project_id)
+    key = _ownership_key(request.user.pk, project_uuid)
+
+    if not load:
+        if _cache().get(key):
+            record('auth_ownership', 'hits')
+            return _stub(project_uuid, request.user)
+        record('auth_ownership', 'misses')
+
+    project = Project.objects.filter(id=project_uuid, user=request.user).first()
+    if project is None:
+        raise Http404("No Project matches the given query.")
+    _cache().set(key, True, _ttl())
+    return project
+
+
+async def aresolve_project(request, project_id, load=True):
+    """resolve_project for the async views (the stub's deferred fields can't load there)."""
+    project_uuid = _project_uuid(project_id)
+    key = _ownership_key(request.user.pk, project_uuid)
+
+    if not load:
+        if await _cache().aget(key):
+            record('auth_ownership', 'hits')
+            return _stub(project_uuid, request.user)
+        record('auth_ownership', 'misses')
+
+    project = await Project.objects.filter(id=project_uuid, user=request.user).afirst()
+    if project is None:
+        raise Http404("No Project matches the given query.")
+    await _cache().aset(key, True, _ttl())
+    return project
+
+
+@receiver(post_delete, sender=Token)
+def _forget_token(sender, instance, **kwargs):
+    _cache().delete(_token_key(instance.key))
+
+
+@receiver(post_save, sender=User)
+def _forget_user_tokens(sender, instance, update_fields=None, **kwargs):
+    # Deactivation, password or permission changes: the next request re-authenticates
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    keys = [_token_key(key) for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True)]
+    if keys:
+        _cache().delete_many(keys)
+
+
+@receiver(post_delete, sender=Project)
+def _forget_project(sender, instance, **kwargs):
+    _cache().delete(_ownership_key(instance.user_id, instance.pk))
@@ -0,0 +1,94 @@
+"""
+Shared helpers of the benchmark management commands
+(seed_benchmark_data, benchmark_endpoints, benchmark_vector_indexes).
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+
+
+# Synthetic memory text: "<subject> <verb> <object> <detail>" in a few languages,
+# so the keyword side of hybrid search and the sniper delete see realistic words.
+SUBJECTS = [
+    'The team', 'Backend service', 'Frontend app', 'Ekip', 'Mobile client',
+    'Payment module', 'Search service', 'Proje yöneticisi', 'Data pipeline', 'Auth service'
+]
+VERBS = [
+    'will use', 'migrated to', 'decided on', 'dropped', 'kullanacak',
+    'depends on', 'benchmarked', 'approved', 'postponed', 'configured'
+]
+OBJECTS = [
+    'PostgreSQL', 'Redis', 'Django', 'React', 'Kubernetes', 'Stripe', 'Gemini',
+    'pgvector', 'Celery', 'Nginx', 'bütçe planı', 'şifreleme', 'Docker', 'Sentry'
+]
+DETAILS = [
+    'for the next release', 'before the deadline', 'with a budget of {n}k',
+    'in sprint {n}', 'after the {n}% load test', 'version {n}.0', '{n} gün içinde'
+]
+CATEGORIES = ['Tech', 'Budget', 'Task', 'Decision', 'Teknik', 'Plan']
+
+
+def synthetic_memory(rng):
+    """(raw_text, tags, category) for one synthetic memory."""
+    subject, verb, obj = rng.choice(SUBJECTS), rng.choice(VERBS), rng.choice(OBJECTS)
+    detail = rng.choice(DETAILS).format(n=rng.randint(1, 99))
+    return f"{subject} {verb} {obj} {detail}.", [obj, subject.split()[-1]], rng.choice(CATEGORIES)
+
+
+def synthetic_query(rng):
+    return f"What did we decide about {rng.choice(OBJECTS)} {rng.choice(DETAILS).format(n=rng.randint(1, 99))}?"
+
+
+def latency_summary(latencies_ms):
+    """p50 / p95 / p99 / mean / max of a list of latencies in milliseconds."""
+    if not latencies_ms:
+        return {'count': 0}
+    values = np.asarray(latencies_ms, dtype=float)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'count': int(values.size),
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'mean_ms': round(float(values.mean()), 2),
+        'max_ms': round(float(values.max()), 2),
+    }
+
+
+def run_metadata(label=None):
+    """Context stored with every result file, so runs can be compared across commits."""
+    try:
+        revision = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=settings.BASE_DIR, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+
+    return {
+        'label': label,
+        'git_revision': revision,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'ai_provider': getattr(settings, 'AI_PROVIDER', 'gemini'),
+        'vector_storage_mode': getattr(settings, 'VECTOR_STORAGE_MODE', 'full'),
+    }
+
+
+def write_results(path, results):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, default=str)
+
+
+def make_rng(seed):
+    return random.Random(seed)
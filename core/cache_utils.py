@@ -0,0 +1,10 @@
+"""Helpers shared by the caches built on the shared cache tier (auth, retrieval, embeddings)."""
+from . import timing
+
+
+def record(cache_name, event):
+    """Publishes one cache event on /metrics as memory_cache_events_total{cache, event}."""
+    timing.count(
+        'memory_cache_events_total', help_text='Cache lookups by outcome.',
+        cache=cache_name, event=event
+    )
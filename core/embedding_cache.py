@@ -0,0 +1,156 @@
+import hashlib
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import timing
+
+
+def normalize_text(text):
+    """
+    Normalizes text before hashing so that trivially different inputs
+    (extra whitespace, different unicode composition) share a cache entry.
+    """
+    text = unicodedata.normalize('NFC', str(text))
+    return " ".join(text.split())
+
+
+def make_key(model_name, task_type, text):
+    """Cache key: (model name, task_type, sha256 of the normalized text)."""
+    text_hash = hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+    return (model_name, task_type or '', text_hash)
+
+
+def _l1_key(key):
+    # L1 is caches['default'] (shared by all workers, see CACHE_BACKEND)
+    return 'embedding:' + ':'.join(key)
+
+
+def _l1_ttl():
+    return getattr(settings, 'EMBEDDING_CACHE_TTL', 24 * 3600)
+
+
+def _l1_store(entries):
+    try:
+        caches['default'].set_many(entries, _l1_ttl())
+    except Exception as e:
+        print(f"⚠️ Embedding cache write failed: {e}")
+
+
+_stats_lock = threading.Lock()
+_stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+    # Also published on /metrics
+    timing.count('memory_embedding_cache_lookups_total', help_text='Embedding cache lookups by outcome.', result=name)
+
+
+def _persist_enabled():
+    return getattr(settings, 'EMBEDDING_CACHE_PERSIST', True)
+
+
+def lookup(model_name, task_type, text):
+    """
+    Looks up an embedding in the shared cache tier first, then in the EmbeddingCache table.
+    Returns a list of floats or None on a miss.
+    """
+    return lookup_many(model_name, task_type, [text])[0]
+
+
+def lookup_many(model_name, task_type, texts):
+    """
+    Batched lookup. Returns a list aligned with `texts` (None for misses).
+    One get_many against the cache tier, then a single query against the DB tier
+    for everything it missed.
+    """
+    keys = [make_key(model_name, task_type, text) for text in texts]
+    try:
+        l1 = caches['default'].get_many({_l1_key(key) for key in keys})
+    except Exception as e:
+        # Same rule as the DB tier: a cache outage only costs API calls
+        print(f"⚠️ Embedding cache lookup failed: {e}")
+        l1 = {}
+    results = [l1.get(_l1_key(key)) for key in keys]
+    missing = [i for i, vector in enumerate(results) if vector is None]
+
+    for i, vector in enumerate(results):
+        if vector is not None:
+            _count('l1_hits')
+
+    if missing and _persist_enabled():
+        from .models import EmbeddingCache
+        try:
+            # Savepoint: a failure must not abort the caller's transaction
+            with transaction.atomic():
+                rows = dict(EmbeddingCache.objects.filter(
+                    model_name=model_name,
+                    task_type=task_type or '',
+                    text_hash__in={keys[i][2] for i in missing}
+                ).values_list('text_hash', 'vector'))
+        except Exception as e:
+            # The cache must never break embedding generation
+            print(f"⚠️ Embedding cache lookup failed: {e}")
+            rows = {}
+
+        promote = {}
+        for i in missing:
+            row = rows.get(keys[i][2])
+            if row is not None:
+                results[i] = [float(x) for x in row]
+                promote[_l1_key(keys[i])] = results[i]
+                _count('l2_hits')
+        if promote:
+            _l1_store(promote)
+
+    for vector in results:
+        if vector is None:
+            _count('misses')
+
+    return results
+
+
+def store(model_name, task_type, text, vector):
+    """Stores an embedding in both tiers."""
+    store_many(model_name, task_type, [(text, vector)])
+
+
+def store_many(model_name, task_type, items):
+    """Stores (text, vector) pairs in both tiers with one INSERT."""
+    from .models import EmbeddingCache
+
+    rows, l1 = [], {}
+    for text, vector in items:
+        key = make_key(model_name, task_type, text)
+        l1[_l1_key(key)] = vector
+        rows.append(EmbeddingCache(model_name=key[0], task_type=key[1], text_hash=key[2], vector=vector))
+    if l1:
+        _l1_store(l1)
+
+    if rows and _persist_enabled():
+        try:
+            with transaction.atomic():
+                EmbeddingCache.objects.bulk_create(rows, ignore_conflicts=True)
+        except Exception as e:
+            print(f"⚠️ Embedding cache write failed: {e}")
+
+
+def stats():
+    """Returns hit/miss counters for this process."""
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['l1_hits'] + data['l2_hits'] + data['misses']
+    data['hit_rate'] = round((data['l1_hits'] + data['l2_hits']) / lookups, 4) if lookups else 0.0
+    return data
+
+
+def clear():
+    """Resets this process's counters (cached entries are kept)."""
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
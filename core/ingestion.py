@@ -0,0 +1,290 @@
+import asyncio
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections, connection
+from rest_framework import status
+
+from .models import Memory
+from .utils import decrypt_all
+from . import ai_services, search, vector_search, timing
+
+# Cosine distance below which an extracted fact counts as already known
+DUPLICATE_DISTANCE = 0.05
+
+CORRECTION_KEYWORDS = {
+    'correction', 'change', 'update', 'düzeltme', 'degisiklik', 
+    'yenileme', 'revizyon', 'guncelleme', 
+    'status', 'durum', 'pending', 'beklemede', 'draft', 'taslak'
+}
+
+def is_correction(item):
+    """Corrections and status changes must never be swallowed by deduplication."""
+    # Etiketleri, kategoriyi ve metni birleştirip tek seferde kontrol ediyoruz
+    # tags listesindeki elemanları string'e çevirmeyi garantiye alıyoruz
+    tags_str = " ".join([str(t) for t in item.get('tags', [])])
+    check_text = (item.get('raw_text', '') + " " + str(item.get('category', 'other')) + " " + tags_str).lower()
+    return any(k in check_text for k in CORRECTION_KEYWORDS)
+
+@timing.span('db.dedup_lookup')
+def find_nearest_memories(project, vectors):
+    """
+    Finds the nearest existing memory of the project for every candidate vector
+    in a single query (VALUES list + LATERAL top-1 lookup, each served by the HNSW index).
+    Returns a list aligned with `vectors` of (memory_id, distance), or (None, None)
+    when the project has no memories.
+    """
+    if not vectors:
+        return []
+
+    values_sql = ", ".join(["(%s, %s::vector)"] * len(vectors))
+    params = []
+    for i, vector in enumerate(vectors):
+        params.extend([i, vector_search.to_sql_vector(vector)])
+    params.append(str(project.id))
+
+    sql = f"""
+        SELECT c.idx, n.id, n.distance
+        FROM (VALUES {values_sql}) AS c(idx, vec)
+        LEFT JOIN LATERAL ({vector_search.nearest_sql('c.vec', '%s', '1')}) n ON true
+    """
+
+    with vector_search.tuned():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+    results = [(None, None)] * len(vectors)
+    for idx, memory_id, distance in rows:
+        results[idx] = (memory_id, distance)
+    return results
+
+@timing.span('dedup.batch')
+def find_batch_duplicates(vectors):
+    """
+    Compares the candidate vectors with each other locally (cosine matrix).
+    Returns, for every index i, the earlier indexes j < i that i duplicates.
+    """
+    if len(vectors) < 2:
+        return [[] for _ in vectors]
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    distances = 1.0 - matrix @ matrix.T
+
+    return [
+        [j for j in range(i) if distances[i, j] < DUPLICATE_DISTANCE]
+        for i in range(len(vectors))
+    ]
+
+def _format_context(similar_memories, recent_memories):
+    """Merges both context sources into the history block given to the extraction prompt."""
+    # Merge & Deduplicate
+    context_pool = {m.id: m for m in similar_memories + recent_memories}.values()
+
+    # Sort by Created At (Oldest -> Newest) so the AI reads the story in order
+    sorted_pool = decrypt_all(sorted(context_pool, key=lambda x: x.created_at))
+
+    # Format as string
+    context_lines = []
+    for m in sorted_pool:
+        date_str = m.created_at.strftime("%Y-%m-%d %H:%M")
+        context_lines.append(f"- [{date_str}] {m.raw_text}")
+
+    context_str = "\n".join(context_lines)
+    print(f"🧠 INJECTING CONTEXT ({len(sorted_pool)} items):\n{context_str[:200]}...")
+    return context_str
+
+def _recent_memories(project):
+    return Memory.objects.filter(project=project).slim().order_by('-created_at')[:10] # Last 10 items (Expanded)
+
+def _no_memory_extracted():
+    return {
+        "message": "No significant memory extracted from the text.",
+        "created_count": 0,
+        "results": []
+    }, status.HTTP_200_OK
+
+def ingest_memory(project, text):
+    """
+    Runs the full store pipeline for one chat turn:
+    context lookup -> AI extraction -> batched embeddings -> dedup -> save.
+    Shared by StoreMemoryView (sync mode) and the ingestion worker (async mode).
+    Returns (payload dict, HTTP status code).
+    """
+    # 1. RETRIEVE CONTEXT (Source A + Source B) to enable "Context-Aware Math"
+    # We need to give the AI the current state (e.g. "Budget is 500") so it can process "Add 50" -> 550.
+
+    context_str = ""
+    try:
+        # Generate embedding for the *current* input to find similar past memories
+        current_embedding = ai_services.get_embedding(text)
+
+        if current_embedding:
+            # Source A: Similarity (Find relevant topics like "Budget" or "Weight")
+            similar_memories = search.nearest_memories(project, current_embedding, 15) # Top 15 relevant (Expanded)
+
+            # Source B: Recency (Find specific immediate context like "I just said X")
+            # We need the absolute latest memories to handle "Add 5 to that"
+            recent_memories = list(_recent_memories(project))
+
+            context_str = _format_context(similar_memories, recent_memories)
+
+    except Exception as e:
+        print(f"⚠️ Error retrieving context: {e}")
+        # Non-blocking: proceed without context if this fails
+
+    # 2. Analyze and extract memory (WITH CONTEXT)
+    # Returns LIST of dicts [{'raw_text': str, 'tags': list, 'category': str}] or []
+    extraction_results = ai_services.analyze_and_extract_memory(text, context_str)
+    print(f"🧠 DEBUG EXTRACTION: {extraction_results}")
+
+    if not extraction_results:
+        return _no_memory_extracted()
+
+    facts = [item for item in extraction_results if item.get('raw_text')]
+
+    # 2. Get embeddings for all extracted facts in a single batched call
+    embeddings = ai_services.get_embeddings([item.get('raw_text') for item in facts])
+
+    return _save_facts(project, extraction_results, facts, embeddings)
+
+async def aingest_memory(project, text):
+    """
+    ingest_memory for the ASGI views: same steps, but the AI calls are awaited
+    (no thread held while the model answers) and the two context queries run
+    concurrently. Returns (payload dict, HTTP status code).
+    """
+    # 1. RETRIEVE CONTEXT (Source A and Source B concurrently)
+    context_str = ""
+    try:
+        current_embedding = await ai_services.aget_embedding(text)
+
+        if current_embedding:
+            async def recent():
+                return [m async for m in _recent_memories(project)]
+
+            # Similarity on a thread of its own, recency through the async ORM
+            similar_memories, recent_memories = await asyncio.gather(
+                _parallel_query(search.nearest_memories, project, current_embedding, 15),
+                recent()
+            )
+            context_str = _format_context(similar_memories, recent_memories)
+
+    except Exception as e:
+        print(f"⚠️ Error retrieving context: {e}")
+
+    # 2. Analyze and extract memory (WITH CONTEXT)
+    extraction_results = await ai_services.aanalyze_and_extract_memory(text, context_str)
+    print(f"🧠 DEBUG EXTRACTION: {extraction_results}")
+
+    if not extraction_results:
+        return _no_memory_extracted()
+
+    facts = [item for item in extraction_results if item.get('raw_text')]
+    embeddings = await ai_services.aget_embeddings([item.get('raw_text') for item in facts])
+
+    # 3-4. Dedup + save: a few short queries, kept on the request's ORM thread
+    return await sync_to_async(_save_facts)(project, extraction_results, facts, embeddings)
+
+async def _parallel_query(fn, *args):
+    """
+    Runs a read query on a thread (and DB connection) of its own instead of the
+    request's single ORM thread, so independent queries of one request overlap.
+    The executor thread is shared with unrelated work and never sees
+    request_finished, so its connection is closed as soon as the query is done.
+    """
+    def run():
+        close_old_connections()
+        try:
+            return fn(*args)
+        finally:
+            connection.close()
+    return await sync_to_async(run, thread_sensitive=False)()
+
+def _save_facts(project, extraction_results, facts, embeddings):
+    """
+    Dedup + save steps of the store pipeline for the extracted `facts` and their
+    `embeddings` (aligned lists). Returns (payload dict, HTTP status code).
+    """
+    saved_memories = []
+    ignored_memories = []
+
+    candidates = []
+    for item, embedding in zip(facts, embeddings):
+        if not embedding:
+            print(f"❌ Failed to generate embedding for: {item.get('raw_text')}")
+            continue
+        candidates.append((item, embedding))
+
+    # 3. DEDUPLICATION CHECK
+    # A) CORRECTION BYPASS
+    corrections = [is_correction(item) for item, _ in candidates]
+
+    # B) STANDARD DEDUPLICATION (one round trip for every non-correction fact)
+    vectors = [embedding for _, embedding in candidates]
+    lookup_indexes = [i for i, correction in enumerate(corrections) if not correction]
+    nearest = dict(zip(lookup_indexes, find_nearest_memories(project, [vectors[i] for i in lookup_indexes])))
+
+    # C) IN-BATCH DEDUPLICATION (two near-identical facts in the same extraction)
+    batch_duplicates = find_batch_duplicates(vectors)
+
+    to_create = []
+    kept = set()
+    for i, (item, embedding) in enumerate(candidates):
+        extracted_text = item.get('raw_text')
+
+        if corrections[i]:
+            print("🚀 Correction detected. Skipping deduplication.")
+        else:
+            neighbor_id, distance = nearest.get(i, (None, None))
+            if neighbor_id is not None and distance < DUPLICATE_DISTANCE:
+                print(f"🛑 Duplicate blocked. Distance: {distance}")
+                ignored_memories.append({
+                    "text": extracted_text,
+                    "reason": "Duplicate"
+                })
+                continue
+
+            if any(j in kept for j in batch_duplicates[i]):
+                print(f"🛑 In-batch duplicate blocked: {extracted_text}")
+                ignored_memories.append({
+                    "text": extracted_text,
+                    "reason": "Duplicate"
+                })
+                continue
+
+        kept.add(i)
+        to_create.append(Memory(
+            project=project,
+            raw_text=extracted_text,
+            vector=embedding,
+            tags=item.get('tags', []),
+            category=item.get('category', 'other'),
+            source="user_conversation"
+        ))
+
+    # 4. Save Memories (single INSERT)
+    # bulk_create bypasses save(), so fill the derived search columns here
+    for memory in to_create:
+        memory.update_search_fields()
+
+    # Also bumps Project.data_version in the same transaction
+    with timing.span('db.save'):
+        created = Memory.objects.bulk_create(to_create) if to_create else []
+
+    for memory in created:
+        saved_memories.append({
+            "id": memory.id,
+            "text": str(memory.raw_text),
+            "category": memory.category
+        })
+
+    return {
+        "message": f"Processed {len(extraction_results)} facts.",
+        "created_count": len(saved_memories),
+        "saved": saved_memories,
+        "ignored": ignored_memories
+    }, status.HTTP_201_CREATED
@@ -0,0 +1,72 @@
+import glob
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import profile_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Merges the dumps written by ProfilingMiddleware. .prof files are combined with "
+        "pstats and the top functions printed; .collapsed files are summed into one "
+        "flamegraph-ready file and the hottest frames printed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help="Default: PROFILING_DIR.")
+        parser.add_argument('--endpoint', help="Only dumps of this endpoint (URL name, e.g. store-memory).")
+        parser.add_argument('--format', choices=['prof', 'collapsed'], default='prof')
+        parser.add_argument('--sort', default='cumulative', help="pstats sort key (cumulative, tottime, calls, ...).")
+        parser.add_argument('--limit', type=int, default=30)
+        parser.add_argument('--output', help="Write the merged profile (.prof or .collapsed) to this path.")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or profile_dir()
+        pattern = f"*_{options['endpoint']}_*" if options['endpoint'] else '*'
+        files = sorted(glob.glob(os.path.join(directory, f"{pattern}.{options['format']}")))
+        if not files:
+            raise CommandError(f"No .{options['format']} dumps found in {directory}")
+
+        self.stdout.write(f"📚 Merging {len(files)} dumps from {directory}")
+        if options['format'] == 'prof':
+            self.merge_prof(files, options)
+        else:
+            self.merge_collapsed(files, options)
+
+    def merge_prof(self, files, options):
+        output = io.StringIO()
+        stats = pstats.Stats(*files, stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
+
+        if options['output']:
+            stats.dump_stats(options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Merged profile saved to {options['output']}"))
+
+    def merge_collapsed(self, files, options):
+        stacks = Counter()
+        for path in files:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, samples = line.rstrip('\n').rpartition(' ')
+                    if stack and samples.isdigit():
+                        stacks[stack] += int(samples)
+
+        total = sum(stacks.values())
+        self_samples = Counter()
+        for stack, samples in stacks.items():
+            self_samples[stack.rsplit(';', 1)[-1]] += samples
+
+        self.stdout.write(f"{total} samples. Hottest frames (self time):")
+        for frame, samples in self_samples.most_common(options['limit']):
+            self.stdout.write(f"  {samples / total:6.1%}  {frame}")
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                for stack, samples in stacks.most_common():
+                    f.write(f"{stack} {samples}\n")
+            self.stdout.write(self.style.SUCCESS(f"Merged stacks saved to {options['output']} (flamegraph.pl / speedscope)"))
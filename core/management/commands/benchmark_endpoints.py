@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.throttling import SimpleRateThrottle
+
+from core import benchmarks
+from core.models import Project, Memory
+
+SCENARIOS = {
+    'store': '/api/memories/store/',
+    'retrieve': '/api/memories/retrieve/',
+    'delete': '/api/memories/delete/',
+    'export': '/api/projects/export/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the store / retrieve / delete / export endpoints concurrently against the data "
+        "created by seed_benchmark_data, and reports p50/p95/p99 latency, throughput and "
+        "queries per request as JSON. Runs in-process through the Django test client by default "
+        "(one DB connection per thread, throttling disabled), or against a running server with --base-url. "
+        "Use AI_PROVIDER=local to measure the server without live AI calls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenarios', default='retrieve,export,store,delete',
+            help=f"Comma separated, run in this order. Available: {', '.join(SCENARIOS)}. "
+                 "store/delete change the seeded data."
+        )
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario.")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--prefix', default='bench', help="Username prefix used by seed_benchmark_data.")
+        parser.add_argument('--export-format', default='md', choices=['md', 'pdf'])
+        parser.add_argument('--base-url', help="e.g. http://localhost:8000. Queries per request are not measured.")
+        parser.add_argument('--keep-throttling', action='store_true', help="In-process only: keep DRF throttles active.")
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--label', help="Free text stored with the results (e.g. branch name).")
+        parser.add_argument(
+            '--output',
+            default=f"benchmark_results/endpoints_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        # (token, project id) pairs of the seeded users
+        targets = [
+            (project.user.auth_token.key, str(project.id))
+            for project in Project.objects.filter(user__username__startswith=f"{options['prefix']}_user_")
+                                          .select_related('user__auth_token')
+        ]
+        if not targets:
+            raise CommandError("No seeded projects found. Run seed_benchmark_data first.")
+
+        if getattr(settings, 'AI_PROVIDER', 'gemini') != 'local':
+            self.stdout.write(self.style.WARNING(
+                "⚠️ AI_PROVIDER is not 'local': store/retrieve/export will call the live AI API."
+            ))
+
+        self.options = options
+        self._local = threading.local()
+
+        results = {
+            'meta': benchmarks.run_metadata(options['label']),
+            'config': {
+                'requests': options['requests'],
+                'concurrency': options['concurrency'],
+                'mode': 'http' if options['base_url'] else 'in_process',
+                'export_format': options['export_format'],
+            },
+            'dataset': {
+                'projects': len(targets),
+                'memories': Memory.objects.filter(project_id__in=[pid for _, pid in targets]).count(),
+            },
+            'scenarios': {},
+        }
+
+        for name in scenarios:
+            self.stdout.write(f"▶ {name}: {options['requests']} requests, concurrency {options['concurrency']}")
+            summary = self.run_scenario(name, targets)
+            results['scenarios'][name] = summary
+            self.stdout.write(
+                f"  p50 {summary.get('p50_ms')} ms | p95 {summary.get('p95_ms')} ms | p99 {summary.get('p99_ms')} ms | "
+                f"{summary['throughput_rps']} req/s | {summary['queries_per_request']} queries/req | "
+                f"status {summary['status_codes']}"
+            )
+
+        benchmarks.write_results(options['output'], results)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    # ---------------- SCENARIOS ----------------
+
+    def payload(self, name, project_id, rng):
+        if name == 'store':
+            raw_text, _, _ = benchmarks.synthetic_memory(rng)
+            return {'project_id': project_id, 'text': f"User: {raw_text}\n\nAI: Noted."}
+        if name == 'retrieve':
+            return {'project_id': project_id, 'query': benchmarks.synthetic_query(rng)}
+        if name == 'delete':
+            return {'project_id': project_id, 'target_text': rng.choice(benchmarks.OBJECTS)}
+        return {'project_id': project_id, 'format': self.options['export_format']}
+
+    def run_scenario(self, name, targets):
+        path = SCENARIOS[name]
+        send = self.send_http if self.options['base_url'] else self.send_in_process
+
+        def one_request(i):
+            rng = benchmarks.make_rng(self.options['seed'] * 1_000_003 + i)
+            token, project_id = rng.choice(targets)
+            return send(path, self.payload(name, project_id, rng), token)
+
+        throttle_patch = mock.patch.object(SimpleRateThrottle, 'allow_request', return_value=True)
+        disable_throttling = not self.options['base_url'] and not self.options['keep_throttling']
+
+        if disable_throttling:
+            throttle_patch.start()
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.options['concurrency']) as executor:
+                samples = list(executor.map(one_request, range(self.options['requests'])))
+            wall_time = time.perf_counter() - started
+        finally:
+            if disable_throttling:
+                throttle_patch.stop()
+
+        latencies = [latency for _, latency, _ in samples]
+        queries = [count for _, _, count in samples if count is not None]
+
+        summary = benchmarks.latency_summary(latencies)
+        summary['wall_time_s'] = round(wall_time, 3)
+        summary['throughput_rps'] = round(len(samples) / wall_time, 2) if wall_time else None
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2) if queries else None
+        summary['max_queries_per_request'] = max(queries) if queries else None
+        summary['status_codes'] = dict(Counter(str(status_code) for status_code, _, _ in samples))
+        return summary
+
+    # ---------------- TRANSPORTS ----------------
+
+    def send_in_process(self, path, payload, token):
+        """(status, latency ms, query count) through the Django test client (one per thread)."""
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client(raise_request_exception=False)
+
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.post(
+                path, payload, content_type='application/json',
+                headers={'Authorization': f"Token {token}"}
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            latency = (time.perf_counter() - started) * 1000
+
+        return response.status_code, latency, len(captured.captured_queries)
+
+    def send_http(self, path, payload, token):
+        """(status, latency ms, None) against a running server."""
+        request = urllib.request.Request(
+            self.options['base_url'].rstrip('/') + path,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Authorization': f"Token {token}"},
+            method='POST'
+        )
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                status_code = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status_code = e.code
+        except urllib.error.URLError as e:
+            status_code = f"error: {e.reason}"
+        return status_code, (time.perf_counter() - started) * 1000, None
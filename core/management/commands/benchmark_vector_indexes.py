@@ -0,0 +1,308 @@
+import io
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmarks, vector_search
+from core.vector_search import VECTOR_DIMENSIONS
+
+# Scratch table with the same column names as core_memory, so the exact
+# vector_search.nearest_sql() used by the views runs against it.
+TABLE = 'vector_index_benchmark'
+INDEX = f'{TABLE}_ann_idx'
+
+VARIANTS = ('exact', 'hnsw', 'ivfflat', 'half', 'binary')
+
+
+def int_list(value):
+    return [int(x) for x in value.split(',') if x.strip()]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recall / latency harness for vector index configurations. Loads a synthetic clustered "
+        f"{VECTOR_DIMENSIONS}-d dataset into a scratch table ({TABLE}), then runs the views' "
+        "nearest-neighbour SQL under exact scan, HNSW, IVFFlat and halfvec / bit first-pass variants. "
+        "Reports recall@k against exact ground truth, query latency, index build time and size."
+    )
+
+    def add_arguments(self, parser):
+        # Dataset
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--clusters', type=int, default=100)
+        parser.add_argument('--noise', type=float, default=0.5, help="Spread of points around their cluster center.")
+        parser.add_argument('--projects', type=int, default=1, help="Rows are spread over this many project ids (filtered search).")
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        # Configurations
+        parser.add_argument('--variants', default=','.join(VARIANTS), help=f"Comma separated: {', '.join(VARIANTS)}")
+        parser.add_argument('--hnsw-m', type=int_list, default=[16])
+        parser.add_argument('--hnsw-ef-construction', type=int_list, default=[64])
+        parser.add_argument('--hnsw-ef-search', type=int_list, default=[40, 100, 200])
+        parser.add_argument('--ivfflat-lists', type=int_list, default=None, help="Default: rows / 1000 (min 10).")
+        parser.add_argument('--ivfflat-probes', type=int_list, default=[1, 10, 40])
+        parser.add_argument('--rerank-candidates', type=int_list, default=[100], help="First-pass size of half/binary.")
+        parser.add_argument('--maintenance-work-mem', default='512MB')
+        parser.add_argument('--warmup', type=int, default=10, help="Untimed queries before each configuration.")
+        # Output
+        parser.add_argument('--keep-table', action='store_true', help="Keep the scratch table (reused by the next run with the same dataset).")
+        parser.add_argument('--label')
+        parser.add_argument(
+            '--output',
+            default=f"benchmark_results/vector_indexes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        variants = [v.strip() for v in options['variants'].split(',') if v.strip()]
+        unknown = set(variants) - set(VARIANTS)
+        if unknown:
+            raise CommandError(f"Unknown variants: {', '.join(sorted(unknown))}")
+
+        version = self.pgvector_version()
+        supports_quantized = version >= (0, 7, 0)  # halfvec, bit HNSW, binary_quantize
+        for variant in ('half', 'binary'):
+            if variant in variants and not supports_quantized:
+                self.stdout.write(self.style.WARNING(
+                    f"⚠️ Skipping '{variant}': needs pgvector >= 0.7.0 (installed {'.'.join(map(str, version))})"
+                ))
+                variants.remove(variant)
+
+        # 1. Dataset (regenerated from the seed; the table is reused when it matches)
+        vectors, projects, queries, query_projects = self.generate()
+        self.load(vectors, projects, supports_quantized)
+
+        # 2. Exact ground truth (NumPy, same project filter as the SQL)
+        truth = self.ground_truth(vectors, projects, queries, query_projects)
+
+        rows = []
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SET maintenance_work_mem = %s", [options['maintenance_work_mem']])
+
+            for variant in variants:
+                rows.extend(getattr(self, f"run_{variant}")(queries, query_projects, truth))
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+                if not options['keep_table']:
+                    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+        benchmarks.write_results(options['output'], {
+            'meta': benchmarks.run_metadata(options['label']),
+            'pgvector_version': '.'.join(map(str, version)),
+            'dataset': self.dataset_params(),
+            'results': rows,
+        })
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {options['output']}"))
+
+    # ---------------- DATASET ----------------
+
+    def dataset_params(self):
+        return {key: self.options[key] for key in ('rows', 'clusters', 'noise', 'projects', 'queries', 'k', 'seed')}
+
+    def generate(self):
+        """Clustered unit vectors: cluster center + gaussian noise, normalized (float32)."""
+        o = self.options
+        rng = np.random.default_rng(o['seed'])
+
+        centers = rng.standard_normal((o['clusters'], VECTOR_DIMENSIONS)).astype(np.float32)
+        centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+        def sample(n):
+            labels = rng.integers(0, o['clusters'], n)
+            noise = rng.standard_normal((n, VECTOR_DIMENSIONS)).astype(np.float32) / np.sqrt(VECTOR_DIMENSIONS)
+            points = centers[labels] + o['noise'] * noise
+            return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+        vectors = sample(o['rows'])
+        projects = rng.integers(0, o['projects'], o['rows'])
+        queries = sample(o['queries'])
+        query_projects = rng.integers(0, o['projects'], o['queries'])
+        return vectors, projects, queries, query_projects
+
+    def load(self, vectors, projects, supports_quantized):
+        signature = json.dumps(self.dataset_params(), sort_keys=True)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", [TABLE])
+            if cursor.fetchone()[0] == signature:
+                self.stdout.write(f"♻️ Reusing {TABLE} ({len(vectors)} rows)")
+                return
+
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            quantized_columns = (
+                f", vector_half halfvec({VECTOR_DIMENSIONS}), vector_bit bit({VECTOR_DIMENSIONS})"
+                if supports_quantized else ""
+            )
+            cursor.execute(
+                f"CREATE TABLE {TABLE} (id bigint PRIMARY KEY, project_id integer NOT NULL, "
+                f"vector vector({VECTOR_DIMENSIONS}) NOT NULL{quantized_columns})"
+            )
+
+            started = time.perf_counter()
+            batch_size = 10000
+            for start in range(0, len(vectors), batch_size):
+                buffer = io.StringIO()
+                for i in range(start, min(start + batch_size, len(vectors))):
+                    buffer.write(f"{i}\t{projects[i]}\t[{','.join(map(str, vectors[i].tolist()))}]\n")
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {TABLE} (id, project_id, vector) FROM STDIN", buffer)
+                self.stdout.write(f"… {min(start + batch_size, len(vectors))}/{len(vectors)} rows loaded")
+
+            if supports_quantized:
+                # Same quantization as vector_search.quantize() / quantize_vectors
+                cursor.execute(
+                    f"UPDATE {TABLE} SET vector_half = vector::halfvec({VECTOR_DIMENSIONS}), "
+                    f"vector_bit = binary_quantize(vector)::bit({VECTOR_DIMENSIONS})"
+                )
+
+            # core_memory has a btree index on project_id (ForeignKey)
+            cursor.execute(f"CREATE INDEX {TABLE}_project_idx ON {TABLE} (project_id)")
+            cursor.execute(f"ANALYZE {TABLE}")
+            cursor.execute(f"COMMENT ON TABLE {TABLE} IS %s", [signature])
+            self.stdout.write(f"📦 Loaded {len(vectors)} rows in {time.perf_counter() - started:.1f}s")
+
+    def ground_truth(self, vectors, projects, queries, query_projects):
+        k = self.options['k']
+        truth = []
+        for query, project in zip(queries, query_projects):
+            similarity = vectors @ query
+            similarity[projects != project] = -np.inf
+            top = np.argpartition(-similarity, k)[:k] if len(similarity) > k else np.arange(len(similarity))
+            truth.append({int(i) for i in top if np.isfinite(similarity[i])})
+        return truth
+
+    # ---------------- MEASUREMENT ----------------
+
+    def pgvector_version(self):
+        version = vector_search.pgvector_version()
+        if version is None:
+            raise CommandError("The pgvector extension is not installed in this database.")
+        return version
+
+    def build_index(self, ddl):
+        """(build seconds, size MB) for `ddl`, replacing the previous ANN index."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+            started = time.perf_counter()
+            cursor.execute(ddl)
+            build_time = time.perf_counter() - started
+            cursor.execute(f"ANALYZE {TABLE}")
+            cursor.execute("SELECT pg_relation_size(%s::regclass)", [INDEX])
+            size = cursor.fetchone()[0]
+        self.stdout.write(f"🏗️ {ddl.split(' USING ')[1]} built in {build_time:.1f}s ({size / 1024 / 1024:.1f} MB)")
+        return round(build_time, 3), round(size / 1024 / 1024, 2)
+
+    def measure(self, variant, queries, query_projects, truth, mode, extra=None, candidates=None, index=None, search=None):
+        k = self.options['k']
+        sql = vector_search.nearest_sql(
+            '%(vector)s::vector', '%(project_id)s', '%(limit)s',
+            mode=mode, candidates=candidates, table=TABLE
+        )
+
+        def params(i):
+            return {
+                'vector': vector_search.to_sql_vector(queries[i]),
+                'project_id': int(query_projects[i]),
+                'limit': k,
+            }
+
+        latencies, recalls = [], []
+        # search_params() from settings apply too; `extra` overrides them per configuration
+        with vector_search.tuned(extra):
+            with connection.cursor() as cursor:
+                for i in range(min(self.options['warmup'], len(queries))):
+                    cursor.execute(sql, params(i))
+                    cursor.fetchall()
+
+                for i in range(len(queries)):
+                    started = time.perf_counter()
+                    cursor.execute(sql, params(i))
+                    found = {row[0] for row in cursor.fetchall()}
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if truth[i]:
+                        recalls.append(len(found & truth[i]) / len(truth[i]))
+
+        summary = benchmarks.latency_summary(latencies)
+        row = {
+            'variant': variant,
+            'index': index or {},
+            'search': search or {},
+            f'recall_at_{k}': round(float(np.mean(recalls)), 4) if recalls else None,
+            'qps': round(len(latencies) / (sum(latencies) / 1000), 1) if latencies else None,
+            **summary,
+        }
+        self.stdout.write(
+            f"  {variant:<8} {json.dumps(row['index'])} {json.dumps(row['search'])} -> "
+            f"recall@{k} {row[f'recall_at_{k}']} | p50 {summary.get('p50_ms')} ms | p95 {summary.get('p95_ms')} ms"
+        )
+        return row
+
+    # ---------------- VARIANTS ----------------
+
+    def run_exact(self, queries, query_projects, truth):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+        return [self.measure('exact', queries, query_projects, truth, vector_search.STORAGE_FULL)]
+
+    def run_hnsw(self, queries, query_projects, truth):
+        rows = []
+        for m in self.options['hnsw_m']:
+            for ef_construction in self.options['hnsw_ef_construction']:
+                build_time, size_mb = self.build_index(
+                    f"CREATE INDEX {INDEX} ON {TABLE} USING hnsw (vector vector_cosine_ops) "
+                    f"WITH (m = {m}, ef_construction = {ef_construction})"
+                )
+                index = {'m': m, 'ef_construction': ef_construction, 'build_time_s': build_time, 'size_mb': size_mb}
+                for ef_search in self.options['hnsw_ef_search']:
+                    rows.append(self.measure(
+                        'hnsw', queries, query_projects, truth, vector_search.STORAGE_FULL,
+                        extra={'hnsw.ef_search': ef_search}, index=index, search={'ef_search': ef_search}
+                    ))
+        return rows
+
+    def run_ivfflat(self, queries, query_projects, truth):
+        rows = []
+        for lists in self.options['ivfflat_lists'] or [max(10, self.options['rows'] // 1000)]:
+            build_time, size_mb = self.build_index(
+                f"CREATE INDEX {INDEX} ON {TABLE} USING ivfflat (vector vector_cosine_ops) WITH (lists = {lists})"
+            )
+            index = {'lists': lists, 'build_time_s': build_time, 'size_mb': size_mb}
+            for probes in self.options['ivfflat_probes']:
+                rows.append(self.measure(
+                    'ivfflat', queries, query_projects, truth, vector_search.STORAGE_FULL,
+                    extra={'ivfflat.probes': probes}, index=index, search={'probes': probes}
+                ))
+        return rows
+
+    def _run_quantized(self, variant, mode, opclass_ddl, queries, query_projects, truth):
+        rows = []
+        m, ef_construction = self.options['hnsw_m'][0], self.options['hnsw_ef_construction'][0]
+        build_time, size_mb = self.build_index(
+            f"CREATE INDEX {INDEX} ON {TABLE} USING hnsw ({opclass_ddl}) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})"
+        )
+        index = {'m': m, 'ef_construction': ef_construction, 'build_time_s': build_time, 'size_mb': size_mb}
+        for ef_search in self.options['hnsw_ef_search']:
+            for candidates in self.options['rerank_candidates']:
+                # HNSW returns at most ef_search rows, which caps the first pass
+                rows.append(self.measure(
+                    variant, queries, query_projects, truth, mode,
+                    extra={'hnsw.ef_search': ef_search}, candidates=candidates, index=index,
+                    search={'ef_search': ef_search, 'rerank_candidates': candidates}
+                ))
+        return rows
+
+    def run_half(self, queries, query_projects, truth):
+        return self._run_quantized('half', vector_search.STORAGE_HALF, 'vector_half halfvec_cosine_ops',
+                                   queries, query_projects, truth)
+
+    def run_binary(self, queries, query_projects, truth):
+        return self._run_quantized('binary', vector_search.STORAGE_BINARY, 'vector_bit bit_hamming_ops',
+                                   queries, query_projects, truth)
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from core import vector_search
+from core.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates a partial HNSW index (WHERE project_id = ...) for every project with at least "
+        "--min-memories rows, so filtered vector search on large projects keeps its recall. "
+        "The index is built on the column the configured VECTOR_STORAGE_MODE searches; "
+        "per-project indexes of the other modes are dropped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-memories', type=int,
+            default=getattr(settings, 'VECTOR_PROJECT_INDEX_MIN_MEMORIES', 50000),
+            help="Only projects with at least this many memories get their own index."
+        )
+        parser.add_argument('--m', type=int, default=16)
+        parser.add_argument('--ef-construction', type=int, default=64)
+        parser.add_argument('--drop-small', action='store_true', help="Drop partial indexes of projects below the threshold.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def drop(self, index_name, reason, options):
+        self.stdout.write(f"➖ {index_name} ({reason})")
+        if not options['dry_run']:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+    def handle(self, *args, **options):
+        min_memories = options['min_memories']
+        mode = vector_search.storage_mode()
+        column, opclass = vector_search.ANN_COLUMNS[mode]
+
+        projects = Project.objects.annotate(memory_count=Count('memories')).values_list('id', 'memory_count')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname FROM pg_indexes WHERE tablename = 'core_memory' AND indexname LIKE 'core_memory_vec%%'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+
+        for project_id, memory_count in projects:
+            index_name = vector_search.project_index_name(project_id, mode)
+
+            if memory_count >= min_memories and index_name not in existing:
+                # CONCURRENTLY: do not block inserts while the graph is built.
+                # project_id is a UUID from our own table, so inlining it is safe and
+                # lets the planner match the partial index predicate.
+                sql = (
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON core_memory "
+                    f"USING hnsw ({column} {opclass}) "
+                    f"WITH (m = {int(options['m'])}, ef_construction = {int(options['ef_construction'])}) "
+                    f"WHERE project_id = '{project_id}'"
+                )
+                self.stdout.write(f"➕ {index_name} ({memory_count} memories, {mode})")
+                if not options['dry_run']:
+                    with connection.cursor() as cursor:
+                        cursor.execute(sql)
+
+            elif memory_count < min_memories and index_name in existing and options['drop_small']:
+                self.drop(index_name, f"{memory_count} memories", options)
+
+            # Other modes' indexes are never searched but still maintained on every insert
+            for other in vector_search.STORAGE_MODES:
+                other_name = vector_search.project_index_name(project_id, other)
+                if other != mode and other_name in existing:
+                    self.drop(other_name, f"{other} mode", options)
+
+        self.stdout.write(self.style.SUCCESS("Done."))
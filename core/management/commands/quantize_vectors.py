@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.vector_search import VECTOR_DIMENSIONS
+
+
+class Command(BaseCommand):
+    help = (
+        "Fills Memory.vector_half / vector_bit from the full-precision vector "
+        "(required before switching VECTOR_STORAGE_MODE to 'half' or 'binary'). "
+        "Use --clear to empty them again after switching back to 'full'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Set the quantized columns back to NULL.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            sql = """
+                UPDATE core_memory SET vector_half = NULL, vector_bit = NULL
+                WHERE id IN (
+                    SELECT id FROM core_memory
+                    WHERE vector_half IS NOT NULL OR vector_bit IS NOT NULL
+                    LIMIT %s
+                )
+            """
+        else:
+            # Same quantization as vector_search.quantize() (bit = 1 where value > 0)
+            sql = f"""
+                UPDATE core_memory
+                SET vector_half = vector::halfvec({VECTOR_DIMENSIONS}),
+                    vector_bit = binary_quantize(vector)::bit({VECTOR_DIMENSIONS})
+                WHERE id IN (
+                    SELECT id FROM core_memory
+                    WHERE vector_half IS NULL OR vector_bit IS NULL
+                    LIMIT %s
+                )
+            """
+
+        total = 0
+        while True:
+            # Small batches in autocommit mode keep locks and WAL bursts short
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [options['batch_size']])
+                updated = cursor.rowcount
+            total += updated
+            if updated:
+                self.stdout.write(f"… {total} memories updated")
+            if updated < options['batch_size']:
+                break
+
+        self.stdout.write(self.style.SUCCESS(f"Done. {total} memories updated."))
@@ -0,0 +1,125 @@
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.ingestion import ingest_memory
+from core.models import IngestionJob
+
+PRUNE_INTERVAL = 300  # seconds between retention sweeps
+
+
+class Command(BaseCommand):
+    help = (
+        "Drains queued /memories/store/ jobs. Safe to run as N replicas: "
+        "jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit when the queue is empty.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument(
+            '--stale-after', type=int,
+            default=getattr(settings, 'INGESTION_JOB_STALE_AFTER', 600),
+            help="Re-claim 'running' jobs whose worker died more than N seconds ago."
+        )
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=getattr(settings, 'INGESTION_JOB_MAX_ATTEMPTS', 3)
+        )
+        parser.add_argument(
+            '--retention', type=int,
+            default=getattr(settings, 'INGESTION_JOB_RETENTION', 7 * 24 * 3600),
+            help="Delete done / failed jobs finished more than N seconds ago (0 keeps them)."
+        )
+
+    def claim_job(self, stale_after, max_attempts):
+        """Locks and marks the oldest runnable job as running. Returns None if the queue is empty."""
+        stale_before = timezone.now() - timedelta(seconds=stale_after)
+
+        # Jobs whose worker died on the last allowed attempt will never be picked up again
+        IngestionJob.objects.filter(
+            status=IngestionJob.STATUS_RUNNING, started_at__lt=stale_before, attempts__gte=max_attempts
+        ).update(status=IngestionJob.STATUS_FAILED, error="Worker timed out.", finished_at=timezone.now())
+
+        with transaction.atomic():
+            job = IngestionJob.objects.select_for_update(skip_locked=True) \
+                .filter(
+                    Q(status=IngestionJob.STATUS_PENDING) |
+                    Q(status=IngestionJob.STATUS_RUNNING, started_at__lt=stale_before)
+                ) \
+                .filter(attempts__lt=max_attempts) \
+                .order_by('created_at') \
+                .first()
+
+            if not job:
+                return None
+
+            IngestionJob.objects.filter(id=job.id).update(
+                status=IngestionJob.STATUS_RUNNING,
+                started_at=timezone.now(),
+                attempts=F('attempts') + 1
+            )
+
+        job.refresh_from_db()
+        return job
+
+    def prune_jobs(self, retention):
+        """Deletes finished jobs (and their encrypted input text) past the retention window."""
+        if retention <= 0:
+            return 0
+        deleted, _ = IngestionJob.objects.filter(
+            status__in=[IngestionJob.STATUS_DONE, IngestionJob.STATUS_FAILED],
+            finished_at__lt=timezone.now() - timedelta(seconds=retention)
+        ).delete()
+        if deleted:
+            self.stdout.write(f"🧹 Pruned {deleted} finished job(s).")
+        return deleted
+
+    def run_job(self, job, max_attempts):
+        try:
+            payload, status_code = ingest_memory(job.project, str(job.text))
+        except Exception as e:
+            traceback.print_exc()
+            # Leave the job pending for another attempt unless it's out of retries
+            job.status = IngestionJob.STATUS_FAILED if job.attempts >= max_attempts else IngestionJob.STATUS_PENDING
+            job.error = str(e)
+            job.finished_at = timezone.now() if job.status == IngestionJob.STATUS_FAILED else None
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            self.stdout.write(self.style.ERROR(f"❌ Job {job.id} failed (attempt {job.attempts}): {e}"))
+            return
+
+        job.status = IngestionJob.STATUS_DONE
+        job.result = IngestionJob.summarize_result(payload)
+        job.result_status = status_code
+        job.error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'result', 'result_status', 'error', 'finished_at'])
+        self.stdout.write(f"✅ Job {job.id} done: {payload.get('message')}")
+
+    def handle(self, *args, **options):
+        self.stdout.write("👷 Ingestion worker started.")
+        next_prune = 0
+
+        while True:
+            close_old_connections()
+
+            # Retention sweep, at most once per PRUNE_INTERVAL per worker
+            if time.monotonic() >= next_prune:
+                self.prune_jobs(options['retention'])
+                next_prune = time.monotonic() + PRUNE_INTERVAL
+
+            job = self.claim_job(options['stale_after'], options['max_attempts'])
+
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.run_job(job, options['max_attempts'])
@@ -0,0 +1,75 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.authtoken.models import Token
+
+from core.ai_providers import LocalProvider
+from core.benchmarks import make_rng, synthetic_memory
+from core.models import Project, Memory
+
+
+class Command(BaseCommand):
+    help = (
+        "Seeds N users x M projects x K memories for benchmark_endpoints. "
+        "Vectors come from the offline hashing embedder (AI_PROVIDER=local), "
+        "so benchmark queries run with that provider find real neighbours."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--projects', type=int, default=2, help="Projects per user.")
+        parser.add_argument('--memories', type=int, default=1000, help="Memories per project.")
+        parser.add_argument('--prefix', default='bench', help="Username prefix of the seeded users.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded users (and their data) first.")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=f"{prefix}_user_").delete()
+            self.stdout.write(f"🧹 Deleted {deleted} rows of previous seed data.")
+
+        rng = make_rng(options['seed'])
+        embedder = LocalProvider()
+        total = 0
+
+        for u in range(options['users']):
+            user, created = User.objects.get_or_create(username=f"{prefix}_user_{u}")
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            Token.objects.get_or_create(user=user)
+
+            for p in range(options['projects']):
+                project, _ = Project.objects.get_or_create(user=user, name=f"{prefix} project {p}")
+
+                batch = []
+                for _ in range(options['memories']):
+                    raw_text, tags, category = synthetic_memory(rng)
+                    memory = Memory(
+                        project=project,
+                        raw_text=raw_text,
+                        vector=embedder.embed_one(raw_text),
+                        tags=tags,
+                        category=category,
+                        source="benchmark_seed"
+                    )
+                    # bulk_create bypasses save(), so fill the derived search columns here
+                    memory.update_search_fields()
+                    batch.append(memory)
+
+                    if len(batch) >= options['batch_size']:
+                        Memory.objects.bulk_create(batch)
+                        total += len(batch)
+                        batch = []
+
+                if batch:
+                    Memory.objects.bulk_create(batch)
+                    total += len(batch)
+
+            self.stdout.write(f"… user {u + 1}/{options['users']} seeded ({total} memories)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done. {options['users']} users x {options['projects']} projects, {total} memories."
+        ))
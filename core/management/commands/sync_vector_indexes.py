@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import vector_search
+from core.models import Memory
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the HNSW index of the configured VECTOR_STORAGE_MODE and drops the other modes' "
+        "indexes (CONCURRENTLY). Run after switching modes, once manage.py quantize_vectors has filled "
+        "the quantized column."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', action='append', choices=vector_search.STORAGE_MODES,
+            help="Keep this mode's index instead of the configured one (repeatable, e.g. while switching)."
+        )
+
+    def handle(self, *args, **options):
+        with connection.schema_editor(atomic=False) as schema_editor:
+            created, dropped = vector_search.sync_ann_indexes(
+                schema_editor, Memory, modes=options['mode'], log=self.stdout.write
+            )
+        self.stdout.write(self.style.SUCCESS(f"Done. {len(created)} index(es) built, {len(dropped)} dropped."))
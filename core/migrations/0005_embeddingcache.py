@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+import pgvector.django.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_memory_raw_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_name', models.CharField(max_length=100)),
+                ('task_type', models.CharField(max_length=50)),
+                ('text_hash', models.CharField(max_length=64)),
+                ('vector', pgvector.django.vector.VectorField(dimensions=768)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('model_name', 'task_type', 'text_hash'), name='unique_embedding_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:38
+
+import pgvector.django.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, and a plain build
+    # would block writes to core_memory for as long as the HNSW build takes
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_embeddingcache'),
+    ]
+
+    operations = [
+        # Index of the default VECTOR_STORAGE_MODE ('full'). It stays out of the model
+        # state: manage.py sync_vector_indexes swaps it for another mode's index.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                AddIndexConcurrently(
+                    model_name='memory',
+                    index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['vector'], m=16, name='memory_vector_hnsw_idx', opclasses=['vector_cosine_ops']),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:40
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+from core.utils import tags_to_search_text
+
+
+def backfill_tags_text(apps, schema_editor):
+    Memory = apps.get_model('core', 'Memory')
+    batch = []
+    for memory in Memory.objects.only('id', 'tags').iterator(chunk_size=2000):
+        memory.tags_text = tags_to_search_text(memory.tags)
+        batch.append(memory)
+        if len(batch) >= 2000:
+            Memory.objects.bulk_update(batch, ['tags_text'])
+            batch = []
+    if batch:
+        Memory.objects.bulk_update(batch, ['tags_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='tags_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_tags_text, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='memory',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tags_text'], name='memory_tags_text_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:41
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+from core.utils import blind_trigram_tokens
+
+
+def backfill_text_index(apps, schema_editor):
+    # EncryptedField decrypts on read, so the tokens are computed from plaintext.
+    # Trigram tokens only, the same as utils.blind_index_tokens (all that search.py queries).
+    Memory = apps.get_model('core', 'Memory')
+    batch = []
+    for memory in Memory.objects.only('id', 'raw_text').iterator(chunk_size=2000):
+        memory.text_index = blind_trigram_tokens(memory.raw_text) if memory.raw_text else []
+        batch.append(memory)
+        if len(batch) >= 2000:
+            Memory.objects.bulk_update(batch, ['text_index'])
+            batch = []
+    if batch:
+        Memory.objects.bulk_update(batch, ['text_index'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_memory_tags_text'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='text_index',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, editable=False, size=None),
+        ),
+        migrations.RunPython(backfill_text_index, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='memory',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['text_index'], name='memory_text_index_gin_idx'),
+        ),
+    ]
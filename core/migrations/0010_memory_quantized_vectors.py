@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:44
+
+import pgvector.django.bit
+import pgvector.django.halfvec
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_memory_text_index'),
+    ]
+
+    # No HNSW index on the quantized columns here: manage.py sync_vector_indexes
+    # builds the one of the configured VECTOR_STORAGE_MODE (once quantize_vectors ran)
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='vector_bit',
+            field=pgvector.django.bit.BitField(blank=True, editable=False, length=768, null=True),
+        ),
+        migrations.AddField(
+            model_name='memory',
+            name='vector_half',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=768, editable=False, null=True),
+        ),
+    ]
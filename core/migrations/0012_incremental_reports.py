@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:46
+
+import core.utils
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_project_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectreport',
+            name='changes_since_full',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='projectreport',
+            name='data_version',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='projectreport',
+            name='memory_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='memory',
+            name='content_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='MemoryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('memory_id', models.BigIntegerField()),
+                ('raw_text', core.utils.EncryptedField()),
+                ('category', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+                ('data_version', models.PositiveBigIntegerField(default=0)),
+                ('memory_version', models.PositiveBigIntegerField(default=0)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memory_tombstones', to='core.project')),
+            ],
+        ),
+    ]
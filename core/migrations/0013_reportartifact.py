@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_incremental_reports'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(choices=[('html', 'HTML'), ('pdf', 'PDF')], max_length=10)),
+                ('title', models.CharField(max_length=255)),
+                ('content', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_accessed_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('report', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artifacts', to='core.projectreport')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('report', 'format'), name='unique_report_artifact')],
+            },
+        ),
+    ]
@@ -1,38 +1,304 @@
 import uuid
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
-from pgvector.django import VectorField
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from pgvector.django import VectorField, HalfVectorField, BitField
 
-from .utils import EncryptedField
+from . import vector_search
+from .utils import EncryptedField, tags_to_search_text, blind_index_tokens
 
 class Project(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='projects')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Incremented in the same transaction as every memory write/delete.
+    # Cache keys on project state (retrieval cache, export report) use it directly.
+    data_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    @staticmethod
+    def bump_data_versions(project_ids):
+        """
+        Increments data_version of the given projects and returns {str(project id): new version}.
+        Memory writes/deletes call this first inside their own transaction: the row lock
+        serializes writers per project, so versions follow commit order (unlike ids) and
+        the change can be stamped with the version it produced.
+        """
+        project_ids = sorted({str(pk) for pk in project_ids})
+        if not project_ids:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE core_project SET data_version = data_version + 1 "
+                "WHERE id = ANY(%s::uuid[]) RETURNING id, data_version",
+                [project_ids]
+            )
+            return {str(pk): version for pk, version in cursor.fetchall()}
+
+    @property
+    def data_fingerprint(self):
+        """O(1) fingerprint of the project's memories (used as ProjectReport.data_hash)."""
+        return f"v{self.data_version}"
 
     def __str__(self):
         return self.name
 
+class MemoryQuerySet(models.QuerySet):
+    # Columns the views actually serialize. Excludes the 768-float `vector`
+    # (only needed inside SQL orderings) and the derived search columns.
+    SLIM_FIELDS = ('id', 'project_id', 'raw_text', 'tags', 'category', 'source', 'created_at', 'content_version')
+
+    def slim(self, *extra_fields):
+        """Loads only SLIM_FIELDS (plus `extra_fields`); vectors stay in the database."""
+        return self.only(*self.SLIM_FIELDS, *extra_fields)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        with transaction.atomic():
+            versions = Project.bump_data_versions({obj.project_id for obj in objs})
+            for obj in objs:
+                obj.content_version = versions[str(obj.project_id)]
+            created = super().bulk_create(objs, *args, **kwargs)
+        return created
+
+    def delete(self):
+        with transaction.atomic():
+            rows = list(self.values_list('id', 'project_id', 'raw_text', 'category', 'created_at', 'content_version'))
+            versions = Project.bump_data_versions({row[1] for row in rows})
+            MemoryTombstone.objects.bulk_create([
+                MemoryTombstone(
+                    memory_id=mid, project_id=pid, raw_text=text, category=category, created_at=created_at,
+                    data_version=versions[str(pid)], memory_version=content_version
+                )
+                for mid, pid, text, category, created_at, content_version in rows
+            ])
+            result = super().delete()
+        return result
+
 class Memory(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='memories')
     raw_text = EncryptedField()
     vector = VectorField(dimensions=768)  # Using 768 dimensions as requested
+    # Quantized copies for the first search pass (VECTOR_STORAGE_MODE 'half' / 'binary').
+    # NULL in 'full' mode; fill with manage.py quantize_vectors, then sync_vector_indexes.
+    vector_half = HalfVectorField(dimensions=768, blank=True, null=True, editable=False)
+    vector_bit = BitField(length=768, blank=True, null=True, editable=False)
     tags = models.JSONField(default=list, blank=True)
+    # Project.data_version that wrote the current raw_text / category (core.reports)
+    content_version = models.PositiveBigIntegerField(default=0, editable=False)
+    # Normalized (lowercase, unaccented) copy of tags for trigram-indexed search
+    tags_text = models.TextField(blank=True, default='', editable=False)
+    # Keyed blind index over raw_text (HMAC'd trigrams), see utils.blind_index_tokens
+    text_index = ArrayField(models.BigIntegerField(), default=list, blank=True, editable=False)
     
     # NEW FIELD
     category = models.CharField(max_length=100, blank=True, null=True)
     source = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = MemoryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # No HNSW index here: the one matching VECTOR_STORAGE_MODE is built by
+            # manage.py sync_vector_indexes (vector_search.sync_ann_indexes). Large
+            # projects additionally get partial per-project indexes
+            # (manage.py create_project_vector_indexes).
+            GinIndex(name='memory_tags_text_trgm_idx', fields=['tags_text'], opclasses=['gin_trgm_ops']),
+            GinIndex(name='memory_text_index_gin_idx', fields=['text_index']),
+        ]
+
+    def update_search_fields(self):
+        """Recomputes derived search columns. Call before bulk_create (save() does it automatically)."""
+        self.tags_text = tags_to_search_text(self.tags)
+        # Text loaded from the DB and never reassigned: its tokens are already stored
+        if not self._meta.get_field('raw_text').is_unchanged(self):
+            self.text_index = blind_index_tokens(self.raw_text)
+        if vector_search.storage_mode() != vector_search.STORAGE_FULL \
+                and 'vector' not in self.get_deferred_fields() and self.vector is not None:
+            self.vector_half, self.vector_bit = vector_search.quantize(self.vector)
+
+    def save(self, *args, **kwargs):
+        self.update_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'tags' in update_fields:
+                update_fields.add('tags_text')
+            if 'raw_text' in update_fields:
+                update_fields.add('text_index')
+            if 'vector' in update_fields:
+                update_fields.update({'vector_half', 'vector_bit'})
+            kwargs['update_fields'] = update_fields
+
+        with transaction.atomic():
+            version = Project.bump_data_versions([self.project_id])[str(self.project_id)]
+            previous = None if self._state.adding else self._previous_content(update_fields)
+
+            if self._state.adding or previous is not None:
+                self.content_version = version
+                if update_fields is not None:
+                    update_fields.add('content_version')
+            if previous is not None:
+                # Edit: the old content leaves the reports like a deletion
+                MemoryTombstone.objects.create(
+                    memory_id=self.pk,
+                    project_id=self.project_id,
+                    raw_text=previous.raw_text,
+                    category=previous.category,
+                    created_at=previous.created_at,
+                    data_version=version,
+                    memory_version=previous.content_version
+                )
+            super().save(*args, **kwargs)
+
+    def _previous_content(self, update_fields):
+        """The stored row if this save changes what reports show (raw_text, category), else None."""
+        if update_fields is not None and not update_fields & {'raw_text', 'category'}:
+            return None
+        previous = Memory.objects.filter(pk=self.pk).only('raw_text', 'category', 'created_at', 'content_version').first()
+        if previous is None:
+            return None
+        text_unchanged = self._meta.get_field('raw_text').is_unchanged(self) or previous.raw_text == self.raw_text
+        if text_unchanged and previous.category == self.category:
+            return None
+        return previous
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            version = Project.bump_data_versions([self.project_id])[str(self.project_id)]
+            MemoryTombstone.objects.create(
+                memory_id=self.pk,
+                project_id=self.project_id,
+                raw_text=self.raw_text,
+                category=self.category,
+                created_at=self.created_at,
+                data_version=version,
+                memory_version=self.content_version
+            )
+            result = super().delete(*args, **kwargs)
+        return result
+
     def __str__(self):
         return f"Memory for {self.project.name} ({self.created_at})"
 
+class MemoryTombstone(models.Model):
+    """
+    Record of a deleted memory, or of the previous content of an edited one, so
+    incremental reports (core.reports) can tell the model what to remove. Pruned
+    once no base report needs it.
+    """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='memory_tombstones')
+    memory_id = models.BigIntegerField()
+    raw_text = EncryptedField()
+    category = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField()  # of the deleted memory
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    data_version = models.PositiveBigIntegerField(default=0)  # project version of the delete / edit
+    memory_version = models.PositiveBigIntegerField(default=0)  # content_version of the removed content
+
+    def __str__(self):
+        return f"Deleted memory {self.memory_id} of {self.project_id}"
+
 class ProjectReport(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='reports')
     markdown_content = models.TextField()
     data_hash = models.CharField(max_length=64, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Incremental generation bookkeeping (core.reports.build_report)
+    data_version = models.PositiveBigIntegerField(blank=True, null=True)  # project version it covers
+    memory_count = models.PositiveIntegerField(default=0)
+    changes_since_full = models.PositiveIntegerField(default=0)  # drift since the last full rebuild
+
     def __str__(self):
         return f"Report for {self.project.name} ({self.created_at})"
+
+class ReportArtifact(models.Model):
+    """Rendered export of a ProjectReport (HTML / PDF bytes), see core.reports.get_artifact."""
+    FORMAT_CHOICES = [
+        ('html', 'HTML'),
+        ('pdf', 'PDF'),
+    ]
+
+    report = models.ForeignKey(ProjectReport, on_delete=models.CASCADE, related_name='artifacts')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    title = models.CharField(max_length=255)  # project name at render time
+    content = models.BinaryField()
+    size = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_accessed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['report', 'format'], name='unique_report_artifact')
+        ]
+
+    def __str__(self):
+        return f"{self.format.upper()} for report {self.report_id} ({self.size} bytes)"
+
+class EmbeddingCache(models.Model):
+    """Persistent tier of the embedding cache (see core.embedding_cache)."""
+    model_name = models.CharField(max_length=100)
+    task_type = models.CharField(max_length=50)
+    text_hash = models.CharField(max_length=64)
+    vector = VectorField(dimensions=768)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model_name', 'task_type', 'text_hash'], name='unique_embedding_cache_key')
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} [{self.task_type}] {self.text_hash[:12]}"
+
+class IngestionJob(models.Model):
+    """A queued /memories/store/ request, drained by manage.py run_ingestion_worker."""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='ingestion_jobs')
+    text = EncryptedField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    result = models.JSONField(blank=True, null=True)
+    result_status = models.PositiveSmallIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ingestion_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ingestion job {self.id} ({self.status})"
+
+    @staticmethod
+    def summarize_result(payload):
+        """
+        The part of an ingest_memory() payload that is kept on the job: ids, categories
+        and counts. `result` is a plain JSONField, so the fact texts (encrypted on
+        Memory) must not be copied into it; clients read them from /memories/retrieve/.
+        """
+        saved = payload.get('saved', [])
+        ignored = payload.get('ignored', [])
+        return {
+            "message": payload.get('message'),
+            "created_count": payload.get('created_count', len(saved)),
+            "saved": [{"id": item.get('id'), "category": item.get('category')} for item in saved],
+            "ignored_count": payload.get('ignored_count', len(ignored))
+        }
@@ -0,0 +1,225 @@
+"""
+Opt-in request profiler (PROFILING_ENABLED). Profiles a PROFILING_SAMPLE_RATE share
+of the requests to PROFILING_ENDPOINTS, plus any request sending the
+PROFILING_HEADER from a staff user. Dumps go to PROFILING_DIR, keeping the newest
+PROFILING_MAX_FILES; merge them with `manage.py aggregate_profiles`.
+
+PROFILING_MODE:
+  'cprofile' -> <name>.prof  (deterministic, pstats / snakeviz compatible)
+  'sample'   -> <name>.collapsed (stack sampling every PROFILING_INTERVAL_MS,
+                flamegraph.pl / speedscope "collapsed stacks" format)
+
+When disabled the middleware removes itself (MiddlewareNotUsed): zero overhead.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+MODE_CPROFILE = 'cprofile'
+MODE_SAMPLE = 'sample'
+
+DEFAULT_ENDPOINTS = ('store-memory', 'retrieve-memory', 'export-project-report')
+
+_cprofile_lock = threading.Lock()
+
+
+def profile_dir():
+    return str(getattr(settings, 'PROFILING_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            # Collapsed format: root first, frames separated by ';'
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.mode = getattr(settings, 'PROFILING_MODE', MODE_CPROFILE)
+        if self.mode not in (MODE_CPROFILE, MODE_SAMPLE):
+            raise ValueError(f"Unknown PROFILING_MODE '{self.mode}'")
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01)
+        self.header = getattr(settings, 'PROFILING_HEADER', 'X-Profile')
+        self.endpoints = set(getattr(settings, 'PROFILING_ENDPOINTS', DEFAULT_ENDPOINTS))
+        self.interval = getattr(settings, 'PROFILING_INTERVAL_MS', 5) / 1000.0
+        self.max_files = getattr(settings, 'PROFILING_MAX_FILES', 200)
+        self.directory = profile_dir()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _endpoint(self, request):
+        try:
+            return resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+
+    def _flagged_by_staff(self, request):
+        """Header flag, honoured for staff only (token auth runs in DRF, so check it here)."""
+        if not request.headers.get(self.header):
+            return False
+        from rest_framework.exceptions import AuthenticationFailed
+        from .auth import CachedTokenAuthentication
+        try:
+            auth = CachedTokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = auth[0] if auth else getattr(request, 'user', None)
+        return bool(user and user.is_staff)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        endpoint = self._endpoint(request)
+        flagged = self._flagged_by_staff(request)
+        if not (flagged or self._sampled(endpoint)):
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        profiler = self._start()
+        if profiler is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self._stop(profiler)
+        return self._finish(profiler, endpoint, flagged, started, response)
+
+    async def __acall__(self, request):
+        """
+        Under ASGI the profiled thread is the event loop's, so a dump also holds
+        whatever other requests ran on the loop meanwhile (their awaits interleave).
+        """
+        endpoint = self._endpoint(request)
+        # The staff check queries the token table: only leave the loop when the header is there
+        flagged = bool(request.headers.get(self.header)) and await sync_to_async(self._flagged_by_staff)(request)
+        if not (flagged or self._sampled(endpoint)):
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        profiler = self._start()
+        if profiler is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._stop(profiler)
+        return self._finish(profiler, endpoint, flagged, started, response)
+
+    def _sampled(self, endpoint):
+        return endpoint in self.endpoints and random.random() < self.sample_rate
+
+    def _start(self):
+        """Profiler attached to the current thread, or None while another cProfile runs."""
+        if self.mode == MODE_CPROFILE:
+            # One cProfile at a time per process (Python >= 3.12 refuses concurrent ones)
+            if not _cprofile_lock.acquire(blocking=False):
+                return None
+            try:
+                profiler = cProfile.Profile()
+                profiler.enable()
+            except Exception:
+                _cprofile_lock.release()
+                raise
+        else:
+            profiler = StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+        return profiler
+
+    def _stop(self, profiler):
+        if self.mode == MODE_CPROFILE:
+            try:
+                profiler.disable()
+            finally:
+                _cprofile_lock.release()
+        else:
+            profiler.stop()
+
+    def _finish(self, profiler, endpoint, flagged, started, response):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        name = self._save(profiler, endpoint or 'unmatched', elapsed_ms)
+        if flagged:
+            response['X-Profile-Id'] = name
+        return response
+
+    def _save(self, profiler, endpoint, elapsed_ms):
+        extension = 'prof' if self.mode == MODE_CPROFILE else 'collapsed'
+        name = (
+            f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{endpoint}_"
+            f"{int(elapsed_ms)}ms_{os.getpid()}.{extension}"
+        )
+        path = os.path.join(self.directory, name)
+        if self.mode == MODE_CPROFILE:
+            profiler.dump_stats(path)
+        else:
+            profiler.dump(path)
+        print(f"🔬 PROFILED {endpoint} ({elapsed_ms:.0f} ms) -> {name}")
+        self._rotate()
+        return name
+
+    def _rotate(self):
+        """Keeps the newest PROFILING_MAX_FILES dumps."""
+        try:
+            entries = [
+                entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(('.prof', '.collapsed'))
+            ]
+        except FileNotFoundError:
+            return
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass  # Rotated concurrently by another worker
@@ -0,0 +1,281 @@
+import io
+
+import markdown
+from xhtml2pdf import pisa
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Project, Memory, MemoryTombstone, ProjectReport, ReportArtifact
+from .utils import decrypt_all
+from . import ai_services, timing
+
+ERROR_REPORT_PREFIX = "# Error generating report"
+
+def _memory_payload(memories):
+    return [{
+        "raw_text": str(mem.raw_text),
+        "category": mem.category,
+        "created_at": mem.created_at.strftime("%Y-%m-%d %H:%M:%S")
+    } for mem in decrypt_all(memories)]
+
+def _latest_base_report(project):
+    """Newest successfully generated report that carries incremental bookkeeping."""
+    for report in project.reports.filter(data_version__isnull=False).order_by('-created_at')[:5]:
+        if not report.markdown_content.startswith(ERROR_REPORT_PREFIX):
+            return report
+    return None
+
+def _prune_tombstones(report):
+    """Deletions / edits already applied to a successful report are never needed again."""
+    if not report.markdown_content.startswith(ERROR_REPORT_PREFIX):
+        MemoryTombstone.objects.filter(project=report.project, data_version__lte=report.data_version).delete()
+    prune_reports(report.project)
+    return report
+
+def prune_reports(project):
+    """
+    Deletes superseded reports of the project (and their rendered artifacts).
+    Keeps the newest report, which serves the current data hash, and the newest
+    successful one, the base for the next incremental update.
+    """
+    keep = set()
+    for report in project.reports.order_by('-created_at').only('id', 'markdown_content'):
+        if not keep:
+            keep.add(report.id)
+        if not report.markdown_content.startswith(ERROR_REPORT_PREFIX):
+            keep.add(report.id)
+            break
+
+    deleted, _ = project.reports.exclude(id__in=keep).delete()
+    if deleted:
+        print(f"🧹 Pruned superseded reports for project {project.id}")
+
+def _plan_report(project):
+    """
+    Decides how the project's next report is produced.
+
+    INCREMENTAL MODE: starts from the previous report (covering project data_version V)
+    and sends the model only what changed after V: memories whose content_version > V
+    (created or edited) and tombstones with data_version > V (deleted, or the old
+    content of an edit). Versions are assigned under the project row lock, so unlike
+    ids they follow commit order. Falls back to a full rebuild when there is no usable
+    base report, when the changes accumulated since the last full rebuild exceed
+    REPORT_INCREMENTAL_MAX_DRIFT x the project's memory count, or when the previous
+    report plus the changes don't fit REPORT_CHUNK_MAX_CHARS (the rebuild is map-reduced).
+
+    Returns a dict with 'mode' ('reuse', 'incremental' or 'full'), the inputs for
+    that mode and 'fields', the bookkeeping to store on the new ProjectReport.
+    """
+    # Snapshot version first: anything committed while the model runs is newer and picked up next time
+    version = Project.objects.filter(pk=project.pk).values_list('data_version', flat=True).first() or 0
+    memories = Memory.objects.filter(project=project, content_version__lte=version).slim().order_by('created_at')
+
+    base = _latest_base_report(project) if getattr(settings, 'REPORT_INCREMENTAL_ENABLED', True) else None
+
+    if base:
+        added = list(memories.filter(content_version__gt=base.data_version))
+        removed = list(MemoryTombstone.objects.filter(
+            project=project,
+            data_version__gt=base.data_version,
+            data_version__lte=version,
+            memory_version__lte=base.data_version  # content that never made it into a report
+        ).order_by('data_version', 'id'))
+
+        memory_count = base.memory_count + len(added) - len(removed)
+        changes_since_full = base.changes_since_full + len(added) + len(removed)
+        max_drift = getattr(settings, 'REPORT_INCREMENTAL_MAX_DRIFT', 0.3)
+
+        added_payload, removed_payload = _memory_payload(added), _memory_payload(removed)
+
+        if changes_since_full > max_drift * max(memory_count, 1):
+            print(f"🔁 REPORT DRIFT {changes_since_full}/{memory_count} over threshold. Full rebuild.")
+        elif not ai_services.update_prompt_fits(base.markdown_content, added_payload, removed_payload):
+            # Only the rebuild is map-reduced to stay under REPORT_CHUNK_MAX_CHARS
+            print(f"🔁 REPORT UPDATE +{len(added)} / -{len(removed)} exceeds the prompt cap. Full rebuild.")
+        else:
+            print(f"🧩 INCREMENTAL REPORT: +{len(added)} / -{len(removed)} (drift {changes_since_full}/{memory_count})")
+            return {
+                # Version moved without a content change (e.g. a tags edit): nothing to tell the model
+                'mode': 'incremental' if (added or removed) else 'reuse',
+                'base': base,
+                'added': added_payload,
+                'removed': removed_payload,
+                'fields': {
+                    'data_version': version,
+                    'memory_count': memory_count,
+                    'changes_since_full': changes_since_full,
+                },
+            }
+
+    all_memories = list(memories)
+    return {
+        'mode': 'full',
+        'memories': _memory_payload(all_memories),
+        'fields': {
+            'data_version': version,
+            'memory_count': len(all_memories),
+            'changes_since_full': 0,
+        },
+    }
+
+def _save_report(project, data_hash, report_markdown, fields):
+    return _prune_tombstones(ProjectReport.objects.create(
+        project=project,
+        markdown_content=report_markdown,
+        data_hash=data_hash,
+        **fields
+    ))
+
+@timing.span('report.generate')
+def build_report(project, data_hash):
+    """Generates (and saves) the ProjectReport for the project's current state."""
+    plan = _plan_report(project)
+
+    if plan['mode'] == 'reuse':
+        report_markdown = plan['base'].markdown_content
+    elif plan['mode'] == 'incremental':
+        report_markdown = ai_services.update_project_report(
+            plan['base'].markdown_content, plan['added'], plan['removed']
+        )
+    else:
+        report_markdown = ai_services.generate_project_report(plan['memories'])
+
+    return _save_report(project, data_hash, report_markdown, plan['fields'])
+
+def stream_report(project, data_hash):
+    """
+    Streaming version of build_report: a generator yielding Markdown chunks as the
+    model produces them. The saved ProjectReport is its return value
+    (`report = yield from stream_report(...)`).
+
+    The report is only stored once the stream completed. On failure an error report
+    is stored instead of the partial text, exactly as build_report would.
+    """
+    plan = _plan_report(project)
+    chunks = []
+
+    try:
+        if plan['mode'] == 'reuse':
+            stream = iter([plan['base'].markdown_content])
+        elif plan['mode'] == 'incremental':
+            stream = ai_services.update_project_report_stream(
+                plan['base'].markdown_content, plan['added'], plan['removed']
+            )
+        else:
+            stream = ai_services.generate_project_report_stream(plan['memories'])
+
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        report_markdown = "".join(chunks)
+
+    except Exception as e:
+        print(f"❌ Error streaming report: {e}")
+        report_markdown = f"{ERROR_REPORT_PREFIX}\n\nAn error occurred: {str(e)}"
+
+    return _save_report(project, data_hash, report_markdown, plan['fields'])
+
+# ---------------- RENDERED ARTIFACTS ----------------
+
+# Robust styling for PDF with Local DejaVu Sans (Multi-language support)
+REPORT_HTML_TEMPLATE = """
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        @page {{ size: A4; margin: 1cm; }}
+        @font-face {{
+            font-family: 'DejaVuSans';
+            src: url('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf');
+        }}
+        body {{ 
+            font-family: 'DejaVuSans', sans-serif; 
+            font-size: 12px; 
+        }}
+        h1 {{ color: #333; font-size: 18px; border-bottom: 1px solid #ccc; padding-bottom: 5px; }}
+        h2 {{ color: #555; font-size: 14px; margin-top: 15px; }}
+        ul {{ margin-left: 20px; }}
+        li {{ margin-bottom: 5px; }}
+        strong, b {{ font-weight: bold; }}
+    </style>
+</head>
+<body>
+    <h1>Project Report: {title}</h1>
+    {body}
+</body>
+</html>
+"""
+
+def render_html(report, title):
+    return REPORT_HTML_TEMPLATE.format(
+        title=title,
+        body=markdown.markdown(report.markdown_content)
+    ).encode('utf-8')
+
+def render_pdf(html_bytes):
+    """PDF bytes for the rendered HTML, or None if xhtml2pdf fails."""
+    output = io.BytesIO()
+    pisa_status = pisa.CreatePDF(html_bytes, dest=output, encoding='utf-8')
+    if pisa_status.err:
+        return None
+    return output.getvalue()
+
+def get_artifact(report, export_format):
+    """
+    Rendered bytes of `report` in `export_format` ('html' or 'pdf'), served from the
+    ReportArtifact store when present. Returns None if rendering fails.
+    Artifacts are keyed by (report, format) and re-rendered if the project was renamed.
+    """
+    title = report.project.name
+    artifact = ReportArtifact.objects.filter(report=report, format=export_format, title=title).first()
+
+    if artifact:
+        print(f"⚡ ARTIFACT HIT: {export_format} for report {report.id}")
+        ReportArtifact.objects.filter(id=artifact.id).update(last_accessed_at=timezone.now())
+        return bytes(artifact.content)
+
+    print(f"🐢 ARTIFACT MISS: Rendering {export_format} for report {report.id}")
+    if export_format == 'html':
+        with timing.span('report.render_html'):
+            content = render_html(report, title)
+    elif export_format == 'pdf':
+        html_bytes = get_artifact(report, 'html')
+        with timing.span('report.render_pdf'):
+            content = render_pdf(html_bytes) if html_bytes is not None else None
+    else:
+        raise ValueError(f"Unknown export format '{export_format}'")
+
+    if content is None:
+        return None
+
+    try:
+        ReportArtifact.objects.update_or_create(
+            report=report, format=export_format,
+            defaults={'title': title, 'content': content, 'size': len(content)}
+        )
+    except IntegrityError:
+        pass  # Rendered concurrently by another request, either copy is fine
+    enforce_artifact_budget()
+    return content
+
+def enforce_artifact_budget():
+    """
+    Evicts least recently used artifacts (all projects) until the store fits in
+    REPORT_ARTIFACT_MAX_BYTES.
+    """
+    budget = getattr(settings, 'REPORT_ARTIFACT_MAX_BYTES', 200 * 1024 * 1024)
+    total = ReportArtifact.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total <= budget:
+        return
+
+    evict = []
+    for artifact_id, size in ReportArtifact.objects.order_by('last_accessed_at').values_list('id', 'size').iterator():
+        if total <= budget:
+            break
+        evict.append(artifact_id)
+        total -= size
+
+    ReportArtifact.objects.filter(id__in=evict).delete()
+    print(f"🧹 Evicted {len(evict)} report artifacts (store now {total} bytes)")
@@ -0,0 +1,76 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .cache_utils import record
+from .embedding_cache import normalize_text
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def make_key(project_id, data_version, query):
+    """
+    'retrieval:<project id>:<project data version>:<sha256 of the normalized query>'.
+    Any store/delete bumps Project.data_version, so entries for older
+    versions can never match again and simply expire (RETRIEVAL_CACHE_TTL).
+    """
+    query_hash = hashlib.sha256(normalize_text(query).lower().encode('utf-8')).hexdigest()
+    return f"retrieval:{project_id}:{data_version}:{query_hash}"
+
+
+def _ttl():
+    return getattr(settings, 'RETRIEVAL_CACHE_TTL', 300)
+
+
+def _count(results):
+    name = 'hits' if results is not None else 'misses'
+    with _stats_lock:
+        _stats[name] += 1
+    record('retrieval', name)
+    return results
+
+
+def lookup(key):
+    """The cached serialized results (unpickled, so a private copy), or None."""
+    try:
+        results = caches['default'].get(key)
+    except Exception as e:
+        # Same rule as the embedding cache: an outage is a miss, never a failed request
+        print(f"⚠️ Retrieval cache lookup failed: {e}")
+        results = None
+    return _count(results)
+
+
+async def alookup(key):
+    try:
+        results = await caches['default'].aget(key)
+    except Exception as e:
+        print(f"⚠️ Retrieval cache lookup failed: {e}")
+        results = None
+    return _count(results)
+
+
+def store(key, results):
+    try:
+        caches['default'].set(key, results, _ttl())
+    except Exception as e:
+        print(f"⚠️ Retrieval cache write failed: {e}")
+
+
+async def astore(key, results):
+    try:
+        await caches['default'].aset(key, results, _ttl())
+    except Exception as e:
+        print(f"⚠️ Retrieval cache write failed: {e}")
+
+
+def stats():
+    """Hit/miss counters of this process (all workers' are summed on /metrics, cache="retrieval")."""
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['hits'] + data['misses']
+    data['hit_rate'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+    return data
@@ -0,0 +1,197 @@
+from django.conf import settings
+from django.db.models import Q
+from django.contrib.postgres.search import TrigramSimilarity
+
+from .models import Memory, MemoryQuerySet
+from .utils import normalize_search_text, blind_trigram_tokens, term_similarity
+from . import vector_search, timing
+
+# MULTILINGUAL STOPWORD FILTER
+IGNORED_KEYWORDS = {
+    # TR Common & Domain
+    'proje', 'projede', 'projesi', 'hakkında', 'nedir', 'hangi', 'neler',
+    'ile', 'için', 've', 'veya', 'bir', 'bu', 'şu', 'uygulama',
+
+    # EN Common & Domain
+    'project', 'projects', 'about', 'what', 'which', 'how',
+    'for', 'with', 'and', 'or', 'a', 'an', 'the', 'this', 'that', 'app', 'application'
+}
+
+def extract_keywords(query):
+    """
+    Splits the query into (word, trigram threshold) pairs for the lexical side.
+    Short words need loose matching (typos), Long words need strict matching (noise).
+    """
+    keywords = []
+    seen = set()
+    for word in query.split():
+        if len(word) <= 3 or word.lower() in IGNORED_KEYWORDS:
+            continue
+        # Same normalization as Memory.tags_text
+        normalized = normalize_search_text(word)
+        if normalized in seen:
+            continue
+        seen.add(normalized)
+        keywords.append((normalized, 0.3 if len(word) > 5 else 0.1))
+    return keywords
+
+# Only the slim columns are selected; Memory.objects.raw() defers the rest (incl. vector)
+SLIM_COLUMNS = ", ".join(f"m.{field}" for field in MemoryQuerySet.SLIM_FIELDS)
+
+HYBRID_SEARCH_SQL = """
+    WITH vector_candidates AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+        FROM ({nearest}) v
+    ),
+    keywords AS (
+        SELECT word, threshold
+        FROM unnest(%(words)s::text[], %(thresholds)s::float8[]) AS k(word, threshold)
+    ),
+    keyword_hits AS (
+        SELECT m.id, k.word, similarity(m.tags_text, k.word) AS sim
+        FROM core_memory m
+        CROSS JOIN keywords k
+        WHERE m.project_id = %(project_id)s
+          AND m.tags_text %% k.word
+          AND similarity(m.tags_text, k.word) > k.threshold
+    ),
+    keyword_candidates AS (
+        SELECT id, rank
+        FROM (
+            SELECT id, ROW_NUMBER() OVER (PARTITION BY word ORDER BY sim DESC, id DESC) AS rank
+            FROM keyword_hits
+        ) ranked
+        WHERE rank <= %(keyword_limit)s
+    ),
+    fused AS (
+        SELECT id, SUM(1.0 / (%(rrf_k)s + rank))::float8 AS score
+        FROM (
+            SELECT id, rank FROM vector_candidates
+            UNION ALL
+            SELECT id, rank FROM keyword_candidates
+        ) candidates
+        GROUP BY id
+    )
+    SELECT {columns}, f.score
+    FROM fused f
+    JOIN core_memory m ON m.id = f.id
+    ORDER BY f.score DESC, m.created_at DESC
+    LIMIT %(limit)s
+"""
+
+@timing.span('db.hybrid_search')
+def hybrid_search(project, query_embedding, keywords, limit=20):
+    """
+    Vector + trigram keyword search in ONE query, fused with reciprocal-rank fusion
+    (score = sum of 1 / (k + rank) over the vector list and every keyword list).
+    `keywords` is a list of (word, threshold) pairs, see extract_keywords().
+    Returns up to `limit` Memory objects ordered by score, each with a `.score` attribute.
+    """
+    params = {
+        'project_id': str(project.id),
+        'vector': vector_search.to_sql_vector(query_embedding),
+        'vector_limit': getattr(settings, 'HYBRID_SEARCH_VECTOR_LIMIT', 20),
+        'words': [word for word, _ in keywords],
+        'thresholds': [threshold for _, threshold in keywords],
+        'keyword_limit': getattr(settings, 'HYBRID_SEARCH_KEYWORD_LIMIT', 2),
+        'rrf_k': getattr(settings, 'HYBRID_SEARCH_RRF_K', 60),
+        'limit': limit,
+    }
+
+    # `tags_text % word` is what lets the GIN trigram index serve the keyword side;
+    # lower its global threshold to the loosest per-word one, then filter exactly.
+    extra = {}
+    if keywords:
+        extra['pg_trgm.similarity_threshold'] = min(threshold for _, threshold in keywords)
+
+    with vector_search.tuned(extra):
+        sql = HYBRID_SEARCH_SQL.format(
+            columns=SLIM_COLUMNS,
+            nearest=vector_search.nearest_sql('%(vector)s::vector', '%(project_id)s', '%(vector_limit)s')
+        )
+        return list(Memory.objects.raw(sql, params))
+
+@timing.span('db.nearest')
+def nearest_memories(project, embedding, limit):
+    """
+    The `limit` memories closest to `embedding` (slim columns, `.distance` attribute),
+    nearest first. Honors VECTOR_STORAGE_MODE like every other vector query.
+    """
+    sql = f"""
+        SELECT {SLIM_COLUMNS}, n.distance
+        FROM ({vector_search.nearest_sql('%(vector)s::vector', '%(project_id)s', '%(limit)s')}) n
+        JOIN core_memory m ON m.id = n.id
+        ORDER BY n.distance
+    """
+    params = {
+        'vector': vector_search.to_sql_vector(embedding),
+        'project_id': str(project.id),
+        'limit': limit,
+    }
+
+    with vector_search.tuned():
+        return list(Memory.objects.raw(sql, params))
+
+def _max_candidates():
+    return getattr(settings, 'BLIND_INDEX_MAX_CANDIDATES', 500)
+
+def _newest_first(candidates):
+    """
+    Yields `candidates` newest first, BLIND_INDEX_MAX_CANDIDATES rows per query.
+    Blind-index hits can be false positives (the trigrams are present but not in
+    order), so the newest real match may sit behind any fixed number of them;
+    keyset paging on (created_at, id) reaches it without an unbounded fetch.
+    """
+    page_size = _max_candidates()
+    candidates = candidates.order_by('-created_at', '-id')
+    page = list(candidates[:page_size])
+    while page:
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        page = list(candidates.filter(
+            Q(created_at__lt=last.created_at) | Q(created_at=last.created_at, id__lt=last.id)
+        )[:page_size])
+
+@timing.span('db.find_target')
+def find_latest_containing(queryset, target_text):
+    """
+    Newest memory whose text or tags contain `target_text` (case/accent-insensitive).
+    Text candidates come from the blind index (all trigrams of the term present),
+    so only those candidates are decrypted to confirm the match.
+    """
+    normalized = normalize_search_text(target_text)
+    candidates = queryset.slim('tags_text').filter(
+        Q(text_index__contains=blind_trigram_tokens(target_text)) |
+        Q(tags_text__contains=normalized)
+    )
+
+    for memory in _newest_first(candidates):
+        if normalized in memory.tags_text or normalized in normalize_search_text(memory.raw_text):
+            return memory
+    return None
+
+@timing.span('db.find_target')
+def find_latest_similar(queryset, target_text, threshold=0.4):
+    """
+    Fuzzy variant: newest memory with a word (run of words) more than `threshold`
+    trigram-similar to the term, or with trigram-similar tags. The blind index only
+    narrows the candidates to texts sharing a trigram with the term; sharing a few
+    trigrams says nothing about similarity, so each candidate is decrypted and
+    compared word by word (utils.term_similarity).
+    """
+    tokens = blind_trigram_tokens(target_text)
+    if not tokens:
+        return None
+
+    normalized = normalize_search_text(target_text)
+    candidates = queryset.slim().filter(
+        Q(text_index__overlap=tokens) |
+        Q(tags_text__trigram_similar=normalized)
+    ).annotate(sim_tags=TrigramSimilarity('tags_text', normalized))
+
+    for memory in _newest_first(candidates):
+        if memory.sim_tags > threshold or term_similarity(target_text, memory.raw_text) > threshold:
+            return memory
+    return None
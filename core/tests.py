@@ -0,0 +1,443 @@
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from pgvector.django import HalfVectorField, VectorField
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from . import ai_services, auth, ingestion, reports, search
+from .models import Memory, Project
+
+
+@override_settings(AI_PROVIDER='local', AI_LOCAL_EMBED_LATENCY_MS=0, AI_LOCAL_GENERATE_LATENCY_MS=0)
+class VectorLoadingTests(APITestCase):
+    """
+    The 768-float vectors are only needed inside SQL orderings. Retrieval, export
+    and delete must never select them into Python (MemoryQuerySet.slim()).
+    """
+    FACTS = [
+        "The backend budget is 500 dollars.",
+        "Deployment runs on Kubernetes.",
+        "The frontend uses React.",
+    ]
+
+    def setUp(self):
+        self.user = User.objects.create_user('vectors', password='secret-pass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.project = Project.objects.create(user=self.user, name='Vectors')
+        for fact, vector in zip(self.FACTS, ai_services.get_embeddings(self.FACTS)):
+            Memory.objects.create(project=self.project, raw_text=fact, vector=vector, category='General')
+
+    def assertNoVectorsLoaded(self, method, url, data):
+        decoded = []
+
+        def counting(original):
+            def from_db_value(field, value, expression, connection):
+                decoded.append(field.name)
+                return original(field, value, expression, connection)
+            return from_db_value
+
+        with mock.patch.object(VectorField, 'from_db_value', counting(VectorField.from_db_value)), \
+                mock.patch.object(HalfVectorField, 'from_db_value', counting(HalfVectorField.from_db_value)):
+            response = getattr(self.client, method)(url, data, format='json')
+
+        self.assertLess(response.status_code, 300, getattr(response, 'data', None))
+        self.assertEqual(decoded, [], f"{url} decoded vector columns: {sorted(set(decoded))}")
+        return response
+
+    def test_retrieve_does_not_load_vectors(self):
+        response = self.assertNoVectorsLoaded('post', '/api/memories/retrieve/', {
+            "project_id": str(self.project.id),
+            "query": "What is the backend budget?"
+        })
+        self.assertTrue(response.data['results'])
+
+    def test_export_does_not_load_vectors(self):
+        response = self.assertNoVectorsLoaded('post', '/api/projects/export/', {
+            "project_id": str(self.project.id)
+        })
+        self.assertIn('report', response.data)
+
+    def test_delete_does_not_load_vectors(self):
+        self.assertNoVectorsLoaded('post', '/api/memories/delete/', {
+            "project_id": str(self.project.id),
+            "target_text": "Kubernetes"
+        })
+        self.assertEqual(Memory.objects.filter(project=self.project).count(), len(self.FACTS) - 1)
+
+    def test_undo_delete_does_not_load_vectors(self):
+        self.assertNoVectorsLoaded('post', '/api/memories/delete/', {
+            "project_id": str(self.project.id)
+        })
+        self.assertEqual(Memory.objects.filter(project=self.project).count(), len(self.FACTS) - 1)
+
+
+def unit_vector(*weights):
+    """768-dim vector with the given leading components (normalized)."""
+    vector = np.zeros(768)
+    vector[:len(weights)] = weights
+    return list(vector / np.linalg.norm(vector))
+
+
+class IngestionDedupTests(TestCase):
+    """The store pipeline's save step: one dedup query, in-batch dedup, one INSERT."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('ingest', password='secret-pass')
+        self.project = Project.objects.create(user=self.user, name='Ingest')
+        self.existing = Memory.objects.create(
+            project=self.project, raw_text="The budget is 500.", vector=unit_vector(1), category='Finance'
+        )
+        self.project.refresh_from_db()
+
+    def save(self, *facts):
+        """Runs _save_facts for (text, vector, tags) facts, returns the payload."""
+        items = [{'raw_text': text, 'tags': tags, 'category': 'General'} for text, _, tags in facts]
+        payload, status_code = ingestion._save_facts(self.project, items, items, [vector for _, vector, _ in facts])
+        self.assertEqual(status_code, 201)
+        return payload
+
+    def saved_texts(self, payload):
+        return [item['text'] for item in payload['saved']]
+
+    def ignored_texts(self, payload):
+        return [item['text'] for item in payload['ignored']]
+
+    def test_duplicate_of_stored_memory_is_ignored(self):
+        payload = self.save(
+            ("Budget: 500.", unit_vector(1, 0.01), []),
+            ("Deploys run on Fridays.", unit_vector(0, 1), []),
+        )
+        self.assertEqual(self.ignored_texts(payload), ["Budget: 500."])
+        self.assertEqual(self.saved_texts(payload), ["Deploys run on Fridays."])
+
+    def test_duplicate_within_batch_keeps_first(self):
+        payload = self.save(
+            ("The team uses Django.", unit_vector(0, 1), []),
+            ("Team uses Django.", unit_vector(0, 1, 0.01), []),
+            ("The frontend uses React.", unit_vector(0, 0, 1), []),
+        )
+        self.assertEqual(self.saved_texts(payload), ["The team uses Django.", "The frontend uses React."])
+        self.assertEqual(self.ignored_texts(payload), ["Team uses Django."])
+
+    def test_corrections_are_never_deduplicated(self):
+        payload = self.save(
+            ("The budget is 500.", unit_vector(1), ['update']),
+            ("Status: the budget is 500.", unit_vector(1), []),
+        )
+        self.assertEqual(self.saved_texts(payload), ["The budget is 500.", "Status: the budget is 500."])
+        self.assertEqual(payload['ignored'], [])
+
+    def test_batch_is_saved_with_one_version_bump(self):
+        version = self.project.data_version
+        payload = self.save(
+            ("Deploys run on Fridays.", unit_vector(0, 1), ['Deploy']),
+            ("The frontend uses React.", unit_vector(0, 0, 1), []),
+        )
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.data_version, version + 1)
+
+        created = Memory.objects.filter(id__in=[item['id'] for item in payload['saved']])
+        self.assertEqual({m.content_version for m in created}, {version + 1})
+        deploy = created.get(id=payload['saved'][0]['id'])  # raw_text is encrypted, not filterable
+        self.assertEqual(deploy.tags_text, 'deploy')
+        self.assertTrue(deploy.text_index)
+
+    def test_nothing_new_leaves_version_alone(self):
+        version = self.project.data_version
+        payload = self.save(("Budget is 500.", unit_vector(1), []))
+        self.assertEqual(payload['created_count'], 0)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.data_version, version)
+
+
+@override_settings(HYBRID_SEARCH_VECTOR_LIMIT=3, HYBRID_SEARCH_KEYWORD_LIMIT=2, HYBRID_SEARCH_RRF_K=60)
+class HybridSearchRankingTests(TestCase):
+    """hybrid_search fuses the vector list and each keyword list with reciprocal-rank fusion."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('ranking', password='secret-pass')
+        self.project = Project.objects.create(user=self.user, name='Ranking')
+
+        def remember(name, vector, tags=()):
+            return Memory.objects.create(project=self.project, raw_text=name, vector=vector, tags=list(tags))
+
+        # Created in this order, so created_at breaks the A / C tie below
+        self.a = remember("A", unit_vector(1))                          # vector rank 1
+        self.b = remember("B", unit_vector(0.8, 0.6), ['kubernetes'])  # vector rank 2 + keyword rank 1
+        self.e = remember("E", unit_vector(0.6, 0.8))                   # vector rank 3
+        self.c = remember("C", unit_vector(0, 0, 1), ['postgres'])      # keyword rank 1 only
+        self.f = remember("F", unit_vector(0, 0, 0, 1))                 # in neither list
+
+    def test_keyword_and_vector_hits_interleave_by_fused_score(self):
+        results = search.hybrid_search(
+            self.project, unit_vector(1), [('kubernetes', 0.3), ('postgres', 0.3)], limit=10
+        )
+        # B: 1/62 + 1/61 | C, A: 1/61 each, newest first | E: 1/63
+        self.assertEqual([m.id for m in results], [self.b.id, self.c.id, self.a.id, self.e.id])
+        self.assertAlmostEqual(results[0].score, 1 / 62 + 1 / 61)
+        self.assertAlmostEqual(results[-1].score, 1 / 63)
+
+    def test_without_keywords_the_vector_order_is_kept(self):
+        results = search.hybrid_search(self.project, unit_vector(1), [], limit=10)
+        self.assertEqual([m.id for m in results], [self.a.id, self.b.id, self.e.id])
+
+
+@override_settings(AI_PROVIDER='local', REPORT_INCREMENTAL_ENABLED=True, REPORT_INCREMENTAL_MAX_DRIFT=10)
+class IncrementalReportPlanTests(APITestCase):
+    """Incremental reports are planned on Project.data_version, not on memory ids."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('reports', password='secret-pass')
+        self.project = Project.objects.create(user=self.user, name='Reports')
+        self.memories = [
+            Memory.objects.create(project=self.project, raw_text=text, vector=[0.1] * 768, category='General')
+            for text in ("The budget is 500.", "The team uses Django.")
+        ]
+        self.project.refresh_from_db()
+        reports.build_report(self.project, self.project.data_fingerprint)
+
+    def plan(self):
+        return reports._plan_report(self.project)
+
+    def texts(self, payload):
+        return [item['raw_text'] for item in payload]
+
+    def test_unchanged_project_reuses_report(self):
+        self.assertEqual(self.plan()['mode'], 'reuse')
+
+    def test_edit_is_sent_as_removal_and_addition(self):
+        memory = Memory.objects.slim().get(id=self.memories[0].id)
+        memory.raw_text = "The budget is 800."
+        memory.save(update_fields=['raw_text'])
+
+        plan = self.plan()
+        self.assertEqual(plan['mode'], 'incremental')
+        self.assertEqual(self.texts(plan['added']), ["The budget is 800."])
+        self.assertEqual(self.texts(plan['removed']), ["The budget is 500."])
+        self.assertEqual(plan['fields']['memory_count'], 2)
+
+    def test_tags_only_edit_reuses_report(self):
+        memory = Memory.objects.slim().get(id=self.memories[1].id)
+        memory.tags = ['django']
+        memory.save(update_fields=['tags'])
+        self.assertEqual(self.plan()['mode'], 'reuse')
+
+    def test_memory_committed_with_lower_id_is_not_skipped(self):
+        # A row whose id was allocated before the base report but committed after it
+        late = Memory.objects.create(project=self.project, raw_text="Deploys run on Fridays.", vector=[0.1] * 768)
+        Memory.objects.filter(id=late.id).update(id=self.memories[0].id - 1000)
+
+        self.assertEqual(self.texts(self.plan()['added']), ["Deploys run on Fridays."])
+
+    def test_delete_of_unreported_memory_is_not_sent(self):
+        Memory.objects.create(project=self.project, raw_text="Temporary note.", vector=[0.1] * 768).delete()
+        self.memories[1].delete()
+
+        plan = self.plan()
+        self.assertEqual(plan['added'], [])
+        self.assertEqual(self.texts(plan['removed']), ["The team uses Django."])
+        self.assertEqual(plan['fields']['memory_count'], 1)
+
+
+    @override_settings(REPORT_CHUNK_MAX_CHARS=600, REPORT_MAP_WORKERS=1, REPORT_INCREMENTAL_MAX_DRIFT=100)
+    def test_large_delta_stays_under_prompt_cap(self):
+        for i in range(20):
+            Memory.objects.create(project=self.project, raw_text=f"Fact {i} about the release plan.", vector=[0.1] * 768)
+        self.assertEqual(self.plan()['mode'], 'full')
+
+        prompts = []
+
+        class RecordingProvider(ReportPromptTests.ShrinkingProvider):
+            def ensure_ready(self):
+                pass
+
+            def generate(self, system_instruction, prompt):
+                prompts.append(prompt)
+                return super().generate(system_instruction, prompt)
+
+        with mock.patch.object(ai_services, 'get_provider', return_value=RecordingProvider()):
+            report = reports.build_report(self.project, self.project.data_fingerprint)
+
+        self.assertFalse(report.markdown_content.startswith(reports.ERROR_REPORT_PREFIX))
+        self.assertGreater(len(prompts), 1)
+        for prompt in prompts:
+            self.assertLessEqual(len(prompt.split("\n\n", 1)[1]), 600)
+
+
+class BlindIndexDeleteTests(APITestCase):
+    """`/delete <term>` finds encrypted memories through the blind index, and fuzzy mode only hits similar words."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('deleter', password='secret-pass')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.project = Project.objects.create(user=self.user, name='Delete')
+
+    def remember(self, text):
+        return Memory.objects.create(project=self.project, raw_text=text, vector=[0.1] * 768, category='General')
+
+    def delete(self, target_text):
+        return self.client.post('/api/memories/delete/', {
+            "project_id": str(self.project.id),
+            "target_text": target_text
+        }, format='json')
+
+    def assertKept(self, text, target_text):
+        memory = self.remember(text)
+        response = self.delete(target_text)
+        self.assertEqual(response.status_code, 404, response.data)
+        self.assertTrue(Memory.objects.filter(id=memory.id).exists())
+
+    def test_exact_match_deletes_newest(self):
+        older = self.remember("Bütçe 500 TL olarak belirlendi.")
+        newer = self.remember("The new bütçe is 800.")
+        response = self.delete("butce")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(Memory.objects.filter(id=newer.id).exists())
+        self.assertTrue(Memory.objects.filter(id=older.id).exists())
+
+    def test_fuzzy_match_deletes_similar_word(self):
+        memory = self.remember("Deployment runs on Kubernetes.")
+        self.assertEqual(self.delete("kubernets").status_code, 200)
+        self.assertFalse(Memory.objects.filter(id=memory.id).exists())
+
+    def test_shared_trigrams_in_other_words_are_not_a_match(self):
+        # Half of "budget"'s trigrams occur in "get" / "edge", none in one similar word
+        self.assertKept("We need to get the edge case fixed.", "budget")
+
+    def test_shared_trigrams_in_one_dissimilar_word_are_not_a_match(self):
+        self.assertKept("The team relies on credit cards.", "redis")
+
+
+class ReportPromptTests(SimpleTestCase):
+    """Map-reduce report prompts never drop memories to fit REPORT_CHUNK_MAX_CHARS."""
+    MEMORIES = [{
+        "raw_text": f"Fact {i} about the budget and the release plan.",
+        "category": "General",
+        "created_at": f"2026-{1 + i % 9:02d}-01 10:00:00"
+    } for i in range(40)]
+
+    class ShrinkingProvider:
+        def generate(self, system_instruction, prompt):
+            body = prompt.split("\n\n", 1)[1]
+            return "- " + body[:max(10, len(body) // 3)]
+
+    class VerboseProvider:
+        def generate(self, system_instruction, prompt):
+            return prompt + "\n- (restated)"
+
+    def test_oversized_block_is_split_not_truncated(self):
+        chunks = ai_services._pack(["a" * 25, "bb"], 10)
+        self.assertEqual("".join(piece for chunk in chunks for piece in chunk), "a" * 25 + "bb")
+        self.assertTrue(all(len("\n".join(chunk)) <= 10 for chunk in chunks))
+
+    @override_settings(REPORT_CHUNK_MAX_CHARS=300, REPORT_MAP_WORKERS=1)
+    def test_notes_are_collapsed_until_they_fit(self):
+        prompt = ai_services._report_prompt(self.ShrinkingProvider(), self.MEMORIES)
+        notes = prompt.split("\n\n", 1)[1]
+        self.assertLessEqual(len(notes), 300)
+
+    @override_settings(REPORT_CHUNK_MAX_CHARS=300, REPORT_MAP_WORKERS=1)
+    def test_notes_that_stop_shrinking_raise(self):
+        with self.assertRaisesMessage(ValueError, "stopped shrinking"):
+            ai_services._report_prompt(self.VerboseProvider(), self.MEMORIES)
+
+
+class AuthCacheContentsTests(APITestCase):
+    """The shared token cache must not hand out working credentials to whoever can read it."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cached', password='secret-pass')
+        self.token = Token.objects.create(user=self.user)
+        self.authentication = auth.CachedTokenAuthentication()
+
+    def test_cached_entry_holds_no_token_key_or_password_hash(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        stored = pickle.dumps(caches['default'].get(auth._token_key(self.token.key)))
+        self.assertNotIn(self.token.key.encode(), stored)
+        self.assertNotIn(self.user.password.encode(), stored)
+
+    def test_cache_hit_rebuilds_credentials_without_user_queries(self):
+        self.authentication.authenticate_credentials(self.token.key)
+        with CaptureQueriesContext(connection) as queries:
+            user, token = self.authentication.authenticate_credentials(self.token.key)
+        # Only the cache itself may query (CACHE_BACKEND=db)
+        self.assertFalse([q['sql'] for q in queries if 'auth_user' in q['sql'] or 'authtoken_token' in q['sql']])
+        self.assertEqual((user.pk, user.username, token.key, token.user_id),
+                         (self.user.pk, 'cached', self.token.key, self.user.pk))
+
+
+# A second server process: authenticates each token key read from stdin
+AUTH_WORKER = """
+import sys, django
+django.setup()
+from django.db import connection
+connection.settings_dict['NAME'] = sys.argv[1]
+from core.auth import CachedTokenAuthentication
+auth = CachedTokenAuthentication()
+for key in sys.stdin:
+    try:
+        auth.authenticate_credentials(key.strip())
+        print('ok', flush=True)
+    except Exception:
+        print('denied', flush=True)
+"""
+
+
+class CrossProcessAuthInvalidationTests(TransactionTestCase):
+    """Revoking a token or deactivating a user in one process takes effect in the others at once."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+        # The file backend is shared between processes like Redis or the cache table
+        shared = override_settings(CACHES={
+            alias: {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': self.cache_dir.name,
+                'KEY_PREFIX': f'{settings.CACHE_KEY_PREFIX}:{alias}',
+                'VERSION': settings.CACHE_VERSION,
+            } for alias in settings.CACHE_NAMESPACES
+        })
+        shared.enable()
+        self.addCleanup(shared.disable)
+
+        self.user = User.objects.create_user('worker', password='secret-pass')
+        self.token = Token.objects.create(user=self.user)
+
+        self.worker = subprocess.Popen(
+            [sys.executable, '-c', AUTH_WORKER, connection.settings_dict['NAME']],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            env={**os.environ, 'CACHE_BACKEND': 'file', 'CACHE_DIR': self.cache_dir.name},
+            cwd=settings.BASE_DIR
+        )
+        self.addCleanup(self.worker.wait)
+        self.addCleanup(self.worker.stdin.close)
+
+    def authenticate_in_worker(self, key):
+        self.worker.stdin.write(key + "\n")
+        self.worker.stdin.flush()
+        return self.worker.stdout.readline().strip()
+
+    def test_deleted_token_is_rejected_by_other_workers(self):
+        key = self.token.key
+        self.assertEqual(self.authenticate_in_worker(key), 'ok')  # now cached by the worker
+        self.token.delete()
+        self.assertEqual(self.authenticate_in_worker(key), 'denied')
+
+    def test_deactivated_user_is_rejected_by_other_workers(self):
+        self.assertEqual(self.authenticate_in_worker(self.token.key), 'ok')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.authenticate_in_worker(self.token.key), 'denied')
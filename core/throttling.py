@@ -0,0 +1,20 @@
+"""
+DRF throttles on the shared 'throttle' cache (settings.CACHES) instead of the
+default one, so every worker counts against the same quota. The request history
+is still read-modify-write as in DRF: two workers racing on one user can lose
+an increment, never block each other.
+"""
+from django.core.cache import caches
+from rest_framework import throttling
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle):
+    cache = caches['throttle']
+
+
+class UserRateThrottle(throttling.UserRateThrottle):
+    cache = caches['throttle']
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle):
+    cache = caches['throttle']
@@ -0,0 +1,245 @@
+"""
+Per-phase timing: spans around each phase of a request (LLM calls, embeddings,
+pgvector queries, Fernet, serialization) feeding the Server-Timing header and
+the Prometheus /metrics endpoint.
+
+    with timing.span('search'):
+        ...
+
+    @timing.span('ai.generate')
+    def generate(...):
+        ...
+
+Metrics are kept in process memory: with several gunicorn workers every worker
+exposes its own series (scrape each worker, or aggregate by instance).
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import ContextDecorator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+# Prometheus histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans of the current request: list of (phase, seconds), or None outside a request
+_request_spans = contextvars.ContextVar('timing_request_spans', default=None)
+
+BACKGROUND_ENDPOINT = 'background'
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+
+class Registry:
+    """Thread-safe store of labelled histograms and counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = defaultdict(dict)  # name -> {labels tuple: Histogram}
+        self.counters = defaultdict(dict)    # name -> {labels tuple: float}
+        self.help = {}
+
+    def observe(self, name, seconds, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, value=1, help_text='', **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.help.setdefault(name, help_text)
+            self.counters[name][key] = self.counters[name].get(key, 0) + value
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            escaped = (
+                '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                for k, v in pairs
+            )
+            return '{' + ','.join(escaped) + '}'
+
+        lines = []
+        with self._lock:
+            for name in sorted(self.histograms):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(self.histograms[name].items()):
+                    for bound, count in zip(BUCKETS, histogram.buckets):
+                        lines.append(f"{name}_bucket{fmt_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {histogram.count}")
+
+            for name in sorted(self.counters):
+                lines.append(f"# HELP {name} {self.help.get(name, '')}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{fmt_labels(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _observe_phase(endpoint, phase, seconds):
+    registry.observe(
+        'memory_phase_duration_seconds', seconds,
+        help_text='Time spent in each phase of a request (AI calls, search, decryption, ...).',
+        endpoint=endpoint, phase=phase
+    )
+
+
+class span(ContextDecorator):
+    """
+    Times the enclosed block as phase `name`. Inside a request the span is
+    reported in Server-Timing and observed under the request's endpoint when the
+    request finishes; elsewhere (ingestion worker, commands) it is observed
+    immediately under endpoint="background".
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._start = None
+
+    def _recreate_cm(self):
+        # Decorated functions get a fresh span per call (safe across threads)
+        return span(self.name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.name, elapsed))
+        else:
+            _observe_phase(BACKGROUND_ENDPOINT, self.name, elapsed)
+        return False
+
+
+def count(name, value=1, help_text='', **labels):
+    """Increments counter `name` (e.g. AI calls and tokens)."""
+    registry.increment(name, value, help_text=help_text, **labels)
+
+
+def record_ai_call(provider, operation, prompt_tokens=None, output_tokens=None, texts=None):
+    count('memory_ai_calls_total', help_text='Calls to the AI provider.', provider=provider, operation=operation)
+    if prompt_tokens:
+        count('memory_ai_tokens_total', prompt_tokens, help_text='Tokens reported by the AI provider.',
+              provider=provider, kind='prompt')
+    if output_tokens:
+        count('memory_ai_tokens_total', output_tokens, help_text='Tokens reported by the AI provider.',
+              provider=provider, kind='output')
+    if texts:
+        count('memory_ai_embedded_texts_total', texts, help_text='Texts sent for embedding.', provider=provider)
+
+
+def context_propagator():
+    """
+    Returns run(fn, *args) executing `fn` with the caller's timing context, for
+    worker threads (ThreadPoolExecutor) whose spans belong to the current request.
+    """
+    context = contextvars.copy_context()
+
+    def run(fn, *args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+class ServerTimingMiddleware:
+    """
+    Collects the spans of each request. Adds a Server-Timing header
+    (SERVER_TIMING_ENABLED) and records request / phase histograms for /metrics.
+    Sync and async capable (ASGI).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header_enabled = getattr(settings, 'SERVER_TIMING_ENABLED', settings.DEBUG)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        spans = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_spans.reset(token)
+        return self._finish(request, response, spans, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        spans = []
+        token = _request_spans.set(spans)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_spans.reset(token)
+        return self._finish(request, response, spans, time.perf_counter() - started)
+
+    def _finish(self, request, response, spans, total):
+        match = getattr(request, 'resolver_match', None)
+        endpoint = (match.url_name or match.view_name) if match else 'unmatched'
+
+        registry.observe(
+            'memory_request_duration_seconds', total,
+            help_text='Request duration per endpoint.',
+            endpoint=endpoint, method=request.method, status=str(response.status_code)
+        )
+
+        # Same phase several times (e.g. parallel map calls): one entry with the total
+        phases = {}
+        for name, seconds in spans:
+            phase = phases.setdefault(name, [0.0, 0])
+            phase[0] += seconds
+            phase[1] += 1
+            _observe_phase(endpoint, name, seconds)
+
+        if self.header_enabled and not response.streaming:
+            entries = [
+                f'{name};dur={seconds * 1000:.1f}' + (f';desc="x{calls}"' if calls > 1 else '')
+                for name, (seconds, calls) in phases.items()
+            ]
+            entries.append(f'total;dur={total * 1000:.1f}')
+            response['Server-Timing'] = ', '.join(entries)
+
+        return response
@@ -1,18 +1,28 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.authtoken.views import obtain_auth_token
-from .views import ProjectViewSet, StoreMemoryView, RetrieveContextView, DeleteMemoryView, RegisterView, ProjectExportView, SiteConfigView
+from django.conf import settings
+from .views import ProjectViewSet, StoreMemoryView, IngestionJobStatusView, RetrieveContextView, DeleteMemoryView, RegisterView, ProjectExportView, ProjectExportStreamView, SiteConfigView
+from .views import AsyncStoreMemoryView, AsyncRetrieveContextView
 
 router = DefaultRouter()
 router.register(r'projects', ProjectViewSet, basename='project')
 
+# ASGI deployments serve the AI-bound endpoints with their async versions
+if getattr(settings, 'ASYNC_AI_VIEWS', False):
+    StoreView, RetrieveView = AsyncStoreMemoryView, AsyncRetrieveContextView
+else:
+    StoreView, RetrieveView = StoreMemoryView, RetrieveContextView
+
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('login/', obtain_auth_token, name='api_token_auth'),
-    path('memories/store/', StoreMemoryView.as_view(), name='store-memory'),
-    path('memories/retrieve/', RetrieveContextView.as_view(), name='retrieve-memory'),
+    path('memories/store/', StoreView.as_view(), name='store-memory'),
+    path('memories/jobs/<uuid:job_id>/', IngestionJobStatusView.as_view(), name='ingestion-job-status'),
+    path('memories/retrieve/', RetrieveView.as_view(), name='retrieve-memory'),
     path('memories/delete/', DeleteMemoryView.as_view(), name='delete-memory'),
     path('projects/export/', ProjectExportView.as_view(), name='export-project-report'),
+    path('projects/export/stream/', ProjectExportStreamView.as_view(), name='export-project-report-stream'),
     path('config/sites/', SiteConfigView.as_view(), name='site-config'),
     path('', include(router.urls)),
 ]
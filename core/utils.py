@@ -1,56 +1,220 @@
 from django.db import models
 from cryptography.fernet import Fernet
 from django.conf import settings
+from django.db.models.query_utils import DeferredAttribute
 import base64
+import functools
+import hashlib
+import hmac
+import re
+import unicodedata
+
+from . import timing
+
+@functools.lru_cache(maxsize=1)
+def get_fernet():
+    """
+    Process-wide Fernet cipher for EncryptedField.
+    Derive a 32-byte URL-safe base64-encoded key from SECRET_KEY
+    This ensures the key is consistent but unique per project
+    In production, use a dedicated os.environ['ENCRYPTION_KEY']
+    """
+    key_material = settings.SECRET_KEY.encode()[:32]
+    # Pad if short (though Django default keys are usually long enough)
+    key_material = key_material.ljust(32, b'0') 
+    final_key = base64.urlsafe_b64encode(key_material)
+    return Fernet(final_key)
+
+class EncryptedText:
+    """
+    Ciphertext loaded by EncryptedField, decrypted on first read of the model
+    attribute (see EncryptedAttribute) and then cached. Rows that are only ranked,
+    counted or deleted never pay the Fernet cost. Model attributes always read as
+    a plain str; this holder only surfaces from values() / values_list().
+    """
+
+    def __init__(self, ciphertext):
+        self.ciphertext = ciphertext
+        self.plaintext = None
+
+    def decrypt(self):
+        if self.plaintext is None:
+            try:
+                self.plaintext = get_fernet().decrypt(self.ciphertext.encode()).decode()
+            except Exception:
+                # Graceful Degradation:
+                # If decryption fails (e.g., data was stored continuously before encryption),
+                # return the raw value to avoid crashing the app.
+                self.plaintext = self.ciphertext
+        return self.plaintext
+
+    def __str__(self):
+        return self.decrypt()
+
+    def __repr__(self):
+        return '<EncryptedText (not decrypted)>' if self.plaintext is None else repr(self.plaintext)
+
+@timing.span('fernet.decrypt')
+def decrypt_all(objects, field='raw_text'):
+    """
+    Bulk-decrypts one encrypted field on a list of model instances with the shared cipher.
+    Call it on the final rows that are about to be serialized. Returns the list.
+    """
+    objects = list(objects)
+    for obj in objects:
+        getattr(obj, field, None)  # EncryptedAttribute decrypts and caches on first read
+    return objects
+
+class EncryptedAttribute(DeferredAttribute):
+    """
+    Model attribute of an EncryptedField. The instance keeps the EncryptedText
+    holder (so an unchanged value is saved back as its original ciphertext) and
+    reads return the decrypted str, so the value works anywhere a str does
+    (re, json, str methods).
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, EncryptedText):
+            return value.decrypt()
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
 
 class EncryptedField(models.TextField):
     """
     A custom model field that encrypts data when saving to the DB 
-    and decrypts when retrieving.
+    and decrypts when retrieving (lazily, see EncryptedText).
     Uses Fernet symmetric encryption.
     """
+    descriptor_class = EncryptedAttribute
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.fernet = self._get_fernet()
+    def is_unchanged(self, instance):
+        """True while the instance holds the value as loaded from the database."""
+        return isinstance(instance.__dict__.get(self.attname), EncryptedText)
 
-    def _get_fernet(self):
-        # Derive a 32-byte URL-safe base64-encoded key from SECRET_KEY
-        # This ensures the key is consistent but unique per project
-        # In production, use a dedicated os.environ['ENCRYPTION_KEY']
-        key_material = settings.SECRET_KEY.encode()[:32]
-        # Pad if short (though Django default keys are usually long enough)
-        key_material = key_material.ljust(32, b'0') 
-        final_key = base64.urlsafe_b64encode(key_material)
-        return Fernet(final_key)
+    def pre_save(self, model_instance, add):
+        # The raw stored value, not the decrypted read, so unchanged text keeps its ciphertext
+        return model_instance.__dict__.get(self.attname)
 
     def get_prep_value(self, value):
         """Encrypts data before sending to the database API."""
         if value is None:
             return None
+
+        # Unchanged value loaded from the DB: store the original ciphertext as is
+        if isinstance(value, EncryptedText):
+            return value.ciphertext
         
         # Ensure it's string before encrypting
         value_str = str(value)
-        encrypted_value = self.fernet.encrypt(value_str.encode())
+        encrypted_value = get_fernet().encrypt(value_str.encode())
         return encrypted_value.decode('utf-8')  # Store as string in DB
 
     def from_db_value(self, value, expression, connection):
-        """Decrypts data when loading from the database."""
+        """Wraps the ciphertext; decryption happens on first access."""
         if value is None:
             return None
-
-        try:
-            # Attempt to decrypt
-            decrypted_value = self.fernet.decrypt(value.encode()).decode()
-            return decrypted_value
-        except Exception:
-            # Graceful Degradation:
-            # If decryption fails (e.g., data was stored continuously before encryption),
-            # return the raw value to avoid crashing the app.
-            return value
+        return EncryptedText(value)
 
     def to_python(self, value):
         """Standard method for deserialization, though from_db_value handles main logic."""
         if value is None:
             return None
         return value
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return None if value is None else str(value)
+
+# Letters that do not decompose under NFKD but should still match their ASCII form
+# ("sifre" -> "şifre" works via NFKD, "isik" -> "ışık" needs this table)
+SEARCH_CHAR_MAP = str.maketrans({
+    'ı': 'i', 'İ': 'i', 'ø': 'o', 'Ø': 'o', 'ß': 'ss', 'æ': 'ae', 'Æ': 'ae',
+    'œ': 'oe', 'Œ': 'oe', 'đ': 'd', 'Đ': 'd', 'ł': 'l', 'Ł': 'l',
+})
+
+def normalize_search_text(value):
+    """
+    Lowercase, unaccented form used for indexed text search (Memory.tags_text).
+    Applied to both the stored value and the search term, so the database
+    never has to run unaccent() over every row at query time.
+    """
+    if value is None:
+        return ''
+    text = str(value).translate(SEARCH_CHAR_MAP)
+    text = unicodedata.normalize('NFKD', text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+def tags_to_search_text(tags):
+    """Flattens the JSON tags list into the normalized text stored in Memory.tags_text."""
+    if not tags:
+        return ''
+    if isinstance(tags, (list, tuple)):
+        return normalize_search_text(" ".join(str(t) for t in tags))
+    return normalize_search_text(tags)
+
+# ---------------- BLIND INDEX ----------------
+# raw_text is encrypted, so the database can't search it. Instead we store keyed
+# HMAC tokens of the normalized character trigrams (Memory.text_index).
+# Equal inputs give equal tokens, but tokens can't be reversed without the key.
+
+@functools.lru_cache(maxsize=1)
+def _blind_index_key():
+    key = getattr(settings, 'BLIND_INDEX_KEY', '')
+    if key:
+        return key.encode()
+    # Domain-separated from the Fernet key, which also derives from SECRET_KEY
+    return hmac.new(settings.SECRET_KEY.encode(), b'memory-blind-index', hashlib.sha256).digest()
+
+def blind_token(value):
+    """HMAC-SHA256 of the value, truncated to a signed 64-bit int (fits a bigint[] column)."""
+    digest = hmac.new(_blind_index_key(), value.encode('utf-8'), hashlib.sha256).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+def text_trigrams(text):
+    """Character trigrams of the normalized text (the whole text if it is shorter)."""
+    normalized = normalize_search_text(text)
+    if len(normalized) < 3:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + 3] for i in range(len(normalized) - 2)}
+
+def _word_trigrams(words):
+    # pg_trgm's padding: two spaces before each word, one after
+    grams = set()
+    for word in words:
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def term_similarity(term, text):
+    """
+    pg_trgm similarity() between `term` and the best-matching run of as many
+    consecutive words of `text`. One matching word is not diluted by a long text,
+    and trigrams scattered over several unrelated words never add up to a match.
+    """
+    term_words = re.findall(r'[^\W_]+', normalize_search_text(term))
+    text_words = re.findall(r'[^\W_]+', normalize_search_text(text))
+    if not term_words or not text_words:
+        return 0.0
+
+    term_grams = _word_trigrams(term_words)
+    width = len(term_words)
+    best = 0.0
+    for start in range(max(1, len(text_words) - width + 1)):
+        grams = _word_trigrams(text_words[start:start + width])
+        best = max(best, len(term_grams & grams) / len(term_grams | grams))
+    return best
+
+def blind_trigram_tokens(text):
+    return sorted({blind_token('t:' + gram) for gram in text_trigrams(text)})
+
+def blind_index_tokens(text):
+    """All tokens stored for a plaintext (the lookups in search.py only query trigrams)."""
+    if not text:
+        return []
+    return blind_trigram_tokens(text)
@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+
+
+VECTOR_DIMENSIONS = 768
+
+# VECTOR_STORAGE_MODE values
+STORAGE_FULL = 'full'      # HNSW over the full-precision vector
+STORAGE_HALF = 'half'      # first pass over halfvec (2x smaller index), exact re-rank
+STORAGE_BINARY = 'binary'  # first pass over binary-quantized bits (32x smaller), exact re-rank
+STORAGE_MODES = (STORAGE_FULL, STORAGE_HALF, STORAGE_BINARY)
+
+
+def storage_mode():
+    mode = getattr(settings, 'VECTOR_STORAGE_MODE', STORAGE_FULL)
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown VECTOR_STORAGE_MODE '{mode}', expected one of {STORAGE_MODES}")
+    return mode
+
+
+# (column, HNSW opclass) the first pass of each storage mode orders by, see nearest_sql()
+ANN_COLUMNS = {
+    STORAGE_FULL: ('vector', 'vector_cosine_ops'),
+    STORAGE_HALF: ('vector_half', 'halfvec_cosine_ops'),
+    STORAGE_BINARY: ('vector_bit', 'bit_hamming_ops'),
+}
+
+
+def ann_index(mode):
+    """The HNSW index on core_memory that `mode` searches (one per storage mode)."""
+    from pgvector.django import HnswIndex
+    name = {
+        STORAGE_FULL: 'memory_vector_hnsw_idx',
+        STORAGE_HALF: 'memory_vector_half_hnsw_idx',
+        STORAGE_BINARY: 'memory_vector_bit_hnsw_idx',
+    }[mode]
+    column, opclass = ANN_COLUMNS[mode]
+    return HnswIndex(name=name, fields=[column], m=16, ef_construction=64, opclasses=[opclass])
+
+
+def sync_ann_indexes(schema_editor, model, modes=None, log=print):
+    """
+    Builds the ANN index of each storage mode in `modes` (default: the configured
+    one) and drops the others, both CONCURRENTLY so writes keep going. Every HNSW
+    index is maintained on insert and competes for shared_buffers, so only the one
+    being searched is kept. Must run outside a transaction (non-atomic migration,
+    management command). Returns (created, dropped) index names.
+    """
+    modes = set(modes or [storage_mode()])
+    with schema_editor.connection.cursor() as cursor:
+        existing = set(schema_editor.connection.introspection.get_constraints(cursor, model._meta.db_table))
+
+    # Build before dropping, so a failed build never leaves the table without an ANN index
+    created, dropped = [], []
+    for mode in STORAGE_MODES:
+        index = ann_index(mode)
+        if mode in modes and index.name not in existing:
+            log(f"➕ {index.name} ({mode})")
+            schema_editor.add_index(model, index, concurrently=True)
+            created.append(index.name)
+    for mode in STORAGE_MODES:
+        index = ann_index(mode)
+        if mode not in modes and index.name in existing:
+            log(f"➖ {index.name} ({mode})")
+            schema_editor.remove_index(model, index, concurrently=True)
+            dropped.append(index.name)
+    return created, dropped
+
+
+def quantize(vector):
+    """
+    Returns (halfvec values, bit string) for a full-precision vector.
+    The bit string matches pgvector's binary_quantize(): 1 where the value is > 0.
+    """
+    values = [float(x) for x in vector]
+    return values, ''.join('1' if x > 0 else '0' for x in values)
+
+
+_pgvector_version = None
+
+
+def pgvector_version():
+    """Installed pgvector version as a tuple, e.g. (0, 8, 0); None without the extension. Cached per process."""
+    global _pgvector_version
+    if _pgvector_version is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        if not row:
+            return None
+        _pgvector_version = tuple(int(part) for part in row[0].split('.')[:3])
+    return _pgvector_version
+
+
+def search_params():
+    """
+    ANN search parameters from settings.
+    Returns a dict of pgvector GUC name -> value (None values are skipped).
+    """
+    iterative_scan = getattr(settings, 'VECTOR_SEARCH_ITERATIVE_SCAN', 'relaxed_order') or None
+    if iterative_scan and (pgvector_version() or (0,)) < (0, 8, 0):
+        # Older pgvector reserves the hnsw.* prefix and rejects the unknown setting
+        iterative_scan = None
+
+    return {
+        'hnsw.ef_search': getattr(settings, 'VECTOR_SEARCH_EF_SEARCH', 100),
+        'ivfflat.probes': getattr(settings, 'VECTOR_SEARCH_PROBES', 10),
+        # pgvector >= 0.8: keep scanning the index until enough rows pass
+        # the project_id filter ('relaxed_order' or 'strict_order').
+        'hnsw.iterative_scan': iterative_scan,
+    }
+
+
+@contextmanager
+def tuned(extra=None):
+    """
+    Runs the enclosed vector queries with the configured ef_search / probes
+    (plus any `extra` GUCs, e.g. pg_trgm.similarity_threshold).
+    Uses set_config(..., is_local=true) so the values only live for this transaction
+    and never leak into other requests sharing a pooled connection.
+    Querysets must be evaluated inside the block.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for name, value in {**search_params(), **(extra or {})}.items():
+                if value is None:
+                    continue
+                cursor.execute("SELECT set_config(%s, %s, true)", [name, str(value)])
+        yield
+
+
+def nearest_sql(query_vector_sql, project_id_sql, limit_sql, mode=None, candidates=None, table='core_memory'):
+    """
+    SQL for "the `limit_sql` nearest memories of a project", selecting (id, distance)
+    ordered by exact cosine distance against the full-precision vector.
+
+    Arguments are SQL expressions (placeholders or column references), so the same
+    fragment serves plain queries, CTEs and LATERAL joins. The ANN index scan
+    fetches VECTOR_RERANK_CANDIDATES rows (over vector_half / vector_bit in 'half' /
+    'binary' storage modes) which are then re-ranked exactly.
+    `mode`, `candidates` and `table` override the settings (benchmark_vector_indexes).
+    """
+    mode = mode or storage_mode()
+
+    candidates = int(candidates or getattr(settings, 'VECTOR_RERANK_CANDIDATES', 100))
+
+    if mode == STORAGE_FULL:
+        # The index scan may return rows slightly out of order (iterative_scan =
+        # relaxed_order): sort a candidate pool exactly, so a LIMIT 1 (dedup lookup)
+        # really is the nearest neighbour. MATERIALIZED keeps the planner from
+        # trusting the index order and dropping the outer sort.
+        return f"""
+            WITH ann AS MATERIALIZED (
+                SELECT m.id, m.vector <=> {query_vector_sql} AS distance
+                FROM {table} m
+                WHERE m.project_id = {project_id_sql}
+                ORDER BY distance
+                LIMIT GREATEST({limit_sql}, {candidates})
+            )
+            SELECT ann.id, ann.distance
+            FROM ann
+            ORDER BY ann.distance
+            LIMIT {limit_sql}
+        """
+
+    if mode == STORAGE_HALF:
+        first_pass_order = f"m.vector_half <=> ({query_vector_sql})::halfvec({VECTOR_DIMENSIONS})"
+    else:
+        first_pass_order = f"m.vector_bit <~> binary_quantize({query_vector_sql})::bit({VECTOR_DIMENSIONS})"
+
+    return f"""
+        SELECT first_pass.id, first_pass.vector <=> {query_vector_sql} AS distance
+        FROM (
+            SELECT m.id, m.vector
+            FROM {table} m
+            WHERE m.project_id = {project_id_sql}
+            ORDER BY {first_pass_order}
+            LIMIT GREATEST({limit_sql}, {candidates})
+        ) first_pass
+        ORDER BY distance
+        LIMIT {limit_sql}
+    """
+
+
+def to_sql_vector(vector):
+    """Text form of a vector for raw SQL parameters ('%s::vector')."""
+    return '[' + ','.join(str(float(x)) for x in vector) + ']'
+
+
+PROJECT_INDEX_PREFIXES = {
+    STORAGE_FULL: 'core_memory_vec_',
+    STORAGE_HALF: 'core_memory_vech_',
+    STORAGE_BINARY: 'core_memory_vecb_',
+}
+
+
+def project_index_name(project_id, mode=None):
+    """Name of the per-project partial HNSW index of `mode` (default: the configured one), see create_project_vector_indexes."""
+    return PROJECT_INDEX_PREFIXES[mode or storage_mode()] + str(project_id).replace('-', '')
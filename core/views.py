@@ -4,20 +4,21 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, TextField
-from django.db.models.functions import Cast
-from django.contrib.postgres.search import TrigramSimilarity
-from pgvector.django import CosineDistance
+from adrf.views import APIView as AsyncAPIView
+from asgiref.sync import sync_to_async
 
-from .models import Project, Memory, ProjectReport
+from .models import Project, Memory, ProjectReport, IngestionJob
 from .serializers import ProjectSerializer, MemorySerializer, UserSerializer
-from . import ai_services
-import hashlib
-import markdown
-from xhtml2pdf import pisa
-from xhtml2pdf import pisa
-from django.http import HttpResponse
-from rest_framework.throttling import ScopedRateThrottle
+from . import ai_services, search, retrieval_cache, reports, timing
+from .ingestion import aingest_memory, ingest_memory
+from .auth import aresolve_project, resolve_project
+from .utils import decrypt_all
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.conf import settings
+import hmac
+import json
+from .throttling import ScopedRateThrottle
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -47,6 +48,13 @@ class ProjectViewSet(viewsets.ModelViewSet):
         # Only return projects belonging to the current user
         return Project.objects.filter(user=self.request.user)
 
+def _wants_async(request):
+    """Async ingestion is opt-in per request ("async": true) or globally via MEMORY_STORE_ASYNC."""
+    flag = request.data.get('async')
+    if flag is None:
+        return getattr(settings, 'MEMORY_STORE_ASYNC', False)
+    return str(flag).lower() in ('1', 'true', 'yes')
+
 class StoreMemoryView(views.APIView):
     permission_classes = [IsAuthenticated]
     throttle_classes = [ScopedRateThrottle]
@@ -62,139 +70,40 @@ class StoreMemoryView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if project exists
-        project = get_object_or_404(Project, id=project_id)
-        
-        # Explicit Permission Check
-        if project.user != request.user:
-            return Response({"error": "Unauthorized project access"}, status=status.HTTP_403_FORBIDDEN)
-
-        # 1. RETRIEVE CONTEXT (Source A + Source B) to enable "Context-Aware Math"
-        # We need to give the AI the current state (e.g. "Budget is 500") so it can process "Add 50" -> 550.
-        
-        context_str = ""
-        try:
-            # Generate embedding for the *current* input to find similar past memories
-            current_embedding = ai_services.get_embedding(text)
-            
-            if current_embedding:
-                # Source A: Similarity (Find relevant topics like "Budget" or "Weight")
-                similar_memories = list(Memory.objects.filter(project=project) \
-                    .annotate(distance=CosineDistance('vector', current_embedding)) \
-                    .order_by('distance')[:15]) # Top 15 relevant (Expanded)
-
-                # Source B: Recency (Find specific immediate context like "I just said X")
-                # We need the absolute latest memories to handle "Add 5 to that"
-                recent_memories = list(Memory.objects.filter(project=project) \
-                    .order_by('-created_at')[:10]) # Last 10 items (Expanded)
-
-                # Merge & Deduplicate
-                context_pool = {m.id: m for m in similar_memories + recent_memories}.values()
-                
-                # Sort by Created At (Oldest -> Newest) so the AI reads the story in order
-                sorted_pool = sorted(context_pool, key=lambda x: x.created_at)
-
-                # Format as string
-                context_lines = []
-                for m in sorted_pool:
-                    date_str = m.created_at.strftime("%Y-%m-%d %H:%M")
-                    context_lines.append(f"- [{date_str}] {m.raw_text}")
-                
-                context_str = "\n".join(context_lines)
-                print(f"🧠 INJECTING CONTEXT ({len(sorted_pool)} items):\n{context_str[:200]}...")
-
-        except Exception as e:
-            print(f"⚠️ Error retrieving context: {e}")
-            # Non-blocking: proceed without context if this fails
+        # Owned project (404 otherwise); only its id is used, so ownership may come from cache
+        project = resolve_project(request, project_id, load=False)
 
-        # 2. Analyze and extract memory (WITH CONTEXT)
-        # Returns LIST of dicts [{'raw_text': str, 'tags': list, 'category': str}] or []
-        extraction_results = ai_services.analyze_and_extract_memory(text, context_str)
-        print(f"🧠 DEBUG EXTRACTION: {extraction_results}")
-        
-        if not extraction_results:
+        # Async mode: queue the job and let run_ingestion_worker do the heavy lifting
+        if _wants_async(request):
+            job = IngestionJob.objects.create(project=project, text=text)
             return Response({
-                "message": "No significant memory extracted from the text.",
-                "created_count": 0,
-                "results": []
-            }, status=status.HTTP_200_OK)
+                "message": "Memory queued for processing.",
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": reverse('ingestion-job-status', kwargs={'job_id': job.id})
+            }, status=status.HTTP_202_ACCEPTED)
 
-        saved_memories = []
-        ignored_memories = []
+        payload, status_code = ingest_memory(project, text)
+        return Response(payload, status=status_code)
 
-        # Iterate over each extracted fact
-        for item in extraction_results:
-            extracted_text = item.get('raw_text')
-            tags = item.get('tags', [])
-            category = item.get('category', 'other')
-
-            if not extracted_text:
-                continue
-
-            # 2. Get embedding for the extracted text
-            embedding = ai_services.get_embedding(extracted_text)
-            
-            if not embedding:
-                print(f"❌ Failed to generate embedding for: {extracted_text}")
-                continue
-
-            # 3. DEDUPLICATION CHECK
-            # A) CORRECTION BYPASS
-            correction_keywords = {
-                'correction', 'change', 'update', 'düzeltme', 'degisiklik', 
-                'yenileme', 'revizyon', 'guncelleme', 
-                'status', 'durum', 'pending', 'beklemede', 'draft', 'taslak'
-            }
-            
-            is_correction = False
-            
-            # Etiketleri, kategoriyi ve metni birleştirip tek seferde kontrol ediyoruz
-            # tags listesindeki elemanları string'e çevirmeyi garantiye alıyoruz
-            tags_str = " ".join([str(t) for t in tags]) 
-            check_text = (extracted_text + " " + category + " " + tags_str).lower()
+class IngestionJobStatusView(views.APIView):
+    permission_classes = [IsAuthenticated]
 
-            if any(k in check_text for k in correction_keywords):
-                is_correction = True
-
-            if is_correction:
-                print("🚀 Correction detected. Skipping deduplication.")
-            else:
-                # B) STANDARD DEDUPLICATION
-                similar_memories = Memory.objects.filter(project=project) \
-                    .annotate(distance=CosineDistance('vector', embedding)) \
-                    .filter(distance__lt=0.05) \
-                    .order_by('distance')
-                    
-                if similar_memories.exists():
-                    duplicate = similar_memories.first()
-                    print(f"🛑 Duplicate blocked. Distance: {duplicate.distance}")
-                    ignored_memories.append({
-                        "text": extracted_text,
-                        "reason": "Duplicate"
-                    })
-                    continue
-                
-            # 4. Save Memory
-            memory = Memory.objects.create(
-                project=project,
-                raw_text=extracted_text, 
-                vector=embedding,
-                tags=tags,
-                category=category,
-                source="user_conversation"
-            )
-            saved_memories.append({
-                "id": memory.id,
-                "text": extracted_text,
-                "category": category
-            })
+    def get(self, request, job_id):
+        job = get_object_or_404(IngestionJob, id=job_id, project__user=request.user)
 
         return Response({
-            "message": f"Processed {len(extraction_results)} facts.",
-            "created_count": len(saved_memories),
-            "saved": saved_memories,
-            "ignored": ignored_memories
-        }, status=status.HTTP_201_CREATED)
+            "job_id": job.id,
+            "project_id": job.project_id,
+            "status": job.status,
+            "attempts": job.attempts,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+            "result": job.result,
+            "result_status": job.result_status,
+            "error": job.error or None
+        }, status=status.HTTP_200_OK)
 
 class RetrieveContextView(views.APIView):
     permission_classes = [IsAuthenticated]
@@ -212,12 +121,18 @@ class RetrieveContextView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Check if project exists
-        project = get_object_or_404(Project, id=project_id)
-        
-        # Explicit Permission Check
-        if project.user != request.user:
-            return Response({"error": "Unauthorized project access"}, status=status.HTTP_403_FORBIDDEN)
+        # Owned project (404 otherwise), loaded: the cache key needs the current data_version
+        project = resolve_project(request, project_id)
+
+        # 0. Result Cache (keyed on the project's data version, so writes invalidate it)
+        cache_key = retrieval_cache.make_key(project.id, project.data_version, query)
+        with timing.span('cache.lookup'):
+            cached_results = retrieval_cache.lookup(cache_key)
+        if cached_results is not None:
+            print(f"⚡ RETRIEVAL CACHE HIT: {query}")
+            return Response({
+                "results": cached_results
+            }, status=status.HTTP_200_OK)
 
         # 1. Get embedding for the query
         print(f"DEBUG QUERY: {query}")
@@ -230,77 +145,28 @@ class RetrieveContextView(views.APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # 2. Vector Search (Top 20) - Increased from 10
-        vector_memories = list(Memory.objects.filter(project=project) \
-            .order_by(CosineDistance('vector', query_embedding))[:20])
+        # 2. Hybrid Search (Vector + Fuzzy Keyword/Trigram) in a single query
+        # Trigram allows typos ("büttçe") and suffix variations ("bütçesi")
+        # Both rankings are fused with reciprocal-rank fusion in SQL.
+        keywords = search.extract_keywords(query)
+        top_results = search.hybrid_search(project, query_embedding, keywords, limit=20)
 
-        # 3. Fuzzy Keyword Search (Trigram)
-        # Allows typos ("büttçe") and suffix variations ("bütçesi")
-        keywords = [w for w in query.split() if len(w) > 3]
-        keyword_memories = []
-        
-        # MULTILINGUAL STOPWORD FILTER
-        ignored_keywords = {
-            # TR Common & Domain
-            'proje', 'projede', 'projesi', 'hakkında', 'nedir', 'hangi', 'neler', 
-            'ile', 'için', 've', 'veya', 'bir', 'bu', 'şu', 'uygulama',
-            
-            # EN Common & Domain
-            'project', 'projects', 'about', 'what', 'which', 'how', 
-            'for', 'with', 'and', 'or', 'a', 'an', 'the', 'this', 'that', 'app', 'application'
-        }
-
-        if keywords:
-            for word in keywords:
-                if word.lower() in ignored_keywords:
-                    continue
-
-                # DYNAMIC THRESHOLD LOGIC
-                # Short words need loose matching (typos), Long words need strict matching (noise)
-                threshold = 0.3 if len(word) > 5 else 0.1
-                
-
-                
-                # Search in Tags
-                similar_tags = Memory.objects.filter(project=project) \
-                    .annotate(tags_as_text=Cast('tags', output_field=TextField())) \
-                    .annotate(similarity=TrigramSimilarity('tags_as_text', word)) \
-                    .filter(similarity__gt=threshold) \
-                    .order_by('-similarity')[:2]
+        print(f"DEBUG FOUND: {len(top_results)} fused memories ({len(keywords)} keywords)")
 
-                if len(similar_tags) > 0:
-                    print(f"🎯 DEBUG KEYWORD MATCH for '{word}' (Thresh: {threshold}): Found {len(similar_tags)} tags")
+        # 3. Serialize results (Top 20 Relevance -> Sort by Date)
+        results = _serialize_results(top_results)
+        retrieval_cache.store(cache_key, results)
 
-                keyword_memories.extend(list(similar_tags))
-                
-
-
-        # 4. Merge and Deduplicate (Keep relevance ranking)
-        # PRIORITY: Vectors FIRST, then Keywords
-        seen_ids = set()
-        final_results = []
-
-        # Vectors first
-        for mem in vector_memories:
-            if mem.id not in seen_ids:
-                final_results.append(mem)
-                seen_ids.add(mem.id)
-
-        # Keywords second
-        for mem in keyword_memories:
-            if mem.id not in seen_ids:
-                final_results.append(mem)
-                seen_ids.add(mem.id)
-
-        print(f"DEBUG FOUND: {len(final_results)} merged memories")
+        return Response({
+            "results": results
+        }, status=status.HTTP_200_OK)
 
-        # 5. Serialize results (Select Top 20 Relevance -> Sort by Date)
-        # We slice [:20] FIRST to keep the most relevant ones.
-        top_results = final_results[:20]
-        
-        # THEN sort chronologically (Newest First) as requested for UI priority
-        top_results.sort(key=lambda x: x.created_at, reverse=True)
+def _serialize_results(top_results):
+    # Sort chronologically (Newest First) as requested for UI priority
+    top_results.sort(key=lambda x: x.created_at, reverse=True)
+    decrypt_all(top_results)  # Fernet cost only for the rows we return
 
+    with timing.span('serialize'):
         results = []
         for mem in top_results:
             time_str = mem.created_at.strftime("%Y-%m-%d %H:%M")
@@ -310,8 +176,89 @@ class RetrieveContextView(views.APIView):
                 "id": mem.id,
                 "raw_text": formatted_text, 
                 "source": mem.source,
-                "created_at": mem.created_at
+                "created_at": mem.created_at,
+                "score": round(mem.score, 5)
             })
+    return results
+
+# ---------------- ASGI (async) versions ----------------
+# Served instead of the two views above when ASYNC_AI_VIEWS is on (the default
+# under universal_memory.asgi). Auth, permissions and throttling run as usual;
+# the handlers await the AI calls, so a request waiting on the model holds no
+# worker thread.
+
+class AsyncStoreMemoryView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'ai_action'
+
+    async def post(self, request):
+        project_id = request.data.get('project_id')
+        text = request.data.get('text')
+
+        if not project_id or not text:
+            return Response(
+                {"error": "project_id and text are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        project = await aresolve_project(request, project_id, load=False)
+
+        if _wants_async(request):
+            job = await IngestionJob.objects.acreate(project=project, text=text)
+            return Response({
+                "message": "Memory queued for processing.",
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": reverse('ingestion-job-status', kwargs={'job_id': job.id})
+            }, status=status.HTTP_202_ACCEPTED)
+
+        payload, status_code = await aingest_memory(project, text)
+        return Response(payload, status=status_code)
+
+class AsyncRetrieveContextView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'ai_action'
+
+    async def post(self, request):
+        project_id = request.data.get('project_id')
+        query = request.data.get('query')
+
+        if not project_id or not query:
+            return Response(
+                {"error": "project_id and query are required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        project = await aresolve_project(request, project_id)
+
+        # 0. Result Cache
+        cache_key = retrieval_cache.make_key(project.id, project.data_version, query)
+        with timing.span('cache.lookup'):
+            cached_results = await retrieval_cache.alookup(cache_key)
+        if cached_results is not None:
+            print(f"⚡ RETRIEVAL CACHE HIT: {query}")
+            return Response({
+                "results": cached_results
+            }, status=status.HTTP_200_OK)
+
+        # 1. Query embedding (awaited)
+        query_embedding = await ai_services.aget_embedding(query)
+        if not query_embedding:
+            return Response(
+                {"error": "Failed to generate embedding for query."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        # 2. Hybrid Search
+        keywords = search.extract_keywords(query)
+        top_results = await sync_to_async(search.hybrid_search)(project, query_embedding, keywords, limit=20)
+        print(f"DEBUG FOUND: {len(top_results)} fused memories ({len(keywords)} keywords)")
+
+        # 3. Serialize results
+        results = _serialize_results(top_results)
+        await retrieval_cache.astore(cache_key, results)
 
         return Response({
             "results": results
@@ -327,20 +274,16 @@ class DeleteMemoryView(views.APIView):
         if not project_id:
             return Response({"error": "Project ID required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if project exists
-        project = get_object_or_404(Project, id=project_id)
-        
-        # Explicit Permission Check
-        if project.user != request.user:
-            return Response({"error": "Unauthorized project access"}, status=status.HTTP_403_FORBIDDEN)
+        # Owned project (404 otherwise); only its id is used
+        project = resolve_project(request, project_id, load=False)
         memory_id = request.data.get('memory_id')
 
         try:
             if memory_id:
                 # 0. DIRECT DELETION (UI Support)
-                memory_to_delete = get_object_or_404(Memory, id=memory_id, project=project)
-                deleted_text = memory_to_delete.raw_text
-                memory_to_delete.delete()
+                memory_to_delete = get_object_or_404(Memory.objects.slim(), id=memory_id, project=project)
+                deleted_text = str(memory_to_delete.raw_text)
+                memory_to_delete.delete()  # also bumps project.data_version
                 print(f"🗑️ UI DELETE: ID {memory_id} - '{deleted_text}'")
                 
                 snippet = deleted_text[:50] + "..." if len(deleted_text) > 50 else deleted_text
@@ -355,7 +298,7 @@ class DeleteMemoryView(views.APIView):
             if not target_text:
                 # 1. PANIC MODE: User typed "/delete" (No args)
                 # Delete the absolute last memory created (Undo)
-                memory_to_delete = Memory.objects.filter(project=project).order_by('-created_at').first()
+                memory_to_delete = Memory.objects.filter(project=project).slim().order_by('-created_at').first()
             
             else:
                 # 0. SAFETY LOCK (NEW) 🛡️
@@ -371,33 +314,22 @@ class DeleteMemoryView(views.APIView):
                 
                 # A) Priority 1: Unaccented Exact-ish Match (Text OR Tags)
                 # Handles "butce" -> "bütçe", "sifre" -> "şifre"
-                # Note: We cast tags to text to allow string searching
-                memory_to_delete = Memory.objects.filter(project=project) \
-                    .annotate(tags_as_text=Cast('tags', output_field=TextField())) \
-                    .filter(
-                        Q(raw_text__unaccent__icontains=target_text) | 
-                        Q(tags_as_text__unaccent__icontains=target_text)
-                    ).order_by('-created_at').first()
+                # Note: raw_text is encrypted, so text matches go through the blind index
+                memory_to_delete = search.find_latest_containing(Memory.objects.filter(project=project), target_text)
 
                 # B) Priority 2: Fuzzy Match (ONLY for words >= 4 chars)
                 # We skip fuzzy for short words to prevent accidents
                 if not memory_to_delete and len(target_text) >= 4:
                     print(f"🔍 Unaccent match failed for '{target_text}'. Trying Trigram...")
                     
-                    memory_to_delete = Memory.objects.filter(project=project) \
-                        .annotate(tags_as_text=Cast('tags', output_field=TextField())) \
-                        .annotate(
-                            sim_text=TrigramSimilarity('raw_text', target_text),
-                            sim_tags=TrigramSimilarity('tags_as_text', target_text)
-                        ) \
-                        .filter(Q(sim_text__gt=0.4) | Q(sim_tags__gt=0.4)) \
-                        .order_by('-created_at') \
-                        .first() 
-                        # Note: Ordering by created_at is safer for 'Undo' logic than similarity score alone.
+                    memory_to_delete = search.find_latest_similar(
+                        Memory.objects.filter(project=project), target_text, threshold=0.4
+                    )
+                    # Note: Ordering by created_at is safer for 'Undo' logic than similarity score alone.
 
             if memory_to_delete:
-                deleted_text = memory_to_delete.raw_text
-                memory_to_delete.delete()
+                deleted_text = str(memory_to_delete.raw_text)
+                memory_to_delete.delete()  # also bumps project.data_version
                 print(f"🗑️ HARD DELETE: '{deleted_text}'")
                 
                 # Return snippet for confirmation
@@ -426,92 +358,41 @@ class ProjectExportView(views.APIView):
         if not project_id:
             return Response({"error": "Project ID required"}, status=status.HTTP_400_BAD_REQUEST)
             
-        # Check permissions
-        project = get_object_or_404(Project, id=project_id)
-        if project.user != request.user:
-            return Response({"error": "Unauthorized project access"}, status=status.HTTP_403_FORBIDDEN)
+        # Check permissions (404 unless owned)
+        project = resolve_project(request, project_id)
             
         # Fetch all memories
-        memories = Memory.objects.filter(project=project).order_by('created_at')
+        memories = Memory.objects.filter(project=project).slim().order_by('created_at')
         
         if not memories.exists():
             return Response({"error": "No memories found for this project"}, status=status.HTTP_404_NOT_FOUND)
             
         # ---------------- CACHING LOGIC ----------------
-        # Calculate Data Hash (Fingerprint of current state)
-        memory_fingerprints = memories.values_list('id', 'created_at')
-        fingerprint_str = "".join([f"{mid}-{mtime}" for mid, mtime in memory_fingerprints])
-        data_hash = hashlib.md5(fingerprint_str.encode('utf-8')).hexdigest()
+        # Data Hash = Fingerprint of current state (data_version, maintained on every write/delete)
+        data_hash = project.data_fingerprint
 
         # Check Cache
         cached_report = ProjectReport.objects.filter(project=project, data_hash=data_hash).first()
         
         if cached_report:
             print(f"⚡ CACHE HIT: Serving report for hash {data_hash}")
-            report_markdown = cached_report.markdown_content
+            report = cached_report
         else:
             print(f"🐢 CACHE MISS: Generating new report for hash {data_hash}")
-            memory_data = []
-            for mem in memories:
-                memory_data.append({
-                    "raw_text": mem.raw_text,
-                    "category": mem.category,
-                    "created_at": mem.created_at.strftime("%Y-%m-%d %H:%M:%S")
-                })
-                
-            # Generate Report using AI (Markdown)
-            report_markdown = ai_services.generate_project_report(memory_data)
-            
-            # Save to Cache
-            ProjectReport.objects.create(
-                project=project,
-                markdown_content=report_markdown,
-                data_hash=data_hash
-            )
+            # Generate Report using AI (Markdown), incrementally from the previous report when possible
+            # (saved to the ProjectReport cache)
+            report = reports.build_report(project, data_hash)
+        report_markdown = report.markdown_content
         
         if export_format == 'pdf':
-            # Convert Markdown -> HTML
-            html_content = markdown.markdown(report_markdown)
+            # Rendered once per report, then served from the artifact store
+            pdf_content = reports.get_artifact(report, 'pdf')
             
-            # Robust styling for PDF with Local DejaVu Sans (Multi-language support)
-            full_html = f"""
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    @page {{ size: A4; margin: 1cm; }}
-                    @font-face {{
-                        font-family: 'DejaVuSans';
-                        src: url('/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf');
-                    }}
-                    body {{ 
-                        font-family: 'DejaVuSans', sans-serif; 
-                        font-size: 12px; 
-                    }}
-                    h1 {{ color: #333; font-size: 18px; border-bottom: 1px solid #ccc; padding-bottom: 5px; }}
-                    h2 {{ color: #555; font-size: 14px; margin-top: 15px; }}
-                    ul {{ margin-left: 20px; }}
-                    li {{ margin-bottom: 5px; }}
-                    strong, b {{ font-weight: bold; }}
-                </style>
-            </head>
-            <body>
-                <h1>Project Report: {project.name}</h1>
-                {html_content}
-            </body>
-            </html>
-            """
+            if pdf_content is None:
+                return Response({"error": "Error generating PDF"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
-            # Generate PDF
-            response = HttpResponse(content_type='application/pdf')
+            response = HttpResponse(pdf_content, content_type='application/pdf')
             response['Content-Disposition'] = f'attachment; filename="{project.name}_Report.pdf"'
-            
-            # Encode HTML to UTF-8 before passing to pisa
-            pisa_status = pisa.CreatePDF(full_html.encode('utf-8'), dest=response, encoding='utf-8')
-            
-            if pisa_status.err:
-                return Response({"error": "Error generating PDF"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-                
             return response
         
         # Default: Return JSON with Markdown
@@ -520,6 +401,87 @@ class ProjectExportView(views.APIView):
             "report": report_markdown
         }, status=status.HTTP_200_OK)
 
+async def _async_stream(iterator):
+    """
+    Async iterator over a sync generator, one thread hop per item, so ASGI sends
+    each event as soon as it is produced. thread_sensitive keeps every step (and
+    the generator's ORM queries) on the request's sync thread and DB connection.
+    """
+    sentinel = object()
+    try:
+        while True:
+            item = await sync_to_async(next, thread_sensitive=True)(iterator, sentinel)
+            if item is sentinel:
+                return
+            yield item
+    finally:
+        # Client went away mid-stream: let the generator clean up on its own thread
+        await sync_to_async(iterator.close, thread_sensitive=True)()
+
+class ProjectExportStreamView(views.APIView):
+    """
+    Streaming variant of ProjectExportView (Markdown only) over Server-Sent Events.
+    Events: `start` (sent immediately), `chunk` ({"text": ...}) as the model writes,
+    then `done` ({"report_id", "data_hash", "cached"}) or `error` ({"error": ...}).
+    The assembled report is saved to ProjectReport when the stream completes.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @staticmethod
+    def _event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def post(self, request):
+        project_id = request.data.get('project_id')
+        
+        if not project_id:
+            return Response({"error": "Project ID required"}, status=status.HTTP_400_BAD_REQUEST)
+            
+        # Check permissions (404 unless owned)
+        project = resolve_project(request, project_id)
+            
+        if not Memory.objects.filter(project=project).exists():
+            return Response({"error": "No memories found for this project"}, status=status.HTTP_404_NOT_FOUND)
+            
+        data_hash = project.data_fingerprint
+        cached_report = ProjectReport.objects.filter(project=project, data_hash=data_hash).first()
+        
+        def events():
+            yield self._event('start', {"project_name": project.name, "data_hash": data_hash})
+            
+            if cached_report:
+                print(f"⚡ CACHE HIT: Streaming report for hash {data_hash}")
+                report = cached_report
+                yield self._event('chunk', {"text": report.markdown_content})
+            else:
+                print(f"🐢 CACHE MISS: Streaming new report for hash {data_hash}")
+                stream = reports.stream_report(project, data_hash)
+                while True:
+                    try:
+                        chunk = next(stream)
+                    except StopIteration as done:
+                        report = done.value
+                        break
+                    yield self._event('chunk', {"text": chunk})
+            
+            if report.markdown_content.startswith(reports.ERROR_REPORT_PREFIX):
+                yield self._event('error', {"error": report.markdown_content})
+            else:
+                yield self._event('done', {
+                    "report_id": report.id,
+                    "data_hash": data_hash,
+                    "cached": cached_report is not None
+                })
+        
+        stream = events()
+        if getattr(settings, 'ASGI_DEPLOYMENT', False):
+            # Django buffers a sync iterator completely before serving it under ASGI
+            stream = _async_stream(stream)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+        return response
+
 class SiteConfigView(views.APIView):
     permission_classes = [AllowAny]
 
@@ -562,3 +524,23 @@ class SiteConfigView(views.APIView):
             }
         }
         return Response(sites_config, status=status.HTTP_200_OK)
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (request / phase histograms, AI call and token counters).
+    Enabled by METRICS_ENABLED (default: DEBUG). Requires
+    `Authorization: Bearer <METRICS_TOKEN>`; without a token it only answers in DEBUG.
+    """
+    if not getattr(settings, 'METRICS_ENABLED', False):
+        return HttpResponse(status=404)
+
+    expected = getattr(settings, 'METRICS_TOKEN', '')
+    if not expected:
+        if not settings.DEBUG:
+            # Request counts, AI usage and cache stats are not for the public internet
+            print("⚠️ /metrics refused: METRICS_ENABLED is on but METRICS_TOKEN is not set.")
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {expected}"):
+        return HttpResponse(status=401)
+
+    return HttpResponse(timing.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
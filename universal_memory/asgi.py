@@ -0,0 +1,7 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'universal_memory.settings')
+os.environ.setdefault('ASGI_DEPLOYMENT', 'True')
+
+application = get_asgi_application()
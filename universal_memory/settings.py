@@ -8,6 +8,9 @@ SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-replace-me-in-
 
 DEBUG = os.environ.get('DEBUG', 'False') == 'True'
 
+# Set by universal_memory/asgi.py: served by an ASGI server (uvicorn) instead of WSGI gunicorn
+ASGI_DEPLOYMENT = os.environ.get('ASGI_DEPLOYMENT', 'False') == 'True'
+
 ALLOWED_HOSTS = ['*']
 
 CSRF_TRUSTED_ORIGINS = [
@@ -36,14 +39,14 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.auth.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
+        'core.throttling.AnonRateThrottle',
+        'core.throttling.UserRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
@@ -54,13 +57,15 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +89,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'universal_memory.wsgi.application'
+ASGI_APPLICATION = 'universal_memory.asgi.application'
 
 DATABASES = {
     'default': {
@@ -99,10 +105,58 @@ DATABASES = {
 if os.environ.get('DATABASE_URL'):
     DATABASES['default'] = dj_database_url.config(
         default=os.environ.get('DATABASE_URL'),
-        conn_max_age=600,
+        # Under ASGI every request runs its ORM calls on a thread of its own, so
+        # persistent connections would pile up: put a pooler (pgbouncer) in front instead
+        conn_max_age=0 if ASGI_DEPLOYMENT else 600,
         conn_health_checks=True,
     )
 
+# Shared cache tier (throttle counters, auth, retrieval results, embeddings), the
+# same for every worker.
+# CACHE_BACKEND: 'redis' (REDIS_URL, any Redis-compatible server), 'db' (the
+# default without REDIS_URL; `manage.py createcachetable`, run by the Dockerfile),
+# 'file' (CACHE_DIR, one host only) or 'locmem' (explicit dev / test use only: per
+# process, so with N workers users get N times every throttle quota and revoked
+# tokens keep working in other workers; core.apps warns outside DEBUG).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis' if os.environ.get('REDIS_URL') else 'db')
+CACHE_BACKENDS = {
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'core_shared_cache',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+# Entry cap of the db / file / locmem backends (Django's default of 300 is too small
+# for embeddings); Redis evicts by its own maxmemory policy.
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '20000'))
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ValueError(f"Unknown CACHE_BACKEND '{CACHE_BACKEND}', expected one of {tuple(CACHE_BACKENDS)}")
+
+# One alias per namespace, keys '<CACHE_KEY_PREFIX>:<alias>:<CACHE_VERSION>:<key>'.
+# Bump CACHE_VERSION to orphan every cached entry (e.g. after a format change).
+CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'umem')
+CACHE_VERSION = int(os.environ.get('CACHE_VERSION', '1'))
+CACHE_NAMESPACES = ('default', 'throttle')
+CACHES = {
+    alias: {
+        **CACHE_BACKENDS[CACHE_BACKEND],
+        'KEY_PREFIX': f'{CACHE_KEY_PREFIX}:{alias}',
+        'VERSION': CACHE_VERSION,
+        **({} if CACHE_BACKEND == 'redis' else {'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES}}),
+    }
+    for alias in CACHE_NAMESPACES
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,6 +184,91 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'  # <-- Bu klasöre toplayacak
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Embedding Cache (core.embedding_cache)
+# L1: caches['default'] (seconds), L2: EmbeddingCache table; both shared by all workers
+EMBEDDING_CACHE_TTL = int(os.environ.get('EMBEDDING_CACHE_TTL', str(24 * 3600)))
+EMBEDDING_CACHE_PERSIST = os.environ.get('EMBEDDING_CACHE_PERSIST', 'True') == 'True'
+# AI backend (core.ai_providers): 'gemini' or 'local' (offline deterministic stand-in
+# for load tests / benchmarks, with optional injected latency per call in milliseconds)
+AI_PROVIDER = os.environ.get('AI_PROVIDER', 'gemini')
+AI_LOCAL_EMBED_LATENCY_MS = float(os.environ.get('AI_LOCAL_EMBED_LATENCY_MS', '0'))
+AI_LOCAL_GENERATE_LATENCY_MS = float(os.environ.get('AI_LOCAL_GENERATE_LATENCY_MS', '0'))
+
+# Instrumentation (core.timing): Server-Timing response header and Prometheus /metrics
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', str(DEBUG)) == 'True'
+# /metrics is off unless DEBUG; outside DEBUG it also refuses to serve without METRICS_TOKEN
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', str(DEBUG)) == 'True'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiler (core.profiling), removed from the stack entirely unless enabled.
+# Mode 'cprofile' (.prof) or 'sample' (.collapsed stacks); staff can force it with the header.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILING_MODE = os.environ.get('PROFILING_MODE', 'cprofile')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_HEADER = os.environ.get('PROFILING_HEADER', 'X-Profile')
+PROFILING_INTERVAL_MS = float(os.environ.get('PROFILING_INTERVAL_MS', '5'))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', '200'))
+
+# Max texts per batched embed request (core.ai_services.get_embeddings)
+EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', '100'))
+
+# Vector Search (core.vector_search)
+# Applied per query with SET LOCAL semantics
+VECTOR_SEARCH_EF_SEARCH = int(os.environ.get('VECTOR_SEARCH_EF_SEARCH', '100'))
+VECTOR_SEARCH_PROBES = int(os.environ.get('VECTOR_SEARCH_PROBES', '10'))
+# 'relaxed_order' or 'strict_order' (empty = disabled). Keeps the HNSW scan going until
+# enough rows of the project pass the filter; skipped automatically on pgvector < 0.8
+VECTOR_SEARCH_ITERATIVE_SCAN = os.environ.get('VECTOR_SEARCH_ITERATIVE_SCAN', 'relaxed_order')
+# 'full' | 'half' (halfvec first pass) | 'binary' (bit first pass); the top
+# VECTOR_RERANK_CANDIDATES are always re-ranked against the full vector.
+# Only the active mode's HNSW index is kept: after switching, run manage.py quantize_vectors
+# (away from 'full'), then manage.py sync_vector_indexes.
+VECTOR_STORAGE_MODE = os.environ.get('VECTOR_STORAGE_MODE', 'full')
+VECTOR_RERANK_CANDIDATES = int(os.environ.get('VECTOR_RERANK_CANDIDATES', '100'))
+# Projects above this size get a partial HNSW index (manage.py create_project_vector_indexes)
+VECTOR_PROJECT_INDEX_MIN_MEMORIES = int(os.environ.get('VECTOR_PROJECT_INDEX_MIN_MEMORIES', '50000'))
+
+# Hybrid Retrieval (core.search): candidates per side and the RRF constant
+HYBRID_SEARCH_VECTOR_LIMIT = int(os.environ.get('HYBRID_SEARCH_VECTOR_LIMIT', '20'))
+HYBRID_SEARCH_KEYWORD_LIMIT = int(os.environ.get('HYBRID_SEARCH_KEYWORD_LIMIT', '2'))
+HYBRID_SEARCH_RRF_K = int(os.environ.get('HYBRID_SEARCH_RRF_K', '60'))
+
+# Blind Index (search over encrypted raw_text)
+# Dedicated HMAC key; falls back to a key derived from SECRET_KEY. Changing it requires a re-index.
+BLIND_INDEX_KEY = os.environ.get('BLIND_INDEX_KEY', '')
+# Candidates fetched per query while looking for the newest match (paged, not a cap)
+BLIND_INDEX_MAX_CANDIDATES = int(os.environ.get('BLIND_INDEX_MAX_CANDIDATES', '500'))
+
+# Retrieval Result Cache (core.retrieval_cache) in caches['default'], seconds
+RETRIEVAL_CACHE_TTL = int(os.environ.get('RETRIEVAL_CACHE_TTL', '300'))
+# Token -> user and (user, project) ownership caches (core.auth) in caches['default'], seconds
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', '60'))
+
+# Project Reports (core.reports): incremental updates from the previous report,
+# full rebuild once changes since the last full rebuild exceed this share of the project
+REPORT_INCREMENTAL_ENABLED = os.environ.get('REPORT_INCREMENTAL_ENABLED', 'True') == 'True'
+REPORT_INCREMENTAL_MAX_DRIFT = float(os.environ.get('REPORT_INCREMENTAL_MAX_DRIFT', '0.3'))
+# Map-reduce report generation (core.ai_services.generate_project_report):
+# max characters per LLM prompt, parallel summary calls, days per chunk time window
+REPORT_CHUNK_MAX_CHARS = int(os.environ.get('REPORT_CHUNK_MAX_CHARS', '30000'))
+REPORT_MAP_WORKERS = int(os.environ.get('REPORT_MAP_WORKERS', '4'))
+REPORT_CHUNK_WINDOW_DAYS = int(os.environ.get('REPORT_CHUNK_WINDOW_DAYS', '30'))
+# Rendered export store (core.reports.get_artifact): total size budget, LRU eviction
+REPORT_ARTIFACT_MAX_BYTES = int(os.environ.get('REPORT_ARTIFACT_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Async versions of the store / retrieve views (awaited AI calls, concurrent context
+# queries). On by default under ASGI; they also work under WSGI, one event loop per request.
+ASYNC_AI_VIEWS = os.environ.get('ASYNC_AI_VIEWS', str(ASGI_DEPLOYMENT)) == 'True'
+
+# Async Ingestion (manage.py run_ingestion_worker)
+# When True, /memories/store/ queues every request unless it sends "async": false
+MEMORY_STORE_ASYNC = os.environ.get('MEMORY_STORE_ASYNC', 'False') == 'True'
+INGESTION_JOB_STALE_AFTER = int(os.environ.get('INGESTION_JOB_STALE_AFTER', '600'))
+INGESTION_JOB_MAX_ATTEMPTS = int(os.environ.get('INGESTION_JOB_MAX_ATTEMPTS', '3'))
+# Seconds a done / failed job (and its encrypted input) is kept for status polling. 0 keeps them.
+INGESTION_JOB_RETENTION = int(os.environ.get('INGESTION_JOB_RETENTION', str(7 * 24 * 3600)))
+
 CORS_ALLOW_ALL_ORIGINS = True  # For development convenience
 CORS_ALLOW_CREDENTIALS = True
 CSRF_COOKIE_SECURE = True